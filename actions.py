@@ -0,0 +1,348 @@
+"""
+行动层：玩家界面、电脑提交与录像重演共用的一套行动
+
+每种行动是只用名字引用城池与武将的数据类，不依赖界面，可以在规划线程中构造、写入录像、从录像还原：
+- validate(engine, faction): 在当前世界中校验，返回失败原因，可以执行时返回 None；
+- apply(engine, faction): 执行并返回 ActionResult；
+- undo(engine, result): 撤销（仅 undoable 的行动）。
+统一由 GameEngine.execute 调用：先校验再执行，玩家的行动写入录像并记入撤销栈。
+
+只有不消耗随机数的行动可以撤销（买卖粮食、运输、调遣、设置官员、预算策略）。探索、劝降、出兵执行后撤销栈清空，
+否则撤销再重试就能反复刷随机结果，录像也无法重演。
+"""
+from dataclasses import asdict, dataclass, field, fields
+from typing import ClassVar, Dict, List, Optional, Tuple, Type
+
+from attribute import City, Faction, General
+from battle import replay_siege
+from budget import POLICIES
+from events import bus
+
+def find_general(city: City, name: str) -> Optional[General]:
+    """按名字查找城中驻守的武将"""
+    return next((g for g in city.generals if g.name == name), None)
+
+def apply_trade_food(city: City, units: int):
+    """执行买卖粮食：1金钱换10粮食"""
+    city.change_resources(food=units * 10, gold=-units)
+
+@dataclass
+class ActionResult:
+    """
+    一次行动的结果
+    - ok: 是否执行；未通过校验时为 False，message 为原因
+    - message: 给玩家看的日志
+    - data: 行动附带的结果（到达回合、劝降是否成功、城破与否……），撤销所需的旧状态也放在这里
+    """
+    ok: bool
+    message: str = ""
+    data: Dict = field(default_factory=dict)
+
+@dataclass
+class Action:
+    """
+    行动基类
+    - city: 行动发起的城池
+    - note: 电脑规划附带的说明，只用于日志
+    """
+    city: str
+    note: str = field(default="", kw_only=True)
+
+    kind: ClassVar[str] = ""
+    undoable: ClassVar[bool] = False
+    announce: ClassVar[bool] = True # 电脑执行时是否在主窗口日志中播报
+
+    def validate(self, engine, faction: Faction) -> Optional[str]:
+        city = engine.cities_by_name.get(self.city)
+        if city is None:
+            return f"不存在城池 {self.city}"
+        if city.owner is not faction:
+            return f"{self.city}已不属于{faction.name}"
+        return None
+
+    def apply(self, engine, faction: Faction) -> ActionResult:
+        raise NotImplementedError
+
+    def undo(self, engine, result: ActionResult):
+        raise NotImplementedError(f"{self.kind} 不可撤销")
+
+    def to_record(self) -> dict:
+        """录像中的一条命令（不含回合数）"""
+        record = {"k": self.kind, **asdict(self)}
+        if not self.note:
+            del record["note"]
+        for key, value in record.items():
+            if isinstance(value, tuple):
+                record[key] = list(value)
+        return record
+
+    def origin(self, engine) -> City:
+        return engine.cities_by_name[self.city]
+
+    def _own_city(self, engine, faction: Faction, name: str) -> Optional[str]:
+        """目标城须为本势力所有且与出发城在己方领土内连通，返回失败原因"""
+        dest = engine.cities_by_name.get(name)
+        if dest is None or dest.owner is not faction:
+            return f"{name}不是己方城池"
+        if name == self.city:
+            return "目标城池不能是本城"
+        if engine.routes.distance(faction, self.origin(engine), dest) is None:
+            return f"己方领土内没有通往{name}的道路"
+        return None
+
+@dataclass
+class Explore(Action):
+    kind: ClassVar[str] = "explore"
+    announce: ClassVar[bool] = False
+
+    def apply(self, engine, faction: Faction) -> ActionResult:
+        return ActionResult(True, str(self.origin(engine).explore()))
+
+@dataclass
+class Persuade(Action):
+    prisoner: str = ""
+
+    kind: ClassVar[str] = "persuade"
+    announce: ClassVar[bool] = False
+
+    def _prisoner(self, city: City) -> Optional[General]:
+        return next((g for g, _ in city.prisoners if g.name == self.prisoner), None)
+
+    def validate(self, engine, faction: Faction) -> Optional[str]:
+        error = super().validate(engine, faction)
+        if error is None and self._prisoner(self.origin(engine)) is None:
+            error = f"{self.city}没有关押{self.prisoner}"
+        return error
+
+    def apply(self, engine, faction: Faction) -> ActionResult:
+        city = self.origin(engine)
+        joined = bool(city.persuade_prisoner(self._prisoner(city)))
+        if joined:
+            return ActionResult(True, f"劝降成功, {self.prisoner} 加入 {faction.name}", {"joined": True})
+        return ActionResult(True, f"劝降失败, {self.prisoner} 拒绝了你的请求", {"joined": False})
+
+@dataclass
+class TradeFood(Action):
+    """units 为交易单位数：正为买入（1金换10粮），负为卖出"""
+    units: int = 0
+
+    kind: ClassVar[str] = "trade_food"
+    undoable: ClassVar[bool] = True
+
+    def validate(self, engine, faction: Faction) -> Optional[str]:
+        error = super().validate(engine, faction)
+        if error is not None:
+            return error
+        city = self.origin(engine)
+        if self.units == 0:
+            return "交易数量不能为0"
+        if self.units > 0 and city.gold < self.units:
+            return "金钱不足"
+        if self.units < 0 and city.food < -self.units * 10:
+            return "粮食不足"
+        return None
+
+    def apply(self, engine, faction: Faction) -> ActionResult:
+        apply_trade_food(self.origin(engine), self.units)
+        if self.units > 0:
+            return ActionResult(True, f"购买粮食：花费 {self.units} 金钱，获得 {self.units * 10} 粮食")
+        return ActionResult(True, f"出售粮食：出售 {-self.units * 10} 粮食，获得 {-self.units} 金钱")
+
+    def undo(self, engine, result: ActionResult):
+        apply_trade_food(self.origin(engine), -self.units)
+
+@dataclass
+class Transport(Action):
+    """从 city 向己方城池 dest 运输钱粮，沿己方领土行进若干回合后到达"""
+    dest: str = ""
+    food: int = 0
+    gold: int = 0
+
+    kind: ClassVar[str] = "transport"
+    undoable: ClassVar[bool] = True
+
+    def validate(self, engine, faction: Faction) -> Optional[str]:
+        error = super().validate(engine, faction) or self._own_city(engine, faction, self.dest)
+        if error is not None:
+            return error
+        city = self.origin(engine)
+        if self.food < 0 or self.gold < 0 or self.food + self.gold == 0:
+            return "请填写运输数量"
+        if self.food > city.food or self.gold > city.gold:
+            return "资源不足"
+        return None
+
+    def apply(self, engine, faction: Faction) -> ActionResult:
+        city, dest = self.origin(engine), engine.cities_by_name[self.dest]
+        hops = engine.routes.distance(faction, city, dest)
+        sent = engine.transit.send_resources(faction, city, dest, self.food, self.gold, hops, engine.current_turn)
+        arrival = sent[0].arrival_turn
+        return ActionResult(True, f"向 {self.dest} 运输 粮{self.food} 金{self.gold}，预计第 {arrival} 回合抵达",
+                            {"arrival": arrival, "movements": sent})
+
+    def undo(self, engine, result: ActionResult):
+        engine.transit.recall(result.data["movements"])
+        self.origin(engine).change_resources(food=self.food, gold=self.gold)
+
+@dataclass
+class TransferGenerals(Action):
+    """把 city 中的武将调往己方城池 dest；已不在城中的武将跳过"""
+    dest: str = ""
+    generals: Tuple[str, ...] = ()
+
+    kind: ClassVar[str] = "transfer_generals"
+    undoable: ClassVar[bool] = True
+
+    def _generals(self, city: City) -> List[General]:
+        return [g for g in (find_general(city, name) for name in self.generals) if g is not None]
+
+    def validate(self, engine, faction: Faction) -> Optional[str]:
+        error = super().validate(engine, faction) or self._own_city(engine, faction, self.dest)
+        if error is None and not self._generals(self.origin(engine)):
+            error = "请选择要调遣的武将"
+        return error
+
+    def apply(self, engine, faction: Faction) -> ActionResult:
+        city, dest = self.origin(engine), engine.cities_by_name[self.dest]
+        generals = self._generals(city)
+        officers = (city.officer_agriculture, city.officer_commerce) # 调走官员会让职位空缺，撤销时恢复
+        roster = list(city.generals) # 撤销时按原顺序归位（攻城选将时同统率者按城中顺序取）
+        hops = engine.routes.distance(faction, city, dest)
+        sent = engine.transit.send_generals(faction, city, dest, generals, hops, engine.current_turn)
+        arrival = sent[0].arrival_turn
+        general_names = "、".join([g.name for g in generals])
+        return ActionResult(True, f"调遣 {len(generals)} 名武将前往 {self.dest}：{general_names}，预计第 {arrival} 回合抵达",
+                            {"arrival": arrival, "movements": sent, "officers": officers, "roster": roster})
+
+    def undo(self, engine, result: ActionResult):
+        city = self.origin(engine)
+        engine.transit.recall(result.data["movements"])
+        city.restore_generals(result.data["roster"])
+        if (city.officer_agriculture, city.officer_commerce) != result.data["officers"]:
+            city.set_officers(*result.data["officers"])
+
+@dataclass
+class SetOfficers(Action):
+    """任命农业官 agri 与商业官 comm（武将名，空串表示空缺）"""
+    agri: str = ""
+    comm: str = ""
+
+    kind: ClassVar[str] = "set_officers"
+    undoable: ClassVar[bool] = True
+
+    def validate(self, engine, faction: Faction) -> Optional[str]:
+        error = super().validate(engine, faction)
+        if error is not None:
+            return error
+        city = self.origin(engine)
+        for name in (self.agri, self.comm):
+            if name and find_general(city, name) is None:
+                return f"{name}不在{self.city}"
+        if self.agri and self.agri == self.comm:
+            return "同一个武将不能同时担任两个职位！"
+        return None
+
+    def apply(self, engine, faction: Faction) -> ActionResult:
+        city = self.origin(engine)
+        old = (city.officer_agriculture, city.officer_commerce)
+        agri = find_general(city, self.agri) if self.agri else None
+        comm = find_general(city, self.comm) if self.comm else None
+        city.set_officers(agri, comm)
+
+        # 生成日志信息
+        log_parts = []
+        if old[0] != agri:
+            log_parts.append(f"农业官员设为 {agri.name}" if agri else "取消农业官员")
+        if old[1] != comm:
+            log_parts.append(f"商业官员设为 {comm.name}" if comm else "取消商业官员")
+        return ActionResult(True, "；".join(log_parts) or "官员设置未变更", {"officers": old})
+
+    def undo(self, engine, result: ActionResult):
+        self.origin(engine).set_officers(*result.data["officers"])
+
+@dataclass
+class SetBudgetPolicy(Action):
+    """设置城池的预算策略 policy（budget.POLICIES 中的策略名）"""
+    policy: str = ""
+
+    kind: ClassVar[str] = "set_budget_policy"
+    undoable: ClassVar[bool] = True
+
+    def validate(self, engine, faction: Faction) -> Optional[str]:
+        error = super().validate(engine, faction)
+        if error is None and self.policy not in POLICIES:
+            error = f"未知的预算策略 {self.policy}"
+        return error
+
+    def apply(self, engine, faction: Faction) -> ActionResult:
+        city = self.origin(engine)
+        old = city.budget_policy
+        city.budget_policy = self.policy
+        bus.publish("city", city.name, "budget_policy")
+        return ActionResult(True, f"预算策略改为 {POLICIES[self.policy].label}", {"policy": old})
+
+    def undo(self, engine, result: ActionResult):
+        city = self.origin(engine)
+        city.budget_policy = result.data["policy"]
+        bus.publish("city", city.name, "budget_policy")
+
+@dataclass
+class Attack(Action):
+    """
+    从 city 出兵攻打相邻的敌城 target
+    - generals: 出征武将
+    - seed / bouts / retreat: 有玩家参与的攻城在界面中逐场交互结算，结束后连同种子与每场对战的
+      [先手武将, 先手阵型, 应战武将, 应战阵型] 一起记录；apply 按记录重新结算（见 battle.replay_siege）
+    电脑之间的攻城不走 apply，由 GameEngine 交给 BattleScheduler 批量推演。
+    """
+    target: str = ""
+    generals: Tuple[str, ...] = ()
+    seed: int = 0
+    bouts: List[List[str]] = field(default_factory=list)
+    retreat: bool = False
+
+    kind: ClassVar[str] = "attack"
+
+    def ready_attackers(self, city: City) -> List[General]:
+        """城中仍有兵力的出征武将（按城中顺序）"""
+        return [g for g in city.generals if g.name in self.generals and g.army > 0]
+
+    def validate(self, engine, faction: Faction) -> Optional[str]:
+        error = super().validate(engine, faction)
+        if error is not None:
+            return error
+        city = self.origin(engine)
+        target = engine.cities_by_name.get(self.target)
+        if target is None or target.owner is faction:
+            return f"{self.target}不是敌方城池"
+        if all(nb.name != self.target for nb in city.neighbors):
+            return f"{self.target}与{self.city}不相邻"
+        if not self.ready_attackers(city):
+            return "没有可出战的武将"
+        return None
+
+    def apply(self, engine, faction: Faction) -> ActionResult:
+        city, target = self.origin(engine), engine.cities_by_name[self.target]
+        attackers = [g for g in (find_general(city, name) for name in self.generals) if g is not None and g.army > 0]
+        conquered, destroyed = replay_siege(city, target, attackers, self.seed, self.bouts, self.retreat,
+                                            engine.log, engine.fight)
+        if conquered:
+            message = f"势力 {faction.name} 成功占领 {self.target}！"
+        elif self.retreat:
+            message = "作战已取消。部队撤回城市。"
+        else:
+            message = f"势力 {target.owner.name} 成功防守 {self.target}！"
+        return ActionResult(True, message, {"conquered": conquered, "destroyed": destroyed})
+
+ACTIONS: Dict[str, Type[Action]] = {cls.kind: cls for cls in
+                                    (Explore, Persuade, TradeFood, Transport, TransferGenerals, SetOfficers, SetBudgetPolicy, Attack)}
+
+def action_from_record(record: dict) -> Action:
+    """从录像中的一条命令还原行动"""
+    cls = ACTIONS[record["k"]]
+    names = {f.name for f in fields(cls)}
+    kwargs = {k: v for k, v in record.items() if k in names}
+    for f in fields(cls):
+        if f.name in kwargs and f.type == Tuple[str, ...]:
+            kwargs[f.name] = tuple(kwargs[f.name])
+    return cls(**kwargs)
@@ -0,0 +1,589 @@
+"""
+电脑势力回合规划
+
+电脑回合分为两个阶段：
+- 规划阶段：对回合开始时的世界拍一份快照，各势力在各自的快照副本上独立决策，
+  只产出行动（actions.py）列表，不触碰真实世界，因此可以放进进程池并行执行
+  （快照写入共享内存，子进程按名字映射后重建副本，见 world_snapshot）；
+- 提交阶段：由回合引擎按势力顺序逐条校验并执行（见 GameEngine.commit_computer_action）。
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import copy
+import heapq
+import multiprocessing
+import random
+
+from actions import (Action, Attack, Explore, Persuade, SetBudgetPolicy, SetOfficers, TradeFood, TransferGenerals,
+                     Transport, apply_trade_food)
+from attribute import ATTACK_FORMATION_BONUS, DEFENSE_FORMATION_BONUS, FORMATIONS, City, Faction, General
+from budget import DevelopmentFirst, RecruitFirst
+from logistics import plan_transports
+from pairing import assign
+from profiler import profiler
+from events import bus
+from world_snapshot import attach
+
+try:
+    import numpy as np
+except ImportError: # numpy 为可选依赖，没有时逐场推演
+    np = None
+
+@dataclass
+class FactionPlan:
+    """一个势力本回合的全部规划"""
+    faction: str
+    actions: List[Action] = field(default_factory=list)
+
+def clone_world(cities: List[City]) -> List[City]:
+    """
+    复制一份与原世界完全隔离的城池/势力/武将对象图。
+    逐个对象浅拷贝后重新连接引用，不走 copy.deepcopy 的递归，大地图也不会爆栈。
+    """
+    new_cities: Dict[int, City] = {id(c): copy.copy(c) for c in cities}
+    new_factions: Dict[int, Faction] = {}
+    new_generals: Dict[int, General] = {}
+
+    def clone_general(g: Optional[General]) -> Optional[General]:
+        if g is None:
+            return None
+        ng = new_generals.get(id(g))
+        if ng is None:
+            ng = copy.copy(g)
+            new_generals[id(g)] = ng
+            ng.faction = clone_faction(g.faction)
+        return ng
+
+    def clone_faction(f: Optional[Faction]) -> Optional[Faction]:
+        if f is None:
+            return None
+        nf = new_factions.get(id(f))
+        if nf is None:
+            nf = copy.copy(f)
+            new_factions[id(f)] = nf
+            nf.ruler = clone_general(f.ruler)
+            nf.cities = [new_cities[id(c)] for c in f.cities]
+            nf.generals = [clone_general(g) for g in f.generals]
+        return nf
+
+    for c in cities:
+        nc = new_cities[id(c)]
+        nc.owner = clone_faction(c.owner)
+        nc.generals = [clone_general(g) for g in c.generals]
+        nc.wild_generals = [clone_general(g) for g in c.wild_generals]
+        nc.prisoners = [(clone_general(g), t) for g, t in c.prisoners]
+        nc.officer_commerce = clone_general(c.officer_commerce)
+        nc.officer_agriculture = clone_general(c.officer_agriculture)
+        nc.neighbors = [new_cities[id(n)] for n in c.neighbors]
+
+    return [new_cities[id(c)] for c in cities]
+
+def freeze_world(cities: List[City]) -> List[City]:
+    """回合开始时拍下的世界快照，规划阶段只读"""
+    return clone_world(cities)
+
+# ========== 各阶段规划 ==========
+
+def plan_persuade_prisoners(faction: Faction, actions_remaining: int) -> List[Persuade]:
+    """劝降囚犯：依次尝试劝降各城关押的武将（成败在提交时才判定）"""
+    plans = []
+    for city in faction.cities:
+        for prisoner, _ in city.prisoners:
+            if len(plans) >= actions_remaining:
+                return plans
+            plans.append(Persuade(city.name, prisoner=prisoner.name))
+    return plans
+
+OFFICER_HORIZON = 12 # 评估官员收益时考虑的任期（月）
+COMMERCE_POINT_VALUE = 1.0 # 每点商业进度每月折合的金钱（每100进度+100金）
+AGRICULTURE_POINT_VALUE = 2.5 # 每点农业进度每月折合的金钱（每100进度+2500粮，10粮=1金）
+
+def _term_gain(monthly_points: float, room: float, point_value: float) -> float:
+    """任职 OFFICER_HORIZON 个月、每月增加 monthly_points 点进度（累计不超过 room）时，任期内平均每月多得的金钱"""
+    total = sum(min(monthly_points * month, room) for month in range(1, OFFICER_HORIZON + 1))
+    return total * point_value / OFFICER_HORIZON
+
+def officer_scores(city: City) -> Tuple[List[float], List[float]]:
+    """
+    城中每名武将担任 商业官 / 农业官 的月度净收益，与 city.generals 一一对应：
+    任期内平均每月因开发多得的金钱减去月俸，两者都按月计。
+    开发进度已满的方向收益为负（只剩俸禄），净收益不为正的武将不值得任命。
+    """
+    comm_room = max(0.0, city.max_progress - city.commerce_progress)
+    agri_room = max(0.0, city.max_progress - city.agriculture_progress)
+    comm_scores, agri_scores = [], []
+    for g in city.generals:
+        salary = g.monthly_salary()
+        comm_scores.append(_term_gain(g.intellect / 5.0, comm_room, COMMERCE_POINT_VALUE) - salary)
+        agri_scores.append(_term_gain(g.politics / 5.0, agri_room, AGRICULTURE_POINT_VALUE) - salary)
+    return comm_scores, agri_scores
+
+def best_officer_pair(city: City) -> Tuple[Optional[General], Optional[General], float, float]:
+    """
+    为城池求最优的 (农业官, 商业官) 组合（同一武将不能兼任，收益不为正的职位留空）：
+    两个职位的首选不是同一人时各取首选即为最优，否则用 pairing.assign 求解；
+    每个职位只需收益最高的前两名作候选，外加两个"空缺"列（收益0）。
+    返回 (农业官, 商业官, 最优组合收益, 现任组合收益)
+    """
+    generals = city.generals
+    comm_scores, agri_scores = officer_scores(city)
+
+    tops = [[i for i in heapq.nlargest(2, range(len(scores)), key=scores.__getitem__) if scores[i] > 0]
+            for scores in (comm_scores, agri_scores)]
+    if not tops[0] or not tops[1] or tops[0][0] != tops[1][0]:
+        c, a = [top[0] if top else None for top in tops]
+    else:
+        # 行为职位（商业、农业），列为候选武将与两个空缺
+        candidates = list(dict.fromkeys(tops[0] + tops[1]))
+        cost = [[-max(scores[i], 0.0) for i in candidates] + [0.0, 0.0] for scores in (comm_scores, agri_scores)]
+        c, a = [candidates[j] if j < len(candidates) and cost[row][j] < 0 else None
+                for row, j in enumerate(assign(cost))]
+    value = (comm_scores[c] if c is not None else 0.0) + (agri_scores[a] if a is not None else 0.0)
+
+    # 现任官员的收益（已不在城中的官员视为空缺，一人兼任两职时只算商业）
+    index_of = {id(g): i for i, g in enumerate(generals)}
+    cur_c = index_of.get(id(city.officer_commerce)) if city.officer_commerce else None
+    cur_a = index_of.get(id(city.officer_agriculture)) if city.officer_agriculture else None
+    if cur_a is not None and cur_a == cur_c:
+        cur_a = None
+    current = (comm_scores[cur_c] if cur_c is not None else 0.0) + (agri_scores[cur_a] if cur_a is not None else 0.0)
+    return (generals[a] if a is not None else None), (generals[c] if c is not None else None), value, current
+
+def plan_officers(faction: Faction) -> List[Tuple[City, Optional[General], Optional[General]]]:
+    """
+    势力内所有城池的官员任命方案，只包含需要变更的城池，按收益提升从高到低排列，
+    行动次数不足时优先执行提升最大的任命。
+    整个势力是一次指派：各城的商业、农业职位对势力的武将，收益为 officer_scores 的净收益；
+    武将只能在驻守的城池任职，代价矩阵按城池分块对角，各块分别求解（见 best_officer_pair）。
+    """
+    changes = []
+    for city in faction.cities:
+        if not city.generals:
+            continue
+        agri, comm, value, current = best_officer_pair(city)
+        if value > current + 1e-6:
+            changes.append((value - current, city, agri, comm))
+    changes.sort(key=lambda x: x[0], reverse=True)
+    return [(city, agri, comm) for _, city, agri, comm in changes]
+
+def choose_budget_policy(city: City) -> str:
+    """
+    为城池挑选预算策略：相邻敌城中最强的守军超过本城兵力时募兵优先，否则内政优先。
+    """
+    garrison = sum(g.army for g in city.generals)
+    threat = max((sum(g.army for g in nb.generals) for nb in city.neighbors if nb.owner is not city.owner), default=0)
+    return RecruitFirst.name if threat > garrison else DevelopmentFirst.name
+
+def plan_budget_policies(faction: Faction) -> List[Tuple[City, str]]:
+    """需要调整预算策略的城池，受威胁的城池在前"""
+    changes = []
+    for city in faction.cities:
+        policy = choose_budget_policy(city)
+        if policy != city.budget_policy:
+            changes.append((policy != RecruitFirst.name, city, policy))
+    changes.sort(key=lambda x: x[0])
+    return [(city, policy) for _, city, policy in changes]
+
+def plan_trade_food(city: City) -> Optional[TradeFood]:
+    """电脑买卖粮食逻辑，返回交易单位数（正为买入，每单位1金换10粮；负为卖出）"""
+    # 计算粮食需求（每个士兵每回合消耗1粮食）
+    army_food_consumption = sum(g.army for g in city.generals)
+
+    # 计算官员维护费用
+    officer_maintenance = 0
+    if city.officer_agriculture:
+        officer_maintenance += city.officer_agriculture.monthly_salary()
+    if city.officer_commerce:
+        officer_maintenance += city.officer_commerce.monthly_salary()
+
+    # 计算开发所需的最低金钱（官员维护 + 缓冲）
+    development_min_gold = officer_maintenance + 100
+
+    # 情况1：买粮食（当粮食不足且有钱留给开发时）
+    if city.food < army_food_consumption:
+        food_deficit = army_food_consumption - city.food
+        available_gold_for_food = max(0, city.gold - development_min_gold)
+
+        if available_gold_for_food > 0:
+            buy_amount = int(min(food_deficit // 10 + 1, available_gold_for_food))
+            if buy_amount > 0:
+                return TradeFood(city.name, units=buy_amount, note="解决缺粮问题")
+
+    # 情况2：卖粮食（当粮食过剩且金钱不足支付开发时）
+    elif city.food > army_food_consumption * 3:
+        if city.gold < development_min_gold:
+            food_surplus = city.food - army_food_consumption * 3
+            max_sell_food = min(food_surplus, 2000) # 每次最多卖2000粮食
+
+            if max_sell_food >= 10:
+                gold_needed = development_min_gold - city.gold
+                sell_units = int(min(gold_needed, max_sell_food // 10))
+                if sell_units > 0:
+                    return TradeFood(city.name, units=-sell_units, note="用于开发资金")
+
+    # 情况3：战略性卖粮（当粮食极其过剩时）
+    elif city.food > army_food_consumption * 5 and city.food > 5000:
+        food_surplus = city.food - army_food_consumption * 3
+        max_sell_units = min(food_surplus // 10, 300)
+        if max_sell_units > 0:
+            sell_units = int(max_sell_units // 2)
+            if sell_units > 0:
+                return TradeFood(city.name, units=-sell_units, note="出售过剩粮食")
+
+    # 情况4：紧急买粮（当粮食严重不足且可能饿死士兵时）
+    elif city.food < army_food_consumption // 2:
+        emergency_buy_amount = int(min((army_food_consumption - city.food) // 10 + 1, city.gold))
+        if emergency_buy_amount > 0:
+            return TradeFood(city.name, units=emergency_buy_amount, note="避免军队缺粮")
+
+    return None
+
+def plan_transfer_generals(faction: Faction, actions_remaining: int) -> List[TransferGenerals]:
+    """电脑调遣武将逻辑：内陆兵多的城池向兵力不足的边境城池调遣（在快照副本上边规划边执行）"""
+    plans: List[TransferGenerals] = []
+
+    # 找出需要增援的城市（边境城市且兵力不足）
+    reinforcement_needed = []
+    for city in faction.cities:
+        is_border_city = any(neighbor.owner is not faction for neighbor in city.neighbors)
+        total_army = sum(g.army for g in city.generals)
+        if is_border_city and total_army < 2000:
+            reinforcement_needed.append((city, total_army))
+
+    if not reinforcement_needed:
+        return plans
+
+    # 按兵力需求排序（兵力越少的越需要增援）
+    reinforcement_needed.sort(key=lambda x: x[1])
+
+    # 找出有富余兵力的内陆城市
+    donor_cities = []
+    for city in faction.cities:
+        is_inland = all(neighbor.owner is faction for neighbor in city.neighbors)
+        total_army = sum(g.army for g in city.generals)
+        if is_inland and total_army > 1500 and len(city.generals) > 1:
+            donor_cities.append((city, total_army))
+
+    if not donor_cities:
+        return plans
+
+    donor_cities.sort(key=lambda x: x[1], reverse=True)
+
+    for target_city, target_army in reinforcement_needed:
+        if len(plans) >= actions_remaining:
+            break
+
+        for donor_city, donor_army in donor_cities:
+            if len(plans) >= actions_remaining:
+                break
+
+            if donor_army <= 1000: # 捐赠城市兵力不足
+                continue
+
+            available_generals = [g for g in donor_city.generals if g.army > 0]
+            if len(available_generals) <= 1: # 至少要保留1名武将
+                continue
+
+            # 按兵力排序，选择中间力量的武将（不调最强的，也不调最弱的）
+            sorted_generals = sorted(available_generals, key=lambda g: g.army)
+            if len(sorted_generals) >= 4:
+                transfer_candidates = sorted_generals[1:3]
+            elif len(sorted_generals) >= 3:
+                transfer_candidates = [sorted_generals[1]]
+            else:
+                transfer_candidates = [sorted_generals[0]]
+
+            for general in transfer_candidates:
+                donor_city.remove_general(general)
+                target_city.add_general(general)
+
+            plans.append(TransferGenerals(donor_city.name, dest=target_city.name,
+                                          generals=tuple(g.name for g in transfer_candidates)))
+
+            donor_army = sum(g.army for g in donor_city.generals)
+            if donor_army <= 1000:
+                break
+
+    return plans
+
+# ========== 军事：期望战果推演 ==========
+
+_ATTACK_COEFFS = [ATTACK_FORMATION_BONUS[f] for f in FORMATIONS]
+_DEFENSE_COEFFS = [DEFENSE_FORMATION_BONUS[f] for f in FORMATIONS]
+NUMPY_MIN_FIGHTS = 32 # 一批对战达到该数目才走 numpy（数组太小时转换开销大于收益）
+
+def _mean_efficiency(atk_leadership, atk_soldiers, dfd_leadership, dfd_soldiers):
+    """
+    双方阵型均匀随机时，attack_enemy 中攻方效能 attack/(attack+defense) 的平均值；
+    参数可以是数，也可以是等长的 numpy 数组（逐项计算，运算顺序相同，结果逐位一致）
+    """
+    atk_base = atk_leadership * 1.5 + atk_soldiers / 200
+    dfd_base = dfd_leadership + dfd_soldiers / 300
+    defenses = [dfd_base * k for k in _DEFENSE_COEFFS]
+    total = 0.0
+    for k in _ATTACK_COEFFS:
+        attack = atk_base * k
+        for defense in defenses:
+            total = total + attack / (attack + defense + 1e-6)
+    return total / (len(FORMATIONS) ** 2)
+
+def expected_fights(fights: Sequence[Tuple[float, float, float, float]],
+                    max_exchanges: int = 200) -> List[Tuple[bool, float, float]]:
+    """
+    按 attack_enemy 的规则对一批两军交战做期望推演（不计单挑，阵型视为均匀随机）：
+    - fights: [(攻方统率, 攻方士兵, 守方统率, 守方士兵), ...]
+    - 每次攻击造成 效能 × 士兵数 × 0.15 的损失（随机系数 0.1~0.2 的期望），最少10人；
+    - 攻方阵型恰好克制守方的概率为 1/3，此时守方再损失剩余士兵的 5%；
+    - 攻方先手，双方轮流攻击直至一方士兵归零。
+    整批对战逐次攻击同步推进，装有 numpy 且对战较多时整批向量化，结果与逐场计算相同。
+    返回与 fights 一一对应的 (攻方是否获胜, 攻方剩余士兵, 守方剩余士兵)
+    """
+    if np is not None and len(fights) >= NUMPY_MIN_FIGHTS:
+        return _expected_fights_numpy(fights, max_exchanges)
+    counter_prob = 1 / len(FORMATIONS)
+    results = []
+    for atk_leadership, atk_soldiers, dfd_leadership, dfd_soldiers in fights:
+        a, d = float(atk_soldiers), float(dfd_soldiers)
+        for _ in range(max_exchanges):
+            if a <= 0 or d <= 0:
+                break
+            d -= max(_mean_efficiency(atk_leadership, a, dfd_leadership, d) * a * 0.15, 10)
+            d -= max(d, 0) * 0.05 * counter_prob
+            if d <= 0:
+                break
+            a -= max(_mean_efficiency(dfd_leadership, d, atk_leadership, a) * d * 0.15, 10)
+            a -= max(a, 0) * 0.05 * counter_prob
+        results.append((d <= 0, max(a, 0.0), max(d, 0.0)))
+    return results
+
+def _expected_fights_numpy(fights, max_exchanges: int) -> List[Tuple[bool, float, float]]:
+    """expected_fights 的向量化实现：已分出胜负的对战用掩码冻结，其余逐次攻击同步推进"""
+    atk_leadership, a, dfd_leadership, d = (np.array(column, dtype=np.float64) for column in zip(*fights))
+    counter_prob = 1 / len(FORMATIONS)
+    with np.errstate(divide="ignore", invalid="ignore"): # 已结束的对战兵力可能为负，算出的值不会被采用
+        for _ in range(max_exchanges):
+            live = (a > 0) & (d > 0)
+            if not live.any():
+                break
+            d = np.where(live, d - np.maximum(_mean_efficiency(atk_leadership, a, dfd_leadership, d) * a * 0.15, 10), d)
+            d = np.where(live, d - np.maximum(d, 0) * 0.05 * counter_prob, d)
+            live &= d > 0
+            a = np.where(live, a - np.maximum(_mean_efficiency(dfd_leadership, d, atk_leadership, a) * d * 0.15, 10), a)
+            a = np.where(live, a - np.maximum(a, 0) * 0.05 * counter_prob, a)
+    return list(zip((d <= 0).tolist(), np.maximum(a, 0.0).tolist(), np.maximum(d, 0.0).tolist()))
+
+def expected_fight(atk_leadership: float, atk_soldiers: float, dfd_leadership: float, dfd_soldiers: float,
+                   max_exchanges: int = 200) -> Tuple[bool, float, float]:
+    """单场对战的期望推演（见 expected_fights），返回 (攻方是否获胜, 攻方剩余士兵, 守方剩余士兵)"""
+    return expected_fights([(atk_leadership, atk_soldiers, dfd_leadership, dfd_soldiers)], max_exchanges)[0]
+
+def expected_sieges(sieges: Sequence[Tuple[List[Tuple[float, float]], List[Tuple[float, float]]]]
+                    ) -> List[Tuple[bool, float, float]]:
+    """
+    按攻城战的出阵规则对一批攻城做期望推演：攻守双方轮流先攻，先攻方派出统率最高的武将，
+    迎战方派出统率最低的武将，败者退出战斗，胜者保留剩余士兵。
+    - sieges: [(攻方, 守方), ...]，每方为 [(统率, 士兵数), ...]，士兵数为0的武将不参战
+    各场攻城的第 k 场对战合成一批交给 expected_fights，攻城数再多也只需按最长的一场推进几轮。
+    返回与 sieges 一一对应的 (攻方是否攻下城池, 攻方剩余总兵力, 守方剩余总兵力)
+    """
+    sides = [([[lead, soldiers] for lead, soldiers in attackers if soldiers > 0],
+              [[lead, soldiers] for lead, soldiers in defenders if soldiers > 0]) for attackers, defenders in sieges]
+    attack = [True] * len(sides) # 各场攻城本轮是否由攻方先攻
+    while True:
+        active = [i for i, (atk, dfd) in enumerate(sides) if atk and dfd]
+        if not active:
+            break
+        bouts = []
+        for i in active:
+            first, second = sides[i] if attack[i] else sides[i][::-1]
+            bouts.append((first, second, max(first, key=lambda g: g[0]), min(second, key=lambda g: g[0])))
+        results = expected_fights([(x[0], x[1], y[0], y[1]) for _, _, x, y in bouts])
+        for i, (first, second, x, y), (x_wins, x[1], y[1]) in zip(active, bouts, results):
+            if x_wins:
+                second.remove(y)
+            else:
+                first.remove(x)
+            attack[i] = not attack[i]
+    return [(bool(atk), sum(g[1] for g in atk), sum(g[1] for g in dfd)) for atk, dfd in sides]
+
+def expected_siege(attackers: List[Tuple[float, float]], defenders: List[Tuple[float, float]]) -> Tuple[bool, float, float]:
+    """单场攻城的期望推演（见 expected_sieges），返回 (攻方是否攻下城池, 攻方剩余总兵力, 守方剩余总兵力)"""
+    return expected_sieges([(attackers, defenders)])[0]
+
+CITY_CAPTURE_VALUE = 2000 # 攻下一座城池折合的兵力价值
+MIN_ATTACK_SOLDIERS = 500 # 出征武将的最低兵力
+MAX_ATTACKERS = 3 # 单次进攻最多出征的武将数
+
+def pick_attackers(city: City) -> List[General]:
+    """挑选出征武将：兵力达标者中按 统率×兵力 取最强的几人，并至少留一名武将守城"""
+    ready = [g for g in city.generals if g.army >= MIN_ATTACK_SOLDIERS]
+    ready.sort(key=lambda g: g.leadership * g.army, reverse=True)
+    return ready[:min(MAX_ATTACKERS, len(city.generals) - 1)]
+
+def plan_military_actions(faction: Faction, actions_remaining: int) -> List[Attack]:
+    """
+    电脑军事行动：对所有前线 (出发城, 目标城) 组合统一打分，在行动次数内挑选收益最高的进攻。
+    - 全部组合一次交给 expected_sieges，按 Army 的攻防公式批量推演期望战果，目标城的守军统计在各组合间共享；
+    - 收益 = 预计歼敌 - 预计损兵 + 攻下城池的价值（CITY_CAPTURE_VALUE），只执行收益为正的进攻；
+    - 每座城池每回合最多出兵一次、最多被攻击一次。
+    """
+    fronts = [] # (出发城, 目标城, 出征武将, 攻方统计, 守方统计)
+    defenders_of: Dict[str, List[Tuple[int, int]]] = {} # 目标城名 -> [(统率, 兵力)]
+
+    for city in faction.cities:
+        enemy_neighbors = [nb for nb in city.neighbors if nb.owner is not faction]
+        if not enemy_neighbors:
+            continue
+        attackers = pick_attackers(city)
+        if not attackers:
+            continue
+
+        atk_stats = [(g.leadership, g.army) for g in attackers]
+        for target in enemy_neighbors:
+            dfd_stats = defenders_of.get(target.name)
+            if dfd_stats is None:
+                dfd_stats = [(g.leadership, g.army) for g in target.generals if g.army > 0]
+                defenders_of[target.name] = dfd_stats
+            fronts.append((city, target, attackers, atk_stats, dfd_stats))
+
+    candidates = []
+    outcomes = expected_sieges([(atk_stats, dfd_stats) for _, _, _, atk_stats, dfd_stats in fronts])
+    for (city, target, attackers, atk_stats, dfd_stats), (success, atk_left, dfd_left) in zip(fronts, outcomes):
+        killed = sum(s for _, s in dfd_stats) - dfd_left
+        lost = sum(s for _, s in atk_stats) - atk_left
+        utility = killed - lost + (CITY_CAPTURE_VALUE if success else 0)
+        if utility > 0:
+            candidates.append((utility, city, target, attackers))
+
+    candidates.sort(key=lambda c: c[0], reverse=True)
+
+    plans: List[Attack] = []
+    used_origins, used_targets = set(), set()
+    for utility, city, target, attackers in candidates:
+        if len(plans) >= actions_remaining:
+            break
+        if city.name in used_origins or target.name in used_targets:
+            continue
+        used_origins.add(city.name)
+        used_targets.add(target.name)
+        plans.append(Attack(city.name, target=target.name,
+                            generals=tuple(g.name for g in attackers), note=f"预计收益{utility:.0f}"))
+
+    return plans
+
+# ========== 单个势力的完整规划 ==========
+
+def plan_faction(snapshot: List[City], faction_name: str, actions_per_turn: int, seed: int,
+                 adjust_budget: bool = True) -> FactionPlan:
+    """
+    在快照的私有副本上规划一个势力本回合的全部行动。
+    各阶段顺序与原先的电脑回合一致：劝降 → 内政（官员、预算策略、买卖粮食、调遣） → 钱粮运输 → 军事 → 探索。
+    adjust_budget 为 False 时不调整城池的预算策略（策略由外部固定，用于比较不同策略）。
+    规划期间屏蔽模型事件：副本上的修改不应触发界面刷新（且可能在工作线程中执行）。
+    规划只读写私有副本，不使用引擎的 RouteCache 等共享缓存，多个势力同时规划互不干扰。
+    """
+    with bus.muted():
+        with profiler.phase(f"{faction_name}:plan:snapshot"):
+            world = clone_world(snapshot)
+        return _plan_faction(world, faction_name, actions_per_turn, seed, adjust_budget)
+
+def plan_faction_shared(snapshot_name: str, faction_name: str, actions_per_turn: int, seed: int,
+                        adjust_budget: bool = True) -> FactionPlan:
+    """在进程池中执行的 plan_faction：快照是共享内存中的世界存储（见 world_snapshot），按名字映射后重建私有副本"""
+    with bus.muted():
+        with profiler.phase(f"{faction_name}:plan:snapshot"):
+            world = attach(snapshot_name).thaw()
+        return _plan_faction(world, faction_name, actions_per_turn, seed, adjust_budget)
+
+def _plan_faction(world: List[City], faction_name: str, actions_per_turn: int, seed: int,
+                  adjust_budget: bool) -> FactionPlan:
+    """在私有的世界副本 world 上规划（边规划边修改副本）"""
+    rng = random.Random(seed)
+    plan = FactionPlan(faction_name)
+
+    faction = next((c.owner for c in world if c.owner is not None and c.owner.name == faction_name), None)
+    if faction is None or not faction.cities: # 势力已灭亡
+        return plan
+
+    def budget():
+        return actions_per_turn - len(plan.actions)
+
+    # 第零阶段：劝降囚犯（高优先级）
+    with profiler.phase(f"{faction_name}:plan:persuade"):
+        plan.actions += plan_persuade_prisoners(faction, budget())
+
+    # 第一阶段：内部管理（设置官员、买卖粮食、调遣武将）
+    with profiler.phase(f"{faction_name}:plan:officers"):
+        for city, agri, comm in plan_officers(faction):
+            if budget() <= 0:
+                break
+            city.set_officers(agri, comm)
+            plan.actions.append(SetOfficers(city.name, agri=agri.name if agri else "", comm=comm.name if comm else ""))
+
+    with profiler.phase(f"{faction_name}:plan:budget_policy"):
+        if adjust_budget:
+            for city, policy in plan_budget_policies(faction):
+                if budget() <= 0:
+                    break
+                city.budget_policy = policy
+                plan.actions.append(SetBudgetPolicy(city.name, policy=policy))
+
+    with profiler.phase(f"{faction_name}:plan:trade_food"):
+        for city in faction.cities:
+            if budget() <= 0:
+                break
+            trade = plan_trade_food(city)
+            if trade is not None:
+                apply_trade_food(city, trade.units)
+                plan.actions.append(trade)
+
+    with profiler.phase(f"{faction_name}:plan:transfer_generals"):
+        if budget() > 0:
+            plan.actions += plan_transfer_generals(faction, budget())
+
+    # 第二阶段：内部资源调配（钱粮运输）
+    with profiler.phase(f"{faction_name}:plan:transport"):
+        if budget() > 0:
+            for shipment in plan_transports(faction, budget()):
+                shipment.origin.change_resources(**{shipment.resource: -shipment.amount})
+                shipment.dest.change_resources(**{shipment.resource: shipment.amount})
+                plan.actions.append(Transport(shipment.origin.name, dest=shipment.dest.name,
+                                              **{shipment.resource: shipment.amount}))
+
+    # 第三阶段：军事行动
+    with profiler.phase(f"{faction_name}:plan:military"):
+        if budget() > 0:
+            plan.actions += plan_military_actions(faction, budget())
+
+    # 还有多余行动力时随机挑选城市进行探索
+    while budget() > 0:
+        plan.actions.append(Explore(rng.choice(faction.cities).name))
+
+    return plan
+
+def planning_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    电脑势力并行规划用的进程池。
+    以 spawn 方式启动子进程，不继承界面进程的线程与 Qt 状态；子进程只导入规划所需的模块。
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def plan_all_factions(snapshot: Union[List[City], str], faction_names: List[str], actions_per_turn: int,
+                      seeds: List[int], pool: Optional[ProcessPoolExecutor] = None,
+                      adjust_budget: bool = True) -> List[FactionPlan]:
+    """
+    为所有电脑势力规划，返回顺序与 faction_names 一致。
+    - pool 为 None 时 snapshot 为 freeze_world 的快照，在当前进程依次规划；
+    - pool 为进程池（见 planning_pool）时 snapshot 为 SnapshotExporter.export 返回的共享内存名，
+      各势力在子进程中并行规划，分发的只有名字、种子等几个标量。
+    各势力只读同一份快照、使用各自的随机种子，因此两种方式的结果相同，也与执行顺序无关。
+    - adjust_budget: 见 plan_faction
+    """
+    if pool is None:
+        return [plan_faction(snapshot, name, actions_per_turn, seed, adjust_budget)
+                for name, seed in zip(faction_names, seeds)]
+
+    futures = [pool.submit(plan_faction_shared, snapshot, name, actions_per_turn, seed, adjust_budget)
+               for name, seed in zip(faction_names, seeds)]
+    return [f.result() for f in futures]
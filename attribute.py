@@ -1,10 +1,84 @@
-from dataclasses import dataclass, field
-from typing import Optional, List, Tuple
+from dataclasses import MISSING, dataclass, field
+from typing import ClassVar, Optional, List, Tuple
 import random
-import math
+
+from profiler import profiler
+from events import bus
+from supply import Ration, ration
+from budget import DEFAULT_POLICY, CostSheet, allocate, policy_of
+from duel import army_trigger_chance
 
 MAX_SOLDIERS = 1000 
 
+_ownership_version = 0 # 城池归属变更计数，供路径等缓存判断是否失效
+
+def ownership_version() -> int:
+    """返回当前城池归属版本号，任何城池易主都会使其递增"""
+    return _ownership_version
+
+def _bump_ownership_version():
+    global _ownership_version
+    _ownership_version += 1
+
+# ========== 可映射到世界存储的数值属性 ==========
+
+class Stored:
+    """
+    City / General 上的数值属性：平时与普通属性一样存在实例里；
+    对象绑定到世界存储后（见 world_store.WorldStore.bind）改为直接读写存储中对应的一格
+    - column: 存储中的列名
+    - default: 数据类字段的默认值，缺省为必填字段
+    """
+
+    def __init__(self, column: str, default=MISSING):
+        self.column = column
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        owner._stored = owner._stored + (name,)
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            if self.default is MISSING:
+                raise AttributeError(self.name) # 数据类据此把字段当作必填
+            return self.default
+        slot = obj._slot
+        if slot is None:
+            return obj.__dict__[self.name]
+        return slot[0].get(self.column, slot[1])
+
+    def __set__(self, obj, value):
+        slot = obj._slot
+        if slot is None:
+            obj.__dict__[self.name] = value
+        else:
+            slot[0].set(self.column, slot[1], value)
+
+class Storable:
+    """可绑定到世界存储的模型对象；复制与序列化得到的总是未绑定的对象，数值从存储中取出"""
+    _slot = None # 绑定后为 (存储, 行下标)
+    _stored: ClassVar[Tuple[str, ...]] = () # 各 Stored 属性名
+
+    def bind(self, store, index: int):
+        """改为读写 store 中下标为 index 的一行（该行须已写入本对象的当前值）"""
+        for name in self._stored:
+            self.__dict__.pop(name, None)
+        self._slot = (store, index)
+
+    def unbind(self):
+        """解除绑定，把存储中的当前值取回实例"""
+        if self._slot is not None:
+            values = {name: getattr(self, name) for name in self._stored}
+            del self._slot
+            self.__dict__.update(values)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if state.pop("_slot", None) is not None:
+            state.update((name, getattr(self, name)) for name in self._stored)
+        return state
+
 @dataclass
 class Faction:
 
@@ -18,27 +92,35 @@ class Faction:
         if general not in self.generals:
             self.generals.append(general)
             general.faction = self
+            bus.publish("faction", self.name, "generals")
     
     def remove_general(self, general: "General"):
         """移除武将"""
         if general in self.generals:
             self.generals.remove(general)
             general.faction = None
+            bus.publish("faction", self.name, "generals")
     
     def add_city(self, city: "City"):
         """添加城池"""
         if city not in self.cities:
             self.cities.append(city)
             city.owner = self
+            _bump_ownership_version()
+            bus.publish("faction", self.name, "cities")
+            bus.publish("city", city.name, "owner")
     
     def remove_city(self, city: "City"):
         """失去城池"""
         if city in self.cities:
             self.cities.remove(city)
             city.owner = None
+            _bump_ownership_version()
+            bus.publish("faction", self.name, "cities")
+            bus.publish("city", city.name, "owner")
 
 @dataclass
-class General:
+class General(Storable):
     """
     武将类+
     - name: 武将姓名
@@ -61,9 +143,9 @@ class General:
 
     _greed: float = field(default_factory=lambda: round(random.uniform(0.05, 0.3), 3))  # 隐藏
     
-    faction:   Optional[Faction] = None # 所属势力
+    faction:   Optional[Faction] = Stored("general_faction", None) # 所属势力
 
-    army: int = 0 # 每个武将带的士兵数(不超过MAX_SOLDIERS)
+    army: int = Stored("general_army", 0) # 每个武将带的士兵数(不超过MAX_SOLDIERS)
 
     def monthly_salary(self, min_salary: float = 50.0, max_salary: float = 100.0) -> float:
         """
@@ -74,24 +156,25 @@ class General:
         return min_salary + (max_salary - min_salary) * self._greed
 
 @dataclass
-class City:
+class City(Storable):
     """
     城池类
     - food: 粮草（粮草库存）
     - gold: 金钱（库存）
     - officer_commerce: 商业开发官 (General 或 None)
     - officer_agriculture: 农业开发官 (General 或 None)
+    - budget_policy: 预算策略名（见 budget.POLICIES）
     """
 
     name: str  # 城市名称
-    food: int  # 粮草数量
-    gold: int  # 金钱数量
-    owner: Faction # 城池归属势力
+    food: int = Stored("food")  # 粮草数量
+    gold: int = Stored("gold")  # 金钱数量
+    owner: Faction = Stored("owner") # 城池归属势力
     generals: List["General"] = field(default_factory=list)  # 城中驻守的武将
 
     # 城市开发度进度（0~500）
-    commerce_progress: float = 0.0  # 商业开发进度
-    agriculture_progress: float = 0.0  # 农业开发进度
+    commerce_progress: float = Stored("commerce_progress", 0.0)  # 商业开发进度
+    agriculture_progress: float = Stored("agriculture_progress", 0.0)  # 农业开发进度
     progress_per_level: float = 100.0  # 每100进度视为1级
     max_progress: float = 500.0  # 最高5级（5×100）
 
@@ -108,8 +191,20 @@ class City:
 
     neighbors: list["City"] = field(default_factory=list)
 
-    def monthly_update(self):
-        """每月城市更新：收入、支出、开发、募兵"""
+    budget_policy: str = DEFAULT_POLICY # 金钱不足时各项开支的先后（见 budget.POLICIES）
+
+    def food_income(self) -> int:
+        """本月农业收入（粮草）"""
+        agriculture_level = int(self.agriculture_progress // self.progress_per_level)
+        return self.base_agriculture_income + agriculture_level * 2500
+
+    @profiler.profiled("City.monthly_update")
+    def monthly_update(self, rations: Optional[Ration] = None, proportional: bool = False):
+        """
+        每月城市更新：收入、支出、开发、募兵
+        - rations: supply.ration_all 预先为所有城池算好的口粮结算；与本城当前粮草、武将数不符（或缺省）时就地结算
+        - proportional: 就地结算时是否按比例配给
+        """
         logs = []
         logs.append(f"\n=== {self.name} 城市月度更新 ===")
         #print(f"\n=== {self.name} 城市月度更新 ===")
@@ -125,24 +220,14 @@ class City:
 
         # ---- 农业收入（粮草）----
         agriculture_level = int(self.agriculture_progress // self.progress_per_level)
-        food_income = self.base_agriculture_income + agriculture_level * 2500
+        food_income = self.food_income()
         logs.append(f"农业开发 {agriculture_level}级 -> 收入 {food_income} 粮草")
         #print(f"农业开发 {agriculture_level}级 -> 收入 {food_income} 粮草")
 
         # ---- 计算城中武将招募士兵和开发农商业的工资 ----
-
-        total_salary = 0
-        for officer in self.generals:
-            if officer.army < MAX_SOLDIERS: #士兵未满，本回合需要募兵
-                recruit_ratio = (MAX_SOLDIERS - officer.army) / MAX_SOLDIERS  # 保留小数
-                total_salary += round(officer.monthly_salary() * recruit_ratio)
-            
-        # 商农业开发额外耗钱
-        if self.officer_agriculture is not None: 
-            total_salary += self.officer_agriculture.monthly_salary()
-        
-        if self.officer_commerce is not None:
-            total_salary += self.officer_commerce.monthly_salary()
+        # 每个武将的俸禄本月只算一次，俸禄估算、官员开发与募兵都从开支表取值（见 budget.py）
+        costs = CostSheet.build(self.generals, self.officer_commerce, self.officer_agriculture, MAX_SOLDIERS)
+        total_salary = costs.salary_demand([officer.army for officer in self.generals])
 
         #print(f"官员总俸禄需求: {total_salary} 金")
         logs.append(f"官员总俸禄需求: {total_salary} 金")
@@ -150,22 +235,17 @@ class City:
         # ---- 粮草结算 ----
         self.food += food_income
 
-        # 士兵口粮消耗
-        food_res = self.food
- 
-        for officer in self.generals:
-            if food_res >= officer.army: # 粮草够吃
-                food_res -= officer.army
-            else: # 粮草不够吃
-                shortage = officer.army - food_res
-                lost_soldiers = int(shortage / 2)  # 逃兵数量
-                food_res = 0
-                officer.army = max(0, officer.army - lost_soldiers)
-        
-                #print(f" {self.name} 粮草不足！{officer.name} 军出现士兵逃亡")
-                logs.append(f" {self.name} 粮草不足！{officer.name} 军出现士兵逃亡 {lost_soldiers} 人")
+        # 士兵口粮消耗：武将按顺序领粮，吃不饱的武将一半缺口的士兵逃亡（前缀和结算，见 supply.py）
+        if rations is None or rations.food != self.food or rations.count != len(self.generals):
+            rations = ration([officer.army for officer in self.generals], self.food, proportional)
+
+        for index, lost_soldiers in rations.deserters:
+            officer = self.generals[index]
+            officer.army = max(0, officer.army - lost_soldiers)
+            #print(f" {self.name} 粮草不足！{officer.name} 军出现士兵逃亡")
+            logs.append(f" {self.name} 粮草不足！{officer.name} 军出现士兵逃亡 {lost_soldiers} 人")
         
-        self.food = food_res
+        self.food = rations.food_left
 
         # ---- 收入结算 ----
         self.gold += monthly_income
@@ -173,32 +253,29 @@ class City:
         # ---- 支付工资逻辑 ----
         gold_before_salary = self.gold
 
-        if self.officer_commerce and self.gold >= self.officer_commerce.monthly_salary(): # 存在商业官员并且资金够其开发商业
-            self.gold -= self.officer_commerce.monthly_salary()
+        # 按预算策略的顺序分配金钱（默认 商业 -> 农业 -> 募兵），钱不够的一项本月跳过
+        budget = allocate(costs, self.gold, [general.army for general in self.generals],
+                          policy_of(self).order(self, costs))
+
+        if budget.commerce:
             inc = self.officer_commerce.intellect / 5.0
             self.commerce_progress = min(self.commerce_progress + inc, self.max_progress)
             #print(f"商业开发 +{inc:.1f}（总进度 {self.commerce_progress:.1f}/{self.max_progress}）")
             logs.append(f"商业开发 +{inc:.1f}（总进度 {self.commerce_progress:.1f}/{self.max_progress}）")
 
-        if self.officer_agriculture and self.gold >= self.officer_agriculture.monthly_salary(): # 存在农业官员并且资金够其开发农业
-            self.gold -= self.officer_agriculture.monthly_salary()
+        if budget.agriculture:
             inc = self.officer_agriculture.politics / 5.0
             self.agriculture_progress = min(self.agriculture_progress + inc, self.max_progress)
             #print(f"农业开发 +{inc:.1f}（总进度 {self.agriculture_progress:.1f}/{self.max_progress}）")
             logs.append(f"农业开发 +{inc:.1f}（总进度 {self.agriculture_progress:.1f}/{self.max_progress}）")
 
-        for general in self.generals:
-            if general.army < MAX_SOLDIERS:
-                recruit_salary = general.monthly_salary() / MAX_SOLDIERS # 该武将招募一名士兵所需金钱数，保留小数
-
-                num_recruit = min(MAX_SOLDIERS - general.army, int(self.gold // recruit_salary)) # 实际可招募的士兵数
-
-                general.army += num_recruit
-
-                self.gold = max(0, self.gold - int(num_recruit * recruit_salary)) # 避免小于0 
+        for general, num_recruit in zip(self.generals, budget.recruits):
+            general.army += num_recruit
+        self.gold = budget.gold
 
         #print(f"结算前金 {gold_before_salary} -> 结算后金 {self.gold}")
         logs.append(f"结算前金 {gold_before_salary} -> 结算后金 {self.gold}")
+        bus.publish("city", self.name, "resources")
         return "\n".join(logs)
 
     def explore(self) -> str:
@@ -216,11 +293,11 @@ class City:
             return " 搜索了许久，一无所获……"
         elif roll < 0.6:
             gold_found = random.randint(150, 300)
-            self.gold += gold_found
+            self.change_resources(gold=gold_found)
             return f" 发现了被遗弃的军资，获得 {gold_found} 金。"
         elif roll < 0.8:
             food_found = random.randint(200, 400)
-            self.food += food_found
+            self.change_resources(food=food_found)
             return f" 找到隐藏的粮仓，获得 {food_found} 粮草。"
         elif self.wild_generals:
             general = random.choice(self.wild_generals)
@@ -228,19 +305,20 @@ class City:
 
             self.owner.add_general(general)
 
-            self.generals.append(general)
+            self.add_general(general)
             return f" 发现在野武将 {general.name}！成功将其招入麾下！"
         else:
             roll = random.random()
             if roll < 0.5:
                 gold_found = random.randint(150, 300)
-                self.gold += gold_found
+                self.change_resources(gold=gold_found)
                 return f" 发现了被遗弃的军资，获得 {gold_found} 金。"
             else:
                 food_found = random.randint(200, 400)
-                self.food += food_found
+                self.change_resources(food=food_found)
                 return f" 找到隐藏的粮仓，获得 {food_found} 粮草。"
     
+    @profiler.profiled("City.update_prisoners")
     def update_prisoners(self):
         """每回合更新：仅判断逃脱"""
         logs = []
@@ -261,7 +339,7 @@ class City:
                 # === 新逻辑：只向该武将原势力的随机城池逃亡 ===
                 if general.faction and general.faction.cities:
                     dest = random.choice(general.faction.cities)
-                    dest.generals.append(general)
+                    dest.add_general(general)
                     #print(f" {general.name} 趁乱逃回 {dest.name}")
                     logs.append(f" {general.name} 趁乱逃回 {dest.name}")
                 else:
@@ -270,6 +348,8 @@ class City:
             else:
                 new_prisoners.append((general, turns))
         self.prisoners = new_prisoners
+        if logs:
+            bus.publish("city", self.name, "prisoners")
         return "\n".join(logs) if logs else "无逃脱事件"
 
     def persuade_prisoner(self, target_general: "General"):
@@ -277,13 +357,14 @@ class City:
 
         if target_general.faction is None or target_general.faction == self.owner: # 该武将没有所属势力或者本身就是自己势力的人
             print(f" {target_general.name} 被成功劝降，加入 {self.owner.name} 势力！")
-            self.generals.append(target_general)
+            self.add_general(target_general)
 
             
             self.owner.add_general(target_general)
 
             # 从囚犯列表中移除
             self.prisoners = [(g, t) for g, t in self.prisoners if g != target_general]
+            bus.publish("city", self.name, "prisoners")
             return True
 
         # 查找该武将在囚犯列表中的关押时间
@@ -306,12 +387,13 @@ class City:
             print(f" {target_general.name} 被成功劝降，加入 {self.owner.name} 势力！")
             target_general.faction.remove_general(target_general)
 
-            self.generals.append(target_general)
+            self.add_general(target_general)
             
             self.owner.add_general(target_general)
 
             # 从囚犯列表中移除
             self.prisoners = [(g, t) for g, t in self.prisoners if g != target_general]
+            bus.publish("city", self.name, "prisoners")
             return True
         else:
             print(f" {target_general.name} 拒绝了劝降。")
@@ -321,16 +403,53 @@ class City:
         #从该城市移除该武将
         if g in self.generals:
             self.generals.remove(g)
+            if self._slot is not None: # 绑定世界存储时同步武将的驻守城池（见 world_store）
+                self._slot[0].station(g, None)
+            bus.publish("city", self.name, "generals")
 
         if self.officer_agriculture and self.officer_agriculture == g: # g是城市的农业官员
             self.officer_agriculture = None
+            bus.publish("city", self.name, "officers")
         
         if self.officer_commerce and self.officer_commerce == g: # g是城市的商业官员
             self.officer_commerce = None
+            bus.publish("city", self.name, "officers")
+
+    def add_general(self, g: "General"):
+        #武将进驻该城市
+        self.generals.append(g)
+        if self._slot is not None:
+            self._slot[0].station(g, self)
+        bus.publish("city", self.name, "generals")
+
+    def restore_generals(self, roster: List["General"]):
+        """按 roster 恢复驻守名单（撤销调遣时按原顺序归位）"""
+        self.generals[:] = roster
+        if self._slot is not None:
+            for g in roster:
+                self._slot[0].station(g, self)
+        bus.publish("city", self.name, "generals")
+
+    def add_prisoner(self, g: "General"):
+        #关押武将，关押回合数从0开始
+        self.prisoners.append((g, 0))
+        bus.publish("city", self.name, "prisoners")
+
+    def set_officers(self, agriculture: Optional["General"], commerce: Optional["General"]):
+        #设置农业、商业开发官员（None 表示空缺）
+        self.officer_agriculture = agriculture
+        self.officer_commerce = commerce
+        bus.publish("city", self.name, "officers")
+
+    def change_resources(self, food: int = 0, gold: int = 0):
+        #增减城内钱粮（负数为支出）
+        self.food += food
+        self.gold += gold
+        bus.publish("city", self.name, "resources")
       
-def run_away(general: "General", city: "City"): # 武将逃跑逻辑
+def run_away(general: "General", city: "City", rng=random): # 武将逃跑逻辑（rng 同 Army.duel）
     if len(general.faction.cities) <= 1: # 最后一座城
-        if general != general.faction.ruler and random.random() < 0.1: # 如果不是主公就有10%概率逃跑下野
+        if general != general.faction.ruler and rng.random() < 0.1: # 如果不是主公就有10%概率逃跑下野
             general.faction.remove_general(general)
             city.remove_general(general) # 下野到被攻击的城市中
             city.wild_generals.append(general)
@@ -339,9 +458,30 @@ def run_away(general: "General", city: "City"): # 武将逃跑逻辑
         if city in cities_wo_enemy:
             cities_wo_enemy.remove(city)
 
-        dest = random.choice(cities_wo_enemy)
+        dest = rng.choice(cities_wo_enemy)
         city.remove_general(general)
-        dest.generals.append(general)
+        dest.add_general(general)
+
+FORMATIONS = ("锋矢阵", "方圆阵", "投石阵")
+
+# 阵型对攻击/防御的系数
+ATTACK_FORMATION_BONUS = {
+    "投石阵": 1.2,
+    "锋矢阵": 1.5,
+    "方圆阵": 0.7,
+}
+DEFENSE_FORMATION_BONUS = {
+    "投石阵": 1.0,
+    "锋矢阵": 0.7,
+    "方圆阵": 1.3,
+}
+
+# 阵型克制关系：阵型 -> 被它克制的阵型
+FORMATION_COUNTERS = {
+    "锋矢阵": "投石阵",
+    "投石阵": "方圆阵",
+    "方圆阵": "锋矢阵",
+}
 
 @dataclass
 class Army:
@@ -363,11 +503,7 @@ class Army:
         """计算军队攻击力：统率+士气+阵型系数"""
         base = self.general.leadership * 1.5 + self.soldiers / 200
         morale_factor = 1 + self.bonus  # 增益影响
-        formation_bonus = {
-            "投石阵": 1.2,
-            "锋矢阵": 1.5,
-            "方圆阵": 0.7,
-        }.get(self.formation, 1.0)
+        formation_bonus = ATTACK_FORMATION_BONUS.get(self.formation, 1.0)
         return base * morale_factor * formation_bonus
 
     @property
@@ -375,15 +511,11 @@ class Army:
         """计算军队防御力"""
         base = self.general.leadership + self.soldiers / 300
         morale_factor = 1 + self.bonus
-        formation_bonus = {
-            "投石阵": 1.0,
-            "锋矢阵": 0.7,
-            "方圆阵": 1.3,
-        }.get(self.formation, 1.0)
+        formation_bonus = DEFENSE_FORMATION_BONUS.get(self.formation, 1.0)
         return base * morale_factor * formation_bonus
 
     # ==== 战斗逻辑 ====
-    def duel(self, enemy: "Army"):
+    def duel(self, enemy: "Army", rng=random):
         """
         主将单挑逻辑（强化版）：
         - 触发概率取决于武力差、智力差与阵型；
@@ -391,54 +523,38 @@ class Army:
         - enemy智力越高越不容易触发；
         - 锋矢阵额外提高单挑概率；
         - 由self发起单挑；
+        - rng: 随机数来源，默认为全局 random，后台模拟时传入独立的 random.Random
+        触发概率 sigmoid(0.1×武力差 - 0.08×智力差 + 0.15×锋矢阵数) 从 duel.py 的概率表中查得。
         """
         result = ""
 
-        # 计算武力与智力差
-        diff_martial = self.general.martial - enemy.general.martial
-        diff_intel = enemy.general.intellect - self.general.intellect
-
-        # sigmoid 映射函数
-        def sigmoid(x):
-            return 1 / (1 + math.exp(-x))
-
-        # 阵型修正系数
-        formation_bonus = 0.0
-        if getattr(self, "formation", None) == "锋矢阵":
-            formation_bonus += 0.15  # 提高15%的触发率
-        if getattr(enemy, "formation", None) == "锋矢阵":
-            formation_bonus += 0.15  # 敌方锋矢阵也稍微影响整体对抗气氛
-
-        # 基础触发分数：武力差正向影响，智力差负向影响
-        trigger_score = 0.1 * diff_martial - 0.08 * diff_intel + formation_bonus
-
-        # 计算触发概率
-        trigger_chance = sigmoid(trigger_score)
+        # 计算触发概率（查表）
+        trigger_chance = army_trigger_chance(self, enemy)
 
         # 是否触发
-        if random.random() > trigger_chance:
+        if rng.random() > trigger_chance:
             return "本回合未触发单挑"
 
         #print(f"{self.general.name} 向 {enemy.general.name} 发起单挑！")
         result+= f"{self.general.name} 向 {enemy.general.name} 发起单挑！\n"
 
         # 单挑胜负判定（只看武力+随机波动）
-        atk_self = self.general.martial + random.uniform(-10, 10)
-        atk_enemy = enemy.general.martial + random.uniform(-10, 10)
+        atk_self = self.general.martial + rng.uniform(-10, 10)
+        atk_enemy = enemy.general.martial + rng.uniform(-10, 10)
 
         if atk_self > atk_enemy:
-            self.bonus = random.uniform(0, 0.2)
+            self.bonus = rng.uniform(0, 0.2)
             #result = f"{self.general.name} 单挑胜利！{enemy.general.name} 军受挫。"
             result+= f"{self.general.name} 单挑胜利！{enemy.general.name} 军受挫。"
         else:
-            enemy.bonus = random.uniform(0, 0.2)
+            enemy.bonus = rng.uniform(0, 0.2)
             #result = f"{enemy.general.name} 单挑胜利！{self.general.name} 军受挫。"
             result+= f"{enemy.general.name} 单挑胜利！{self.general.name} 军受挫。"
 
         return result
 
-    def attack_enemy(self, enemy: "Army"):
-        """军队对抗逻辑：攻防计算 + 阵型克制 + 士气疲劳"""
+    def attack_enemy(self, enemy: "Army", rng=random):
+        """军队对抗逻辑：攻防计算 + 阵型克制 + 士气疲劳（rng 同 duel）"""
         # === 1. 基础攻防计算 ===
         # 我方对敌方的效能
         attack_true = self.attack * (1 + self.bonus)
@@ -448,7 +564,7 @@ class Army:
         # 随机微扰，避免完全确定性
 
         # 伤亡计算
-        enemy_loss = int(eff_self * self.soldiers * random.uniform(0.1, 0.2))
+        enemy_loss = int(eff_self * self.soldiers * rng.uniform(0.1, 0.2))
 
         # 确保至少产生小量消耗（避免完全无伤害的僵持）
         if enemy_loss <= 0 and self.soldiers > 0:
@@ -503,7 +619,7 @@ class Army:
         collapse_info = ""
 
         if enemy.soldiers <= 0: # 我军获胜
-            if random.random() < capture_prob and enemy.general != enemy.general.faction.ruler:
+            if rng.random() < capture_prob and enemy.general != enemy.general.faction.ruler:
                 collapse_info = f"{enemy.general.name} 全军覆没，被 {self.general.name} 擒获！"
                 captur_flag = True # 敌将被俘
             else:
@@ -0,0 +1,308 @@
+"""
+攻城战的核心规则（与界面无关）
+
+- fight_bout 结算一场对战（单挑 + 两军交替攻击），界面通过回调逐条展示；
+- apply_bout / finish_siege 把对战结果和城破结果应用到世界；
+- simulate_siege 只读武将属性、使用独立的随机数生成器推演电脑之间的整场攻城，
+  返回逐场对战的结果（SiegeOutcome），由调用方再按顺序提交；
+- BattleScheduler 按声明顺序收集一个势力本回合的全部攻城：涉及的城池互不相交的攻城组成一批，
+  同批的推演交给进程池（ai_planner.planning_pool）并行执行，再按声明顺序依次提交到世界（提交由调用方完成）。
+  推演是纯 Python 计算，线程池受 GIL 所限并不能缩短耗时，所以用进程；
+  交给子进程的是出战武将的脱离副本（detached_fighters）和种子，不会把整个世界一起序列化。
+  某场攻城与本批已有攻城共用城池时，先结算本批，再从它开始新的一批；
+  同批攻城只会通过"败将逃入另一座被攻城池"相互影响，这类迟到的武将不参与该城的推演；
+- 有玩家参与的攻城使用 BattleRandom：由一个种子派生出互不干扰的随机流，
+  只要记下种子和玩家的选择（replay_siege 的 bouts），就能脱离界面原样重演。
+"""
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Optional, Tuple
+import random
+
+from attribute import Army, City, Faction, General, run_away
+from pairing import plan_matchups
+from strategy import choose_formation
+
+DUEL_SKIPPED = "本回合未触发单挑"
+
+@dataclass
+class Bout:
+    """攻城中的一场对战：first 为本轮先手出阵的武将，second 为被挑战的武将"""
+    first: str
+    second: str
+    winner: str
+    loser: str
+    winner_soldiers: int # 胜者剩余兵力（败者兵力归零）
+    loser_is_attacker: bool # 败者是否属于攻城方
+    captured: bool # 败者是否被俘
+    duel_log: str = ""
+    capture_log: str = ""
+
+@dataclass
+class SiegeOutcome:
+    bouts: List[Bout] = field(default_factory=list)
+    attackers_left: List[str] = field(default_factory=list) # 战后仍有兵力的攻城武将
+    defenders_left: List[str] = field(default_factory=list) # 战后仍有兵力的守城武将
+
+    @property
+    def conquered(self) -> bool:
+        return bool(self.attackers_left) and not self.defenders_left
+
+@dataclass
+class SiegeRequest:
+    """一次待结算的攻城：seed 在主线程按声明顺序生成，保证结果可复现"""
+    origin: City
+    target: City
+    attackers: List[General]
+    seed: int
+
+class BattleRandom:
+    """
+    一场有玩家参与的攻城所用的随机数，全部由 seed 派生：
+    - choice: 电脑一方的阵型选择（strategy.choose_formation 按均衡混合策略抽取；重演时使用记录下的阵型，不再抽取）
+    - flee: 败将逃亡的去向
+    - bout(i): 第 i 场对战的单挑与交战
+    """
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.choice = random.Random(f"{seed}:choice")
+        self.flee = random.Random(f"{seed}:flee")
+
+    def bout(self, index: int) -> random.Random:
+        return random.Random(f"{self.seed}:bout:{index}")
+
+# ========== 单场对战 ==========
+
+def fight_bout(army1: Army, army2: Army, rng, on_duel: Callable[[str], None] = None,
+               on_exchange: Callable[[Army, dict], None] = None) -> Tuple[bool, dict, str]:
+    """
+    结算一场对战：随机一方尝试发起单挑，之后 army1 先攻、两军交替攻击直到一方兵力归零。
+    - on_duel(日志): 触发单挑时调用；on_exchange(出手的军队, attack_enemy 的结果): 每次攻击后调用
+    返回 (army1 是否获胜, 决胜一击的 attack_enemy 结果, 单挑日志或空串)
+    """
+    to_duel = army2 if rng.choice([True, False]) else army1
+    duel_log = to_duel.duel(army2 if to_duel is army1 else army1, rng)
+    if duel_log == DUEL_SKIPPED:
+        duel_log = ""
+    elif on_duel is not None:
+        on_duel(duel_log)
+
+    while True:
+        res = army1.attack_enemy(army2, rng)
+        if on_exchange is not None:
+            on_exchange(army1, res)
+        if res["win"]:
+            return True, res, duel_log
+        res = army2.attack_enemy(army1, rng)
+        if on_exchange is not None:
+            on_exchange(army2, res)
+        if res["win"]:
+            return False, res, duel_log
+
+def apply_bout(origin: City, target: City, winner: General, loser: General, winner_soldiers: int,
+               loser_is_attacker: bool, captured: bool, rng=random):
+    """对战结果落地：更新兵力；攻方败将被俘或逃回出发城，守方败将被俘或逃亡（rng 决定去向）"""
+    winner.army = winner_soldiers
+    loser.army = 0
+    if loser_is_attacker: # 攻军溃散时逃跑回出发城即可
+        if captured:
+            origin.remove_general(loser)
+            target.add_prisoner(loser)
+    else:
+        if captured:
+            target.remove_general(loser)
+            origin.add_prisoner(loser)
+        else: # 守军战败触发逃亡
+            run_away(loser, target, rng)
+
+def flee_unarmed(target: City, rng=random):
+    """开战前，守城方无兵的武将先行逃亡"""
+    for general in target.generals.copy():
+        if general.army <= 0:
+            run_away(general, target, rng)
+
+def finish_siege(origin: City, target: City, attackers: List[General], rng=random) -> Optional[str]:
+    """
+    城破：剩余攻城武将进驻，城池易主、官员清空。
+    若这是守方最后一城，城内武将全部被俘、该势力武将全部除名，返回被消灭的势力名；否则返回 None。
+    """
+    old_owner = target.owner
+    destroyed = None
+    if len(old_owner.cities) <= 1: # 最后一城
+        if len(old_owner.cities) != 1:
+            assert(0), "势力所拥有的城池数小于等于0"
+        for g in target.generals.copy():
+            target.remove_general(g) # 从该城池移除该武将
+            origin.add_prisoner(g) #加入监狱
+        for g in old_owner.generals.copy():
+            old_owner.remove_general(g)
+        destroyed = old_owner.name
+    else: # 未参与战斗、滞留城中的守将随城破逃亡
+        for g in target.generals.copy():
+            run_away(g, target, rng)
+
+    old_owner.remove_city(target)
+
+    # 剩余攻城军进入目标城，攻方势力占领新城，将所有官员设置为空
+    for g in attackers:
+        origin.remove_general(g)
+        target.add_general(g)
+    origin.owner.add_city(target)
+    target.set_officers(None, None)
+    return destroyed
+
+# ========== 电脑之间的攻城 ==========
+
+def simulate_siege(attackers: List[General], defenders: List[General], rng: random.Random) -> SiegeOutcome:
+    """
+    推演一场攻城（电脑对电脑规则）：
+    - 双方轮流先手，先手方按 pairing.plan_matchups 出阵：取当前兵力下把握最大的一组对阵，
+      双方阵型由 strategy.choose_formation 按均衡混合策略抽取；
+    - 每场对战由 fight_bout 结算。
+    只读武将属性，兵力记在局部变量中，可在子进程中对 detached_fighters 的副本执行。
+    """
+    soldiers: Dict[str, int] = {g.name: g.army for g in attackers + defenders}
+    atk_side = list(attackers)
+    dfd_side = list(defenders)
+    outcome = SiegeOutcome()
+
+    attack = True # 攻军先手
+    while atk_side and dfd_side:
+        movers, others = (atk_side, dfd_side) if attack else (dfd_side, atk_side)
+        matchup = plan_matchups(movers, others, soldiers)[0]
+        first, second = matchup.first, matchup.second
+        formation_first = choose_formation(rng, first, second, True, soldiers)
+        formation_second = choose_formation(rng, first, second, False, soldiers)
+
+        army1 = Army(formation_first, first, soldiers[first.name])
+        army2 = Army(formation_second, second, soldiers[second.name])
+        first_won, res, duel_log = fight_bout(army1, army2, rng)
+        winner, loser = (army1, army2) if first_won else (army2, army1)
+
+        loser_is_attacker = attack != first_won # 先手一方在 attack 为真时是攻城方
+        soldiers[winner.general.name] = winner.soldiers
+        soldiers[loser.general.name] = 0
+        outcome.bouts.append(Bout(first.name, second.name, winner.general.name, loser.general.name,
+                                  winner.soldiers, loser_is_attacker, res["capture"],
+                                  duel_log, res["capture_log"]))
+        side = atk_side if loser_is_attacker else dfd_side
+        side[:] = [g for g in side if g is not loser.general]
+
+        attack = not attack # 下一轮由另一方先攻
+
+    outcome.attackers_left = [g.name for g in atk_side]
+    outcome.defenders_left = [g.name for g in dfd_side]
+    return outcome
+
+def detached_fighters(generals: List[General]) -> List[General]:
+    """
+    出战武将的脱离副本，供子进程推演：属性与原武将相同，所属势力换成只带主公的替身
+    （attack_enemy 据此判断败将是否为主公），序列化时不会牵连整个世界
+    """
+    stand_ins: Dict[int, Faction] = {} # 原势力的 id -> 替身
+    copies = []
+    for general in generals:
+        copy = replace(general, faction=None)
+        faction = general.faction
+        if faction is not None:
+            stand_in = stand_ins.get(id(faction))
+            if stand_in is None:
+                stand_in = stand_ins[id(faction)] = Faction(faction.name, replace(faction.ruler, faction=None))
+            if general is faction.ruler:
+                stand_in.ruler = copy
+            copy.faction = stand_in
+        copies.append(copy)
+    return copies
+
+def simulate_job(attackers: List[General], defenders: List[General], seed: int) -> SiegeOutcome:
+    """进程池中执行的一场攻城推演（参数可序列化）"""
+    return simulate_siege(attackers, defenders, random.Random(seed))
+
+def siege_is_valid(request: SiegeRequest) -> bool:
+    """提交前复核：攻方仍占有出发城、目标仍属他人、出战武将仍在出发城且有兵"""
+    owner = request.origin.owner
+    return (owner is not None and request.target.owner is not owner
+            and any(g in request.origin.generals and g.army > 0 for g in request.attackers))
+
+class BattleScheduler:
+    """
+    一个势力本回合攻城的调度器
+    - executor: 推演用的进程池（ai_planner.planning_pool）；为 None 时在当前进程依次推演，结果相同
+    - commit(request, outcome): 由调用方把推演结果应用到世界，在当前线程按声明顺序调用
+    """
+    def __init__(self, executor=None):
+        self.executor = executor
+
+    def run(self, requests: List[SiegeRequest], commit: Callable[[SiegeRequest, SiegeOutcome], None]):
+        wave: List[SiegeRequest] = []
+        busy = set() # 本批已占用的城名
+        for request in requests:
+            cities = {request.origin.name, request.target.name}
+            if cities & busy:
+                self._resolve(wave, commit)
+                wave, busy = [], set()
+            wave.append(request)
+            busy |= cities
+        self._resolve(wave, commit)
+
+    def _resolve(self, wave: List[SiegeRequest], commit):
+        jobs = []
+        for request in wave:
+            if not siege_is_valid(request):
+                continue
+            attackers = [g for g in request.attackers if g in request.origin.generals and g.army > 0]
+            defenders = [g for g in request.target.generals if g.army > 0]
+            jobs.append((request, attackers, defenders))
+
+        if self.executor is None or len(jobs) <= 1: # 只有一场时省掉进程间往返
+            outcomes = [simulate_job(a, d, r.seed) for r, a, d in jobs]
+        else:
+            futures = [self.executor.submit(simulate_job, detached_fighters(a), detached_fighters(d), r.seed)
+                       for r, a, d in jobs]
+            outcomes = [f.result() for f in futures]
+
+        for (request, attackers, _), outcome in zip(jobs, outcomes):
+            request.attackers = attackers
+            commit(request, outcome)
+
+# ========== 有玩家参与的攻城重演 ==========
+
+def replay_siege(origin: City, target: City, attackers: List[General], seed: int,
+                 bouts: List[List[str]], retreat: bool = False,
+                 log: Callable[[str], None] = None, fight=fight_bout) -> Tuple[bool, Optional[str]]:
+    """
+    按记录重演一场有玩家参与的攻城（与界面中的攻城使用同样的 BattleRandom 派生方式）：
+    - bouts: 每场对战的 [先手武将, 先手阵型, 应战武将, 应战阵型]
+    - retreat: 攻方是否在记录的对战之后撤军
+    - fight: 结算单场对战的函数（签名同 fight_bout），可换成战斗窗口逐场回放
+    返回 (是否城破, 被消灭的势力名或 None)
+    """
+    log = log or (lambda msg: None)
+    brng = BattleRandom(seed)
+    flee_unarmed(target, brng.flee)
+
+    atk_side = [g for g in attackers if g.army > 0]
+    dfd_side = [g for g in target.generals if g.army > 0]
+    by_name = {g.name: g for g in atk_side + dfd_side}
+
+    attack = True # 攻军先手
+    for index, (first_name, formation_first, second_name, formation_second) in enumerate(bouts):
+        first, second = by_name[first_name], by_name[second_name]
+        log(f"{first.name}军 向 {second.name}军发起了对战")
+        army1 = Army(formation_first, first, first.army)
+        army2 = Army(formation_second, second, second.army)
+        first_won, res, _ = fight(army1, army2, brng.bout(index))
+        winner, loser = (army1, army2) if first_won else (army2, army1)
+        if res["capture_log"]:
+            log(res["capture_log"])
+
+        loser_is_attacker = attack != first_won
+        apply_bout(origin, target, winner.general, loser.general, winner.soldiers,
+                   loser_is_attacker, res["capture"], brng.flee)
+        side = atk_side if loser_is_attacker else dfd_side
+        side[:] = [g for g in side if g is not loser.general]
+        attack = not attack
+
+    if retreat or not atk_side:
+        return False, None
+    assert not dfd_side, "记录的对战结束时守城军仍未耗尽"
+    return True, finish_siege(origin, target, atk_side, brng.flee)
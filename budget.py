@@ -0,0 +1,124 @@
+"""
+城池每月的金钱预算（与界面无关）
+
+月度更新中金钱的去向有三类：商业官员开发、农业官员开发、未满编武将募兵，钱不够的一项本月跳过。
+- CostSheet: 月度更新开始时把城中每个武将的俸禄与单兵募兵价算好一次（俸禄只取决于隐藏的贪婪属性），
+  俸禄估算、官员开发与募兵都从这张表取值；
+- BudgetPolicy: 预算策略，决定各项开支的先后。城池按 City.budget_policy 选用 POLICIES 中的策略，
+  默认的 DevelopmentFirst 即原先固定的 商业 -> 农业 -> 武将顺序募兵；
+- allocate: 按策略给出的顺序贪心分配金钱，默认顺序下逐项的运算（包括浮点数的先后）与原先逐个结算完全相同。
+"""
+from dataclasses import dataclass, field
+from typing import ClassVar, Dict, List, Optional, Sequence, Union
+
+COMMERCE = "commerce" # 开支项：商业官员开发
+AGRICULTURE = "agriculture" # 开支项：农业官员开发
+Item = Union[str, int] # 开支项：COMMERCE / AGRICULTURE，或武将在城中的下标（该武将募兵）
+
+@dataclass
+class CostSheet:
+    """一座城池本月的开支表，与 city.generals 顺序一致"""
+    salaries: List[float] # 各武将月俸
+    recruit_costs: List[float] # 各武将招募一名士兵所需金钱（月俸 / 满编兵力）
+    commerce: Optional[float] # 商业官员月俸，无官员为 None
+    agriculture: Optional[float] # 农业官员月俸，无官员为 None
+    max_soldiers: int
+
+    @classmethod
+    def build(cls, generals, officer_commerce, officer_agriculture, max_soldiers: int) -> "CostSheet":
+        salaries = [g.monthly_salary() for g in generals]
+        return cls(salaries, [salary / max_soldiers for salary in salaries],
+                   officer_commerce.monthly_salary() if officer_commerce is not None else None,
+                   officer_agriculture.monthly_salary() if officer_agriculture is not None else None,
+                   max_soldiers)
+
+    def salary_demand(self, armies: Sequence[int]):
+        """俸禄总需求：未满编武将按缺员比例的募兵俸禄（四舍五入）+ 官员俸禄"""
+        total = 0
+        for salary, army in zip(self.salaries, armies):
+            if army < self.max_soldiers: # 士兵未满，本回合需要募兵
+                total += round(salary * ((self.max_soldiers - army) / self.max_soldiers))
+        if self.agriculture is not None:
+            total += self.agriculture
+        if self.commerce is not None:
+            total += self.commerce
+        return total
+
+@dataclass
+class Allocation:
+    """本月金钱的分配结果"""
+    gold: float # 分配后剩余的金钱
+    commerce: bool = False # 商业官员是否领到开发经费
+    agriculture: bool = False # 农业官员是否领到开发经费
+    recruits: List[int] = field(default_factory=list) # 各武将本月募兵数
+
+# ========== 预算策略 ==========
+
+class BudgetPolicy:
+    """预算策略：给出本月各项开支的先后顺序（只读城池，不修改）"""
+    name: ClassVar[str] = ""
+    label: ClassVar[str] = "" # 界面与日志中显示的名称
+
+    def order(self, city, sheet: CostSheet) -> List[Item]:
+        raise NotImplementedError
+
+class DevelopmentFirst(BudgetPolicy):
+    """内政优先：商业 -> 农业 -> 武将按城中顺序募兵"""
+    name = "development"
+    label = "内政优先"
+
+    def order(self, city, sheet: CostSheet) -> List[Item]:
+        return [COMMERCE, AGRICULTURE, *range(len(sheet.salaries))]
+
+class RecruitFirst(BudgetPolicy):
+    """募兵优先：武将按城中顺序募兵 -> 商业 -> 农业"""
+    name = "recruit"
+    label = "募兵优先"
+
+    def order(self, city, sheet: CostSheet) -> List[Item]:
+        return [*range(len(sheet.salaries)), COMMERCE, AGRICULTURE]
+
+class FrontierRecruitFirst(BudgetPolicy):
+    """边境募兵优先：与敌城接壤时募兵优先，内地城池内政优先"""
+    name = "frontier"
+    label = "边境募兵优先"
+
+    def order(self, city, sheet: CostSheet) -> List[Item]:
+        if any(nb.owner is not city.owner for nb in city.neighbors):
+            return POLICIES[RecruitFirst.name].order(city, sheet)
+        return POLICIES[DevelopmentFirst.name].order(city, sheet)
+
+POLICIES: Dict[str, BudgetPolicy] = {policy.name: policy for policy in
+                                     (DevelopmentFirst(), RecruitFirst(), FrontierRecruitFirst())}
+DEFAULT_POLICY = DevelopmentFirst.name
+
+def policy_of(city) -> BudgetPolicy:
+    """城池当前使用的预算策略（未知的策略名按默认处理）"""
+    return POLICIES.get(city.budget_policy, POLICIES[DEFAULT_POLICY])
+
+# ========== 分配 ==========
+
+def allocate(sheet: CostSheet, gold, armies: Sequence[int], order: Optional[Sequence[Item]] = None) -> Allocation:
+    """
+    按 order 的先后贪心分配 gold，armies 为口粮结算后的各武将兵力；
+    order 缺省为 商业 -> 农业 -> 武将顺序募兵（DevelopmentFirst）
+    """
+    if order is None:
+        order = [COMMERCE, AGRICULTURE, *range(len(armies))]
+    result = Allocation(gold, recruits=[0] * len(armies))
+    for item in order:
+        if item == COMMERCE:
+            if sheet.commerce is not None and gold >= sheet.commerce: # 存在商业官员并且资金够其开发商业
+                gold -= sheet.commerce
+                result.commerce = True
+        elif item == AGRICULTURE:
+            if sheet.agriculture is not None and gold >= sheet.agriculture: # 存在农业官员并且资金够其开发农业
+                gold -= sheet.agriculture
+                result.agriculture = True
+        elif armies[item] < sheet.max_soldiers:
+            cost = sheet.recruit_costs[item]
+            num_recruit = min(sheet.max_soldiers - armies[item], int(gold // cost)) # 实际可招募的士兵数
+            result.recruits[item] = num_recruit
+            gold = max(0, gold - int(num_recruit * cost)) # 避免小于0
+    result.gold = gold
+    return result
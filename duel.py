@@ -0,0 +1,91 @@
+"""
+主将单挑的概率表（与界面无关）
+
+Army.duel 中的两个概率只取决于小整数：
+- 触发概率 sigmoid(0.1×武力差 - 0.08×智力差 + 0.15×锋矢阵数)：武力差、智力差在 [-100, 100]，双方锋矢阵数为 0~2；
+- 单挑胜率：双方武力各加 [-10, 10] 的均匀波动后比较，两个波动之差服从 [-20, 20] 上的三角分布，
+  发起方的胜率只取决于武力差。
+两张表在首次使用时一次算好（触发概率共 3×201×201 项），此后单挑、批量推演与界面展示都只是查表。
+表中的触发概率与原先每次现算的浮点值逐位相同，查表不改变任何随机结果；超出表范围的输入仍然现算。
+"""
+from array import array
+from dataclasses import dataclass
+from typing import Optional
+import math
+
+DIFF_RANGE = 100 # 属性差的范围 [-DIFF_RANGE, DIFF_RANGE]
+MARTIAL_NOISE = 10 # 单挑时武力的均匀波动幅度
+CHARGE_FORMATION = "锋矢阵" # 提高单挑触发率的阵型
+
+_SIZE = 2 * DIFF_RANGE + 1
+_trigger_table: Optional[array] = None
+_win_table: Optional[array] = None
+
+def _sigmoid(x: float) -> float:
+    return 1 / (1 + math.exp(-x))
+
+def _trigger_score(diff_martial: int, diff_intel: int, charges: int) -> float:
+    """触发分数：武力差正向影响，智力差负向影响，每个锋矢阵 +0.15（与 Army.duel 的累加顺序一致）"""
+    formation_bonus = 0.0
+    for _ in range(charges):
+        formation_bonus += 0.15
+    return 0.1 * diff_martial - 0.08 * diff_intel + formation_bonus
+
+def _win_probability(diff_martial: float) -> float:
+    """P(武力差 + 波动差 > 0)，波动差为两个 [-w, w] 均匀分布之差（三角分布）"""
+    span = 2 * MARTIAL_NOISE
+    if diff_martial <= -span:
+        return 0.0
+    if diff_martial >= span:
+        return 1.0
+    if diff_martial <= 0:
+        return (diff_martial + span) ** 2 / (2 * span * span)
+    return 1 - (span - diff_martial) ** 2 / (2 * span * span)
+
+def _in_table(value) -> bool:
+    return isinstance(value, int) and -DIFF_RANGE <= value <= DIFF_RANGE
+
+def trigger_chance(diff_martial: int, diff_intel: int, charges: int) -> float:
+    """
+    单挑触发概率
+    - diff_martial: 发起方武力 - 对方武力
+    - diff_intel: 对方智力 - 发起方智力
+    - charges: 双方中使用锋矢阵的个数
+    """
+    global _trigger_table
+    if not (_in_table(diff_martial) and _in_table(diff_intel) and 0 <= charges <= 2):
+        return _sigmoid(_trigger_score(diff_martial, diff_intel, charges))
+    if _trigger_table is None:
+        _trigger_table = array("d", (_sigmoid(_trigger_score(m, i, c)) for c in range(3)
+                                     for m in range(-DIFF_RANGE, DIFF_RANGE + 1)
+                                     for i in range(-DIFF_RANGE, DIFF_RANGE + 1)))
+    return _trigger_table[(charges * _SIZE + diff_martial + DIFF_RANGE) * _SIZE + diff_intel + DIFF_RANGE]
+
+def win_chance(diff_martial: int) -> float:
+    """单挑发生后发起方获胜的概率，diff_martial 为发起方武力 - 对方武力"""
+    global _win_table
+    if not _in_table(diff_martial):
+        return _win_probability(diff_martial)
+    if _win_table is None:
+        _win_table = array("d", (_win_probability(m) for m in range(-DIFF_RANGE, DIFF_RANGE + 1)))
+    return _win_table[diff_martial + DIFF_RANGE]
+
+def charges_of(army, enemy) -> int:
+    """双方中使用锋矢阵的个数"""
+    return (getattr(army, "formation", None) == CHARGE_FORMATION) + (getattr(enemy, "formation", None) == CHARGE_FORMATION)
+
+def army_trigger_chance(army, enemy) -> float:
+    """army 向 enemy 发起单挑的触发概率"""
+    return trigger_chance(army.general.martial - enemy.general.martial,
+                          enemy.general.intellect - army.general.intellect, charges_of(army, enemy))
+
+@dataclass
+class DuelOdds:
+    """一场对战开始前单挑的概率（battle.fight_bout 中双方各有一半机会成为发起方）"""
+    chance: float # 触发单挑的概率
+    first_wins: float # 单挑发生时 army1 获胜的概率
+
+def duel_odds(army1, army2) -> DuelOdds:
+    chance = (army_trigger_chance(army1, army2) + army_trigger_chance(army2, army1)) / 2
+    # 无论谁发起，胜负都只比较武力加波动，army1 的胜率只取决于双方武力差
+    return DuelOdds(chance, win_chance(army1.general.martial - army2.general.martial))
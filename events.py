@@ -0,0 +1,56 @@
+"""
+模型变更事件总线
+
+attribute.py 中的模型在发生变化时发布 ChangeEvent，界面层订阅后只记录"哪里脏了"，
+再合并到下一帧统一重绘，避免每次小改动都重排整个面板。
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, List
+import threading
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """
+    一次模型变更
+    - kind: city（城池） / faction（势力）
+    - name: 城池名或势力名
+    - part: 变化的部分
+        city: resources（钱粮） / generals（驻守武将） / prisoners（囚犯） / officers（官员） / owner（归属）
+        faction: cities（城池列表） / generals（武将列表）
+    """
+    kind: str
+    name: str
+    part: str
+
+class EventBus:
+    def __init__(self):
+        self._subscribers: List[Callable[[ChangeEvent], None]] = []
+        self._local = threading.local()
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None]):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[ChangeEvent], None]):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    @contextmanager
+    def muted(self):
+        """在当前线程内屏蔽事件，用于电脑规划时修改世界快照副本"""
+        depth = getattr(self._local, "muted", 0)
+        self._local.muted = depth + 1
+        try:
+            yield
+        finally:
+            self._local.muted = depth
+
+    def publish(self, kind: str, name: str, part: str):
+        if not self._subscribers or getattr(self._local, "muted", 0):
+            return
+        event = ChangeEvent(kind, name, part)
+        for callback in list(self._subscribers):
+            callback(event)
+
+bus = EventBus()
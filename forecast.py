@@ -0,0 +1,298 @@
+"""
+两军交战的战果推演（与界面无关，不消耗任何随机数）
+
+Army.attack_enemy 的一次攻击：守方损失 int(效能 × 攻方兵力 × U(0.1, 0.2))，至少 10 人；
+攻方阵型克制守方时守方再损失剩余兵力的 5%（同样至少 10 人）。双方轮流攻击直到一方兵力归零。
+battle.fight_bout 中 army1 先攻。
+
+这里不抽样，而是按攻击次数逐层推进双方兵力的概率分布（动态规划）：
+- 每次攻击的伤亡是随机系数 u ~ U(0.1, 0.2) 的阶梯函数：守方被歼灭的概率按取整与下限精确算出，
+  未被歼灭的部分取值不多时逐个整数精确计算，否则分成 NODES 个等概率小段、每段取精确的平均伤亡（拆到相邻两个整数上）；
+- 每层之后把双方兵力落在同一格子里的状态合并为一个（概率加权的平均兵力），格子边长为双方总兵力的 1/GRID
+  （至少 1 人，小规模对战即逐人精确计算），每层的状态数因此与兵力规模无关，通常只有几十到几百个；
+  合并抹掉的格内方差记在状态上，该方下次受到攻击时再补回，否则以弱胜强的概率会被系统性低估；
+- 结果按双方的统率、阵型、兵力与增益缓存，同一对阵再次查询只是查字典。
+
+- forecast: 两支军队按当前增益直接交战；
+- forecast_bout: 计入开战前的单挑（duel.duel_odds 给出的触发率与胜率，胜方增益取 U(0, 0.2) 的几个代表值）；
+- payoff_matrix: 一对武将在 3×3 种阵型组合下的推演（阵型选择界面的推荐用），按双方统率与兵力缓存；
+- quick_win_probability: 不推演分布、只按期望伤亡推到底的粗略胜率，用于一次要估计成百上千对阵的场合。
+与 ai_planner.expected_fight 不同，这里双方的阵型是已知的，并给出胜率与战后兵力的分布，而不只是一条期望曲线。
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+import math
+
+from attribute import ATTACK_FORMATION_BONUS, DEFENSE_FORMATION_BONUS, FORMATION_COUNTERS, FORMATIONS
+from duel import duel_odds
+
+GRID = 100 # 合并状态的格子边长 = 双方总兵力 / GRID
+NODES = 6 # 每次攻击随机系数的代表点数
+PAYOFF_GRID = 40 # payoff_matrix 一次要推演 9 场，用较粗的格子
+QUICK_SCALE = 0.1 # quick_win_probability 的 logistic 尺度（按 forecast_sides 的结果标定）
+BONUS_NODES = (0.05, 0.15) # 单挑胜方增益 U(0, 0.2) 的代表点
+LOSS_RANGE = (0.1, 0.2) # attack_enemy 中随机系数的范围
+MIN_LOSS = 10 # 每次攻击、每次克制追加伤亡的下限
+COUNTER_RATE = 0.05 # 阵型克制时守方追加损失的比例
+
+@dataclass(frozen=True)
+class Side:
+    """参与推演的一方（可哈希，作为缓存的键）"""
+    leadership: int
+    formation: str
+    soldiers: int
+    bonus: float = 0.0
+
+    @classmethod
+    def of(cls, army, bonus=None) -> "Side":
+        return cls(army.general.leadership, army.formation, army.soldiers, army.bonus if bonus is None else bonus)
+
+    def attack(self, soldiers: float) -> float:
+        """与 attack_enemy 中的 attack_true 相同：Army.attack 再乘一次 (1 + 增益)"""
+        base = self.leadership * 1.5 + soldiers / 200
+        return base * (1 + self.bonus) * ATTACK_FORMATION_BONUS.get(self.formation, 1.0) * (1 + self.bonus)
+
+    def defense(self, soldiers: float) -> float:
+        """与 Army.defense 相同"""
+        base = self.leadership + soldiers / 300
+        return base * (1 + self.bonus) * DEFENSE_FORMATION_BONUS.get(self.formation, 1.0)
+
+@dataclass
+class Forecast:
+    """一场对战的推演结果（概率均为无条件概率）"""
+    win_probability: float # army1 获胜的概率
+    expected_exchanges: float # 期望攻击次数（双方合计）
+    expected_left: Tuple[float, float] # 战后双方的期望兵力（败方为 0）
+    resolution: int = 1 # 兵力分布的取整粒度
+    left1: Dict[int, float] = field(default_factory=dict) # army1 获胜时剩余兵力（按 resolution 取整）-> 概率
+    left2: Dict[int, float] = field(default_factory=dict) # army2 获胜时剩余兵力 -> 概率
+
+    def expected_losses(self, soldiers1: int, soldiers2: int) -> Tuple[float, float]:
+        """双方的期望伤亡"""
+        return soldiers1 - self.expected_left[0], soldiers2 - self.expected_left[1]
+
+def _floor_integral(t: float) -> float:
+    """∫_0^t 单次攻击伤亡 ds，伤亡为 int(s)、s < 1 时按下限记为 MIN_LOSS"""
+    if t <= 1:
+        return MIN_LOSS * t
+    n = int(t)
+    return MIN_LOSS + n * (n - 1) / 2 + n * (t - n)
+
+def _exchange(x: float, y: float, eff: float, counter: bool) -> Tuple[float, List[Tuple[float, float]]]:
+    """
+    兵力 x、效能 eff 的一方攻击兵力 y 的一方一次（同 attack_enemy），返回 (守方被歼灭的概率, [(概率, 守方剩余兵力)])
+    随机系数 u 上伤亡为 int(eff·x·u) 这一阶梯函数：先精确求出守方被歼灭的 u 段，
+    其余部分等分为 NODES 段，每段的伤亡取该段上的精确平均值。
+    """
+    low, high = LOSS_RANGE
+    k = eff * x
+    # 伤亡 L 满足 L >= y 即被歼灭；被克制时追加损失对剩余不足 2×MIN_LOSS 的守方按 MIN_LOSS 计，剩余不超过 MIN_LOSS 即被歼灭
+    m = math.ceil(y - MIN_LOSS if counter else y)
+    if m <= 0 or k <= 0:
+        return 1.0, []
+    hi = min(high, m / k)
+    branches = []
+    lo = low
+    if lo < 1 / k: # k·u < 1 的一段伤亡取下限 MIN_LOSS，单独作为一支
+        lo = min(1 / k, high)
+        if m > MIN_LOSS:
+            branches.append(((lo - low) / (high - low), y - MIN_LOSS))
+    if hi > lo and math.ceil(k * hi) - int(k * lo) <= NODES: # 取值不多时逐个整数伤亡精确计算
+        for loss in range(int(k * lo), math.ceil(k * hi)):
+            w = min(hi, (loss + 1) / k) - max(lo, loss / k)
+            if w > 0:
+                branches.append((w / (high - low), y - loss))
+    elif hi > lo:
+        width = (hi - lo) / NODES
+        for i in range(NODES):
+            u0 = lo + i * width
+            loss = (_floor_integral(k * (u0 + width)) - _floor_integral(k * u0)) / (k * width)
+            # 平均伤亡拆到相邻的两个整数上（保持期望），兵力始终是整数，取整与下限的判断与游戏中一致
+            whole = int(loss)
+            frac = loss - whole
+            branches.append((width / (high - low) * (1 - frac), y - whole))
+            if frac > 0:
+                branches.append((width / (high - low) * frac, y - whole - 1))
+    if counter:
+        branches = [(w, left - (int(left * COUNTER_RATE) or MIN_LOSS)) for w, left in branches]
+    return 1.0 - sum(w for w, _ in branches), branches
+
+def _spread(killed: float, branches: List[Tuple[float, float]], variance: float) -> Tuple[float, List[Tuple[float, float]]]:
+    """
+    合并格子时格内各状态的兵力被取成均值，离散程度随之丢失；
+    这里把守方各分支围绕其均值拉开，补回 variance 的方差，拉开后兵力不为正的分支计为被歼灭
+    """
+    total = sum(w for w, _ in branches)
+    mean = sum(w * left for w, left in branches) / total
+    spread = sum(w * (left - mean) ** 2 for w, left in branches) / total
+    if spread > 0:
+        scale = math.sqrt(1 + variance / spread)
+        moved = [(w, mean + (left - mean) * scale) for w, left in branches]
+    else: # 只有一个取值时拆成均值两侧的两支
+        sd = math.sqrt(variance)
+        moved = [(total / 2, mean - sd), (total / 2, mean + sd)]
+    kept = [(w, left) for w, left in moved if left > 0]
+    return killed + sum(w for w, left in moved if left <= 0), kept
+
+def _add(dist: Dict[int, float], soldiers: float, p: float, resolution: int):
+    key = int(round(soldiers / resolution)) * resolution
+    dist[key] = dist.get(key, 0.0) + p
+
+@lru_cache(maxsize=4096)
+def forecast_sides(side1: Side, side2: Side, grid: int = GRID) -> Forecast:
+    """side1 先攻，两军交替攻击直到一方兵力归零；grid 越小推演越快、越粗糙"""
+    counters = (FORMATION_COUNTERS.get(side1.formation) == side2.formation,
+                FORMATION_COUNTERS.get(side2.formation) == side1.formation)
+
+    resolution = max(1, (side1.soldiers + side2.soldiers) // grid)
+    result = Forecast(0.0, 0.0, (0.0, 0.0), resolution)
+    if side1.soldiers <= 0 or side2.soldiers <= 0: # 一方无兵，不发生攻击
+        won = side2.soldiers <= 0 < side1.soldiers
+        result.win_probability = float(won)
+        result.expected_left = (float(side1.soldiers), float(side2.soldiers))
+        _add(result.left1 if won else result.left2, side1.soldiers if won else side2.soldiers, 1.0, resolution)
+        return result
+
+    left1 = left2 = 0.0
+    # (概率, army1 兵力, army2 兵力, army1 兵力的格内方差, army2 兵力的格内方差)
+    states = [(1.0, side1.soldiers, side2.soldiers, 0.0, 0.0)]
+    exchanges = 0
+    while states:
+        exchanges += 1
+        first = exchanges % 2 == 1 # 奇数次攻击由 army1 出手
+        attacker, defender = (side1, side2) if first else (side2, side1)
+        counter = counters[0] if first else counters[1]
+        cells: Dict[Tuple[int, int], list] = {}
+        for p, a, d, va, vd in states:
+            x, y = (a, d) if first else (d, a)
+            attack_true = attacker.attack(x)
+            eff = attack_true / (attack_true + defender.defense(y) + 1e-6)
+            killed, branches = _exchange(x, y, eff, counter)
+            if resolution > 1 and branches and (vd if first else va) > 0: # 把合并时抹掉的离散程度还给守方
+                killed, branches = _spread(killed, branches, vd if first else va)
+            if killed > 0: # 本次攻击决出胜负
+                q = p * killed
+                result.expected_exchanges += q * exchanges
+                if first:
+                    result.win_probability += q
+                    left1 += q * x
+                    _add(result.left1, x, q, resolution)
+                else:
+                    left2 += q * x
+                    _add(result.left2, x, q, resolution)
+            for w, y_left in branches:
+                q = p * w
+                a2, d2, va2, vd2 = (a, y_left, va, 0.0) if first else (y_left, d, 0.0, vd)
+                cell = cells.setdefault((int(a2 // resolution), int(d2 // resolution)), [0.0] * 5)
+                cell[0] += q
+                cell[1] += q * a2
+                cell[2] += q * d2
+                cell[3] += q * (a2 * a2 + va2)
+                cell[4] += q * (d2 * d2 + vd2)
+        states = []
+        for p, sa, sd, sa2, sd2 in cells.values():
+            a, d = sa / p, sd / p
+            states.append((p, round(a), round(d), max(sa2 / p - a * a, 0.0), max(sd2 / p - d * d, 0.0)))
+    result.expected_left = (left1, left2)
+    return result
+
+def quick_win_probability(side1: Side, side2: Side) -> float:
+    """
+    side1 先攻时获胜概率的快速估计（约为 forecast_sides 的千分之一耗时，供需要大量对阵的配对优化使用）：
+    按期望伤亡把交战推演到底，以胜方剩余兵力占初始兵力的比例 margin（army2 获胜时取负）
+    经 logistic(margin / QUICK_SCALE) 换算成胜率；与 forecast_sides 相比平均误差约 0.01~0.04，势均力敌时误差较大
+    """
+    if side1.soldiers <= 0 or side2.soldiers <= 0:
+        return float(side2.soldiers <= 0 < side1.soldiers)
+    low, high = LOSS_RANGE
+    mean_rate = (low + high) / 2
+    counters = (FORMATION_COUNTERS.get(side1.formation) == side2.formation,
+                FORMATION_COUNTERS.get(side2.formation) == side1.formation)
+    a, d = float(side1.soldiers), float(side2.soldiers)
+    while True:
+        attack_true = side1.attack(a)
+        d -= max(attack_true / (attack_true + side2.defense(d) + 1e-6) * a * mean_rate, MIN_LOSS)
+        if counters[0] and d > 0:
+            d -= max(d * COUNTER_RATE, MIN_LOSS)
+        if d <= 0:
+            margin = a / side1.soldiers
+            break
+        attack_true = side2.attack(d)
+        a -= max(attack_true / (attack_true + side1.defense(a) + 1e-6) * d * mean_rate, MIN_LOSS)
+        if counters[1] and a > 0:
+            a -= max(a * COUNTER_RATE, MIN_LOSS)
+        if a <= 0:
+            margin = -d / side2.soldiers
+            break
+    return 1 / (1 + math.exp(-margin / QUICK_SCALE))
+
+def forecast(army1, army2) -> Forecast:
+    """两支军队按当前增益交战（army1 先攻，不计单挑）"""
+    return forecast_sides(Side.of(army1), Side.of(army2))
+
+def forecast_bout(army1, army2) -> Forecast:
+    """按 battle.fight_bout 的流程推演一场对战：先计入单挑及其增益，再交战"""
+    odds = duel_odds(army1, army2)
+    branches = [(1 - odds.chance, forecast(army1, army2))]
+    share = odds.chance / len(BONUS_NODES)
+    for bonus in BONUS_NODES:
+        branches.append((share * odds.first_wins, forecast_sides(Side.of(army1, bonus), Side.of(army2))))
+        branches.append((share * (1 - odds.first_wins), forecast_sides(Side.of(army1), Side.of(army2, bonus))))
+
+    result = Forecast(0.0, 0.0, (0.0, 0.0), branches[0][1].resolution)
+    left1 = left2 = 0.0
+    for w, branch in branches:
+        if w <= 0:
+            continue
+        result.win_probability += w * branch.win_probability
+        result.expected_exchanges += w * branch.expected_exchanges
+        left1 += w * branch.expected_left[0]
+        left2 += w * branch.expected_left[1]
+        for dist, part in ((result.left1, branch.left1), (result.left2, branch.left2)):
+            for soldiers, p in part.items():
+                dist[soldiers] = dist.get(soldiers, 0.0) + w * p
+    result.expected_left = (left1, left2)
+    return result
+
+@dataclass
+class FormationAdvice:
+    """选用某个阵型时的推演（对方阵型按给定的混合策略计，缺省为均匀随机）"""
+    formation: str
+    win_probability: float # 我方获胜的概率
+    expected_loss: float # 我方期望伤亡
+    expected_enemy_loss: float # 对方期望伤亡
+
+@dataclass
+class Payoff:
+    """一对武将的阵型收益表：cells[i][j] 为先攻方用 FORMATIONS[i]、应战方用 FORMATIONS[j] 时的推演"""
+    soldiers: Tuple[int, int] # (先攻方兵力, 应战方兵力)
+    cells: List[List[Forecast]]
+
+    def advice(self, first: bool, against: Optional[Sequence[float]] = None) -> List[FormationAdvice]:
+        """
+        先攻方（first=True）或应战方选用各阵型时的推演，与 FORMATIONS 顺序一致
+        - against: 对方选用各阵型的概率（与 FORMATIONS 顺序一致），缺省为均匀随机
+        """
+        own, enemy = self.soldiers if first else self.soldiers[::-1]
+        weights = against or [1 / len(FORMATIONS)] * len(FORMATIONS)
+        result = []
+        for i, formation in enumerate(FORMATIONS):
+            row = self.cells[i] if first else [self.cells[j][i] for j in range(len(FORMATIONS))]
+            win = sum(w * f.win_probability for w, f in zip(weights, row))
+            left = [(f.expected_left if first else f.expected_left[::-1]) for f in row]
+            result.append(FormationAdvice(formation, win if first else 1 - win,
+                                          own - sum(w * l[0] for w, l in zip(weights, left)),
+                                          enemy - sum(w * l[1] for w, l in zip(weights, left))))
+        return result
+
+@lru_cache(maxsize=1024)
+def payoff_matrix(leadership1: int, soldiers1: int, leadership2: int, soldiers2: int) -> Payoff:
+    """先攻方（统率 leadership1、兵力 soldiers1）与应战方在各阵型组合下的推演（不计单挑）"""
+    return Payoff((soldiers1, soldiers2),
+                  [[forecast_sides(Side(leadership1, f1, soldiers1), Side(leadership2, f2, soldiers2), PAYOFF_GRID)
+                    for f2 in FORMATIONS] for f1 in FORMATIONS])
+
+def payoff_of(first, second) -> Payoff:
+    """先攻武将 first 与应战武将 second 按当前兵力的阵型收益表"""
+    return payoff_matrix(first.leadership, first.army, second.leadership, second.army)
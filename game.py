@@ -0,0 +1,263 @@
+"""
+回合引擎（与界面无关）
+
+GameEngine 持有回合数、在途队列和路线缓存，负责电脑势力的规划与提交以及回合结束时的世界更新。
+电脑势力的规划可以交给进程池（planner_pool，见 ai_planner.planning_pool）：每回合把世界导出到共享内存一次，
+子进程按名字映射（见 world_snapshot）；不再使用时调用 close 释放共享内存。
+电脑之间城池互不相交的攻城也在同一个进程池中并行推演（见 battle.BattleScheduler）。
+玩家与电脑的行动都通过 execute 执行（见 actions.py），玩家的行动写入录像并可撤销。
+界面（MainWindow）和重演工具（replay.py）共用同一个引擎，只通过几个钩子接入：
+- log(msg): 输出一行日志
+- player_defense(origin, target, attackers, seed): 电脑攻打玩家城池时调用，由调用方结算整场攻城
+  （界面弹窗交互，重演按记录结算）；seed 已由引擎从全局 random 中抽出
+- on_conquest(city, conqueror): 电脑攻占城池后调用
+- recorder: 记录玩家行动与电脑规划（见 replay.CommandLog），为 None 时不记录
+- recorded_plan(faction): 重演时返回录像中该势力本回合的规划，引擎直接执行而不重新规划
+- fight: 结算单场对战的函数（同 battle.fight_bout），重演时可换成战斗窗口逐场回放
+
+整个游戏只消耗一条全局 random 序列，开局前 random.seed 一次，相同的玩家操作就能得到相同的对局。
+"""
+from typing import Callable, List, Optional, Tuple
+import random
+
+from actions import Action, ActionResult, Attack
+from ai_planner import FactionPlan, freeze_world, plan_all_factions
+from attribute import City, Faction, General, run_away
+from battle import BattleScheduler, SiegeOutcome, SiegeRequest, apply_bout, fight_bout, finish_siege
+from logistics import RouteCache
+from profiler import profiler
+from supply import ration_all
+from transit import TransitQueue
+from world_snapshot import SnapshotExporter
+
+class GameEngine:
+    def __init__(self, player: Faction, other_factions: List[Faction], world_cities: List[City],
+                 actions_per_turn: int = 8, log: Callable[[str], None] = None, planner_pool=None):
+        self.player = player
+        self.other_factions = other_factions
+        self.world_cities = world_cities
+        self.cities_by_name = {c.name: c for c in world_cities}
+        self.actions_per_turn = actions_per_turn # 每回合允许的操作次数（电脑势力同样受限）
+        self.planner_pool = planner_pool # 电脑势力并行规划与攻城推演的进程池，为 None 时在本进程依次执行
+        self.snapshots = SnapshotExporter() # 交给规划进程池的共享内存快照
+        self.routes = RouteCache() # 势力内城池距离缓存，城池易主时自动失效
+        self.transit = TransitQueue() # 在途的运输队与行军
+        self.proportional_rationing = False # 粮草不足时按兵力比例配给（规则变体，默认按武将顺序领粮）
+        self.budget_policy: Optional[str] = None # 固定所有城池的预算策略（电脑不再调整），用于比较策略；None 为电脑自选
+        self.current_turn = 1
+
+        self.log = log or (lambda msg: None)
+        self.player_defense: Optional[Callable[[City, City, List[General], int], None]] = None
+        self.on_conquest: Optional[Callable[[City, Faction], None]] = None
+        self.recorder = None
+        self.recorded_plan: Optional[Callable[[Faction], List[Action]]] = None
+        self.fight = fight_bout
+        self.undo_stack: List[Tuple[Action, ActionResult]] = [] # 玩家本回合可撤销的行动
+
+    def close(self):
+        """释放规划用的共享内存快照（进程池由创建者负责关闭）"""
+        self.snapshots.close()
+
+    def record(self, kind: str, **fields):
+        if self.recorder is not None:
+            self.recorder.record(self.current_turn, kind, **fields)
+
+    # ==== 行动 ====
+    def execute(self, faction: Faction, action: Action) -> ActionResult:
+        """校验并执行一次行动；未通过校验时世界不变，返回 ok=False 与原因"""
+        error = action.validate(self, faction)
+        if error is not None:
+            return ActionResult(False, error)
+        result = action.apply(self, faction)
+        if faction is self.player:
+            self.record_action(action, result)
+        return result
+
+    def record_action(self, action: Action, result: ActionResult = None):
+        """
+        记录一次玩家行动：写入录像，可撤销的行动压入撤销栈，其余行动清空撤销栈。
+        界面中交互结算的出兵不经过 execute，结算完成后直接调用本方法。
+        """
+        record = action.to_record()
+        self.record(record.pop("k"), **record)
+        if action.undoable:
+            self.undo_stack.append((action, result))
+        else:
+            self.undo_stack.clear()
+
+    def can_undo(self) -> bool:
+        return bool(self.undo_stack)
+
+    def undo(self) -> Optional[ActionResult]:
+        """撤销玩家最近一次可撤销的行动，返回该行动的结果；没有可撤销的行动时返回 None"""
+        if not self.undo_stack:
+            return None
+        action, result = self.undo_stack.pop()
+        action.undo(self, result)
+        self.record("undo")
+        return result
+
+    # ==== 回合结束 ====
+    def end_turn(self) -> List[str]:
+        """电脑行动 -> 回合数加一 -> 在途队伍到达 -> 月度更新，返回玩家城池的更新日志"""
+        self.undo_stack.clear()
+        with profiler.phase("execute_computer_turn"):
+            self.execute_computer_turn()
+        self.current_turn += 1
+
+        # 本回合到达的运输队与行军（只弹出到达的条目）
+        player_city_logs = []
+        with profiler.phase("transit_deliver"):
+            for faction, log in self.transit.deliver(self.current_turn, self.cities_by_name):
+                if faction is self.player:
+                    player_city_logs.append(log)
+
+        # 更新所有城市状态（月度更新）
+        with profiler.phase("world_monthly_update"):
+            if self.budget_policy is not None: # 包括本回合易主的城池
+                for city in self.world_cities:
+                    city.budget_policy = self.budget_policy
+            # 所有城池的口粮一次结算；之后有俘虏逃回的城池武将数变化，由 monthly_update 就地重算
+            rations = ration_all([([g.army for g in city.generals], city.food + city.food_income())
+                                  for city in self.world_cities], self.proportional_rationing)
+            for city, city_rations in zip(self.world_cities, rations):
+                # 月度更新
+                monthly_log = city.monthly_update(city_rations, self.proportional_rationing)
+                if city.owner == self.player:
+                    player_city_logs.append(monthly_log)
+
+                # 更新监狱
+                prisoner_log = city.update_prisoners()
+                if prisoner_log != "无逃脱事件":
+                    player_city_logs.append(prisoner_log)
+        return player_city_logs
+
+    # ==== 电脑回合 ====
+    def execute_computer_turn(self):
+        """执行电脑势力的回合操作：先基于回合开始时的世界快照为各势力并行规划，再按势力顺序依次提交"""
+        self.log("=== 电脑势力行动开始 ===")
+
+        # 电脑也有操作次数限制（每个势力独立）
+        active_factions = [f for f in self.other_factions if f.cities] # 跳过已灭亡的势力
+
+        # 规划阶段：只读快照，可并行；随机种子在主线程按势力顺序生成，保证结果可复现
+        seeds = [random.getrandbits(32) for _ in active_factions] # 重演时同样抽取，全局随机序列保持一致
+        if self.recorded_plan is not None:
+            plans = [FactionPlan(f.name, self.recorded_plan(f)) for f in active_factions]
+        else:
+            with profiler.phase("execute_computer_turn:snapshot"):
+                if self.planner_pool is None:
+                    snapshot = freeze_world(self.world_cities)
+                else: # 每回合导出一次，子进程只收到共享内存的名字
+                    snapshot = self.snapshots.export(self.world_cities, [self.player, *self.other_factions],
+                                                     self.current_turn)
+            with profiler.phase("execute_computer_turn:plan"):
+                plans = plan_all_factions(snapshot, [f.name for f in active_factions], self.actions_per_turn,
+                                          seeds, self.planner_pool, self.budget_policy is None)
+            for faction, plan in zip(active_factions, plans):
+                self.record("plan", faction=faction.name, actions=[a.to_record() for a in plan.actions])
+
+        # 提交阶段：按势力顺序串行执行
+        for faction, plan in zip(active_factions, plans):
+            if not faction.cities: # 规划之后被先行动的势力消灭
+                continue
+
+            self.log(f"--- {faction.name}势力行动 ---")
+            attacks: List[Attack] = [] # 连续的攻城一起交给调度器
+            for action in plan.actions:
+                if not faction.cities:
+                    break
+                if isinstance(action, Attack):
+                    attacks.append(action)
+                    continue
+                if attacks:
+                    self.commit_computer_attacks(faction, attacks)
+                    attacks = []
+                with profiler.phase(f"{faction.name}:commit:{action.kind}", city=action.city):
+                    self.commit_computer_action(faction, action)
+            if attacks and faction.cities:
+                self.commit_computer_attacks(faction, attacks)
+            self.log(f"--- {faction.name}势力行动结束 ---")
+
+    def commit_computer_action(self, faction: Faction, action: Action):
+        """执行一条电脑规划的行动；规划之后局势已变化（城池易主、武将离开、钱粮不足）的行动校验不通过，直接放弃"""
+        result = self.execute(faction, action)
+        if result.ok and action.announce:
+            note = f"（{action.note}）" if action.note else ""
+            self.log(f"{faction.name}势力在{action.city}{result.message}{note}")
+
+    @profiler.profiled("GameEngine.commit_computer_attacks")
+    def commit_computer_attacks(self, faction: Faction, actions: List[Attack]):
+        """
+        按声明顺序结算势力本回合的一组攻城：
+        - 电脑之间的攻城交给 BattleScheduler，城池互不相交的攻城并行推演、按顺序提交；
+        - 攻打玩家城池交给 player_defense 钩子，先结算此前积攒的攻城，再单独执行。
+        无论攻击是否成功都消耗行动次数（规划时已计入）。
+        """
+        scheduler = BattleScheduler(self.planner_pool)
+        pending: List[SiegeRequest] = []
+
+        def commit(request: SiegeRequest, outcome: SiegeOutcome):
+            self.log(f"{faction.name}势力从{request.origin.name}向{request.target.name}发动攻击！")
+            self.commit_outcome(request.origin, request.target, request.attackers, outcome)
+
+        for action in actions:
+            if action.validate(self, faction) is not None:
+                continue
+            city, target = action.origin(self), self.cities_by_name[action.target]
+            attacking_generals = action.ready_attackers(city)
+
+            if target.owner is self.player:
+                scheduler.run(pending, commit)
+                pending = []
+                if city.owner is not faction or target.owner is faction or not faction.cities:
+                    continue
+                attacking_generals = [g for g in attacking_generals if g in city.generals and g.army > 0]
+                if not attacking_generals:
+                    continue
+                self.log(f"{faction.name}势力从{city.name}向{target.name}发动攻击！")
+                seed = random.getrandbits(32)
+                if self.player_defense is not None:
+                    self.player_defense(city, target, attacking_generals, seed)
+            else:
+                pending.append(SiegeRequest(city, target, attacking_generals, random.getrandbits(32)))
+
+        scheduler.run(pending, commit)
+
+    @profiler.profiled("GameEngine.commit_outcome")
+    def commit_outcome(self, origin: City, target: City, attackers: List[General], outcome: SiegeOutcome):
+        """把后台推演的攻城结果按对战顺序应用到世界（电脑之间的攻城）"""
+        for general in target.generals.copy():
+            if general.army <= 0:
+                run_away(general, target)
+
+        by_name = {g.name: g for g in attackers + target.generals}
+        for bout in outcome.bouts:
+            self.log(f"{bout.first}军 向 {bout.second}军发起了对战")
+            if bout.capture_log:
+                self.log(bout.capture_log)
+            apply_bout(origin, target, by_name[bout.winner], by_name[bout.loser], bout.winner_soldiers,
+                       bout.loser_is_attacker, bout.captured)
+
+        self.settle_siege(origin, target, [by_name[name] for name in outcome.attackers_left],
+                          [by_name[name] for name in outcome.defenders_left])
+
+    def settle_siege(self, origin: City, target: City, attackers: List[General],
+                     defenders: List[General], rng=random) -> bool:
+        """战后总结：攻军尚存则占领城池（最后一城则消灭其势力），否则守城成功；返回是否城破"""
+        if attackers:
+            if defenders:
+                assert(0), "不可能两个攻城军和守城军同时不为空时中止战斗！"
+            conqueror = origin.owner
+            destroyed = finish_siege(origin, target, attackers, rng)
+            if destroyed:
+                self.log(f"敌方势力 {destroyed} 被消灭！")
+            self.log(f"势力 {conqueror.name} 成功占领 {target.name}！")
+            if self.on_conquest is not None:
+                self.on_conquest(target, conqueror)
+            return True
+
+        if not defenders:
+            assert(0), "攻城军和守城军无法同时为0！"
+        self.log(f"势力 {target.owner.name} 成功防守 {target.name}！")
+        return False
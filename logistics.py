@@ -0,0 +1,182 @@
+from dataclasses import dataclass, field
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import math
+
+from attribute import City, Faction, MAX_SOLDIERS, ownership_version
+
+SHIPMENT_CAP = 500 # 单次运输的钱粮上限
+RESERVE_MARGIN = 500 # 需求之外的富余/短缺阈值
+HOPS_PER_TURN = 2 # 运输队/行军每回合可走的城池跳数
+
+def travel_turns(hops: int) -> int:
+    """走 hops 跳需要的回合数（相邻城池1回合内到达，同城为0）"""
+    return math.ceil(hops / HOPS_PER_TURN)
+
+@dataclass
+class RouteCache:
+    """
+    势力内城池间的最短路径缓存
+    - 只沿 City.neighbors 中属于同一势力的城池行走（己方连通子图）
+    - 距离按跳数计算，按需对每个起点做一次 BFS 并缓存整行（距离与前驱），precompute 可一次算完整个势力
+    - 城池归属发生变化（ownership_version 递增）时整体失效
+    - 归属按势力名比较、结果只含城名，因此同样适用于电脑规划使用的世界快照
+    """
+    _version: int = -1
+    _rows: Dict[str, Dict[str, Dict[str, int]]] = field(default_factory=dict) # 势力名 -> 起点城名 -> {终点城名: 跳数}
+    _parents: Dict[str, Dict[str, Dict[str, str]]] = field(default_factory=dict) # 势力名 -> 起点城名 -> {终点城名: 前一城名}
+
+    def _check_version(self):
+        version = ownership_version()
+        if version != self._version:
+            self._rows.clear()
+            self._parents.clear()
+            self._version = version
+
+    def distance_row(self, faction: Faction, origin: City) -> Dict[str, int]:
+        """返回 origin 到势力内所有可达城池的跳数（包含 origin 自身，距离为0）"""
+        self._check_version()
+        faction_rows = self._rows.setdefault(faction.name, {})
+        row = faction_rows.get(origin.name)
+        if row is None:
+            row = {origin.name: 0}
+            parent = {}
+            queue = deque([origin])
+            while queue:
+                city = queue.popleft()
+                for nb in city.neighbors:
+                    if nb.owner is not None and nb.owner.name == faction.name and nb.name not in row:
+                        row[nb.name] = row[city.name] + 1
+                        parent[nb.name] = city.name
+                        queue.append(nb)
+            self._parents.setdefault(faction.name, {})[origin.name] = parent
+            faction_rows[origin.name] = row
+        return row
+
+    def precompute(self, faction: Faction):
+        """为势力的每座城池预先算好整行（之后的查询都不再搜索）"""
+        for city in faction.cities:
+            self.distance_row(faction, city)
+
+    def distance(self, faction: Faction, origin: City, dest: City) -> Optional[int]:
+        """两城在己方领土内的跳数，不连通时返回 None"""
+        return self.distance_row(faction, origin).get(dest.name)
+
+    def path(self, faction: Faction, origin: City, dest: City) -> Optional[List[str]]:
+        """两城在己方领土内的一条最短路径（城名列表，含两端），不连通时返回 None"""
+        if dest.name not in self.distance_row(faction, origin):
+            return None
+        parent = self._parents[faction.name][origin.name]
+        path = [dest.name]
+        while path[-1] != origin.name:
+            path.append(parent[path[-1]])
+        path.reverse()
+        return path
+
+    def reachable(self, faction: Faction, origin: City) -> List[Tuple[str, int]]:
+        """origin 在己方领土内可到达的其他城池，按 (跳数, 城名) 升序"""
+        row = self.distance_row(faction, origin)
+        return sorted(((name, d) for name, d in row.items() if name != origin.name),
+                      key=lambda item: (item[1], item[0]))
+
+@dataclass
+class Shipment:
+    """一次运输计划：从 origin 向 dest 运送 amount 单位的 resource（food / gold）"""
+    resource: str
+    origin: City
+    dest: City
+    amount: int
+    distance: int
+
+def food_demand(city: City) -> float:
+    """城池每月口粮需求（每名士兵每月1粮草）"""
+    return sum(g.army for g in city.generals)
+
+def gold_demand(city: City) -> float:
+    """城池每月金钱需求：官员俸禄 + 未满编武将的募兵俸禄（与 monthly_update 的估算一致）"""
+    demand = 0
+    for g in city.generals:
+        if g.army < MAX_SOLDIERS:
+            demand += round(g.monthly_salary() * (MAX_SOLDIERS - g.army) / MAX_SOLDIERS)
+    if city.officer_agriculture is not None:
+        demand += city.officer_agriculture.monthly_salary()
+    if city.officer_commerce is not None:
+        demand += city.officer_commerce.monthly_salary()
+    return demand
+
+_DEMANDS = {
+    "food": food_demand,
+    "gold": gold_demand,
+}
+
+def nearest_sources(faction: Faction, sources: List[City]) -> Dict[str, Tuple[int, int]]:
+    """
+    以 sources 为起点在势力领土内同时做一次分层 BFS，O(城池 + 道路)：
+    返回 城名 -> (到最近来源的跳数, 该来源在 sources 中的下标)，同样近时取下标最小的来源；到不了的城池不在结果中
+    """
+    nearest = {city.name: (0, i) for i, city in enumerate(sources)}
+    frontier, depth = list(sources), 0
+    while frontier:
+        depth += 1
+        reached: Dict[str, Tuple[City, int]] = {} # 本层新到达的城名 -> (城池, 来源下标)
+        for city in frontier:
+            index = nearest[city.name][1]
+            for nb in city.neighbors:
+                if nb.owner is not None and nb.owner.name == faction.name and nb.name not in nearest:
+                    seen = reached.get(nb.name)
+                    if seen is None or index < seen[1]:
+                        reached[nb.name] = (nb, index)
+        for name, (_, index) in reached.items():
+            nearest[name] = (depth, index)
+        frontier = [city for city, _ in reached.values()]
+    return nearest
+
+def plan_transports(faction: Faction, actions_remaining: int,
+                    resources=("food", "gold")) -> List[Shipment]:
+    """
+    为势力规划本回合的钱粮运输（只读，不修改任何城池）：
+    - 短缺城：库存低于需求 RESERVE_MARGIN 以上；富余城：库存高于需求 RESERVE_MARGIN 以上
+    - 短缺越严重的城池越先处理，每个短缺城每种资源最多接收一次运输
+    - 为短缺城挑选己方领土内距离最近、仍有富余的城池作为来源，不连通的城池不参与
+    - 最近来源由一次从全部富余城出发的多源 BFS 得到，只在某个富余城耗尽时重算，而不是每个短缺城各搜一遍
+    - 每次运输消耗一次行动，总数不超过 actions_remaining
+    """
+    plans: List[Shipment] = []
+
+    for resource in resources:
+        demand_of = _DEMANDS[resource]
+        balance: Dict[str, float] = {} # 城名 -> 库存减需求（正为富余，负为短缺）
+        for city in faction.cities:
+            balance[city.name] = getattr(city, resource) - demand_of(city)
+
+        needy = [c for c in faction.cities if balance[c.name] < -RESERVE_MARGIN]
+        donors = [c for c in faction.cities if balance[c.name] > RESERVE_MARGIN]
+        if not needy or not donors:
+            continue
+
+        needy.sort(key=lambda c: balance[c.name])
+        nearest = nearest_sources(faction, donors)
+
+        for needy_city in needy:
+            if len(plans) >= actions_remaining or not donors:
+                break
+
+            found = nearest.get(needy_city.name)
+            if found is None: # 该城与所有富余城都不连通
+                continue
+            best_dist, index = found
+            best = donors[index]
+
+            amount = int(min(SHIPMENT_CAP, balance[best.name] - RESERVE_MARGIN, -balance[needy_city.name]))
+            if amount <= 0:
+                continue
+
+            plans.append(Shipment(resource, best, needy_city, amount, best_dist))
+            balance[best.name] -= amount
+            balance[needy_city.name] += amount
+
+            if balance[best.name] <= RESERVE_MARGIN: # 不再富余
+                donors.pop(index)
+                nearest = nearest_sources(faction, donors)
+
+    return plans
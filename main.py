@@ -3,10 +3,11 @@ from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QLabel, QListWidget, QGraphicsView, QGraphicsScene, QGraphicsEllipseItem,
     QGraphicsLineItem, QGraphicsPixmapItem, QDialog, QFormLayout, QSpinBox,
-    QDialogButtonBox, QMessageBox, QComboBox, QGraphicsSimpleTextItem, QTextEdit, QListWidgetItem
+    QDialogButtonBox, QMessageBox, QComboBox, QGraphicsSimpleTextItem, QTextEdit, QListWidgetItem,
+    QTableView, QLineEdit, QAbstractItemView, QHeaderView, QGraphicsItem, QStyleOptionGraphicsItem, QInputDialog
 )
 from PySide6.QtGui import QBrush, QColor, QPen, QPainter, QPixmap
-from PySide6.QtCore import Qt, Signal, QObject
+from PySide6.QtCore import Qt, Signal, QObject, QTimer, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
 import random
 import sys
 import time
@@ -14,14 +15,14 @@ import time
 from dataclasses import dataclass, field
 from typing import List, Tuple
 import math
-import json
 import os
+import zlib
 
 # ========== 导入你的游戏内核 ==========
 # 假设你把之前那堆类保存为 attribute.py（或改成你实际模块名）
 # 要求：City, Faction, General 至少存在并实现 explore(), persuade_prisoner(), attack_other_city() 等方法
 try:
-    from attribute import City, Faction, General, Army, run_away
+    from attribute import City, Faction, General, Army, FORMATIONS
 except Exception as e:
     # 如果没有外部模块，提供一个非常小的替代实现以便演示 UI（你运行时请改为 import 你的模块）
     print("注意：未能导入 attribute.py，使用演示替代类（运行时请把 attribute.py 放在同目录并改 import）。", e)
@@ -29,6 +30,27 @@ except Exception as e:
     assert(0)
 # ========== end fallback ==========
 
+from logistics import RouteCache
+from actions import (ActionResult, Attack, Explore, Persuade, SetBudgetPolicy, SetOfficers, TradeFood,
+                     TransferGenerals, Transport)
+from budget import POLICIES, policy_of
+from duel import duel_odds
+from forecast import Side, forecast_sides
+from strategy import choose_formation, formation_advice
+from pairing import plan_matchups
+from battle import BattleRandom, apply_bout, fight_bout, finish_siege, flee_unarmed
+from game import GameEngine
+from ai_planner import planning_pool
+from replay import CommandLog
+from scenario import build_world, load_generals_from_json
+from profiler import profiler
+from events import bus
+from concurrent.futures import ThreadPoolExecutor
+
+class ForecastSignals(QObject):
+    """后台推演完成时把结果送回界面线程"""
+    ready = Signal(object)
+
 class BattleWindow(QDialog):
     """
     战斗展示窗口：
@@ -36,6 +58,7 @@ class BattleWindow(QDialog):
     - 右边：Army2（防守方）武将头像 + 阵型 + 士兵
     - 中间：战斗日志滚动显示
     """
+    forecaster = ThreadPoolExecutor(max_workers=1) # 战果推演冷算要几百毫秒，放到后台线程，不阻塞窗口弹出
 
     def __init__(self, army1, army2, parent=None):
         super().__init__(parent)
@@ -89,6 +112,22 @@ class BattleWindow(QDialog):
         
         main_layout.addLayout(battle_layout, 1)
 
+        # ===== 单挑概率（查表所得，开战前展示） =====
+        odds = duel_odds(army1, army2)
+        self.duel_info = QLabel(f"单挑概率 {odds.chance:.0%}；若单挑，{army1.general.name} 胜率 {odds.first_wins:.0%}")
+        self.duel_info.setAlignment(Qt.AlignCenter)
+        main_layout.addWidget(self.duel_info)
+
+        # ===== 战果推演（按开战时的阵型与兵力，不计单挑；后台推演完成后再填入） =====
+        self.forecast_info = QLabel("战果推演中……")
+        self.forecast_info.setAlignment(Qt.AlignCenter)
+        main_layout.addWidget(self.forecast_info)
+        self.forecast_signals = ForecastSignals()
+        self.forecast_signals.ready.connect(self._show_forecast)
+        sides = (Side.of(army1), Side.of(army2)) # 先取下双方的数值，开战后军队的兵力与增益会变
+        self.forecaster.submit(forecast_sides, *sides).add_done_callback(
+            lambda future, signals=self.forecast_signals: signals.ready.emit(future.result()))
+
         # ===== 底部关闭按钮 =====
         #self.close_btn = QPushButton("关闭战斗窗口")
         #self.close_btn.setEnabled(False)  # 初始禁用
@@ -109,6 +148,12 @@ class BattleWindow(QDialog):
         pix = pix.scaled(150, 200, Qt.KeepAspectRatio, Qt.SmoothTransformation)
         label.setPixmap(pix)
 
+    def _show_forecast(self, outlook):
+        left1, left2 = outlook.expected_left
+        self.forecast_info.setText(f"战果推演（不计单挑）：{self.army1.general.name} 胜率 {outlook.win_probability:.0%}，"
+                                   f"预计交锋 {outlook.expected_exchanges:.0f} 次，"
+                                   f"战后兵力约 {left1:.0f} : {left2:.0f}")
+
     def _army_text(self, army):
         return (f"<b>{army.general.name}</b><br>"
                 f"阵型：{army.formation}<br>"
@@ -144,6 +189,60 @@ class BattleWindow(QDialog):
         else:
             event.accept()
 
+    def play_bout(self, rng, log_list: QListWidget = None, delay: float = 1.0):
+        """
+        在窗口中逐条展示一场对战（规则见 battle.fight_bout），结束后等待玩家关闭窗口
+        - log_list: 主窗口日志，单挑与擒获信息同时写入；为 None 时只在战斗窗口显示
+        返回 fight_bout 的结果
+        """
+        # 添加关闭按钮（初始禁用）
+        close_btn = QPushButton("关闭战斗窗口")
+        close_btn.setEnabled(False)
+        close_btn.clicked.connect(self.close)
+        self.layout().addWidget(close_btn)
+
+        self.setWindowTitle("战斗中……（请等待战斗结束）")
+        self.show()
+
+        def on_duel(duel_log):
+            self.append_log(f"<b>【单挑】</b>{duel_log}")
+            QApplication.processEvents()  # 确保UI更新
+            time.sleep(delay)
+            if log_list is not None:
+                item = QListWidgetItem()
+                item.setText(f"【单挑】{duel_log}")
+                font = item.font()
+                font.setBold(True)
+                item.setFont(font)
+                log_list.addItem(item)
+
+        def on_exchange(army, res):
+            # battle_log 仅显示在战斗窗口，capture_log 同时显示在主窗口
+            self.append_log(res["battle_log"])
+            QApplication.processEvents()
+            time.sleep(delay)
+            if res["capture_log"]:
+                self.append_log(f"<b>{res['capture_log']}</b>")
+                QApplication.processEvents()
+                time.sleep(delay)
+                if log_list is not None:
+                    log_list.addItem(res["capture_log"])
+            self.update_army_info()
+            QApplication.processEvents()
+
+        result = fight_bout(self.army1, self.army2, rng, on_duel, on_exchange)
+
+        # 当前这场战斗结束，启用关闭按钮
+        close_btn.setEnabled(True)
+        self.setWindowTitle("战斗结束 - 请点击关闭按钮继续")
+        self.enable_close_button()
+
+        # 等待用户关闭窗口
+        while self.isVisible():
+            QApplication.processEvents()
+            time.sleep(0.1)
+        return result
+
 class SetOfficersDialog(QDialog):
     """设置官员对话框"""
     def __init__(self, city: City, parent=None):
@@ -321,7 +420,8 @@ class CityInfoWindow(QWidget):
             f"武将：{gens}\n"
             f"囚犯：{pris}\n"
             f"农业官员：{agri_officer}\n"
-            f"商业官员：{comm_officer}"
+            f"商业官员：{comm_officer}\n"
+            f"预算策略：{policy_of(c).label}"
         )
 
     # ---------- 增加按钮 ----------
@@ -362,67 +462,37 @@ class CityInfoWindow(QWidget):
         self.btn_set_officers.clicked.connect(self.on_set_officers)
         self.btn_area.addWidget(self.btn_set_officers)
 
+        # 预算策略：金钱不足时先开发还是先募兵
+        self.btn_budget_policy = QPushButton("预算策略")
+        self.btn_budget_policy.clicked.connect(self.on_budget_policy)
+        self.btn_area.addWidget(self.btn_budget_policy)
+
         # 更新按钮状态
         self.update_buttons_state()
 
     def on_set_officers(self):
         """设置城市官员"""
-        if not self.check_and_consume_action():
+        if not self.check_action_available():
             return
 
         dlg = SetOfficersDialog(self.city, parent=self)
         if dlg.exec() == QDialog.Accepted:
             agri_officer, comm_officer = dlg.get_result()
-            
-            # 再次检查冲突（双重保险）
-            if agri_officer and comm_officer and agri_officer == comm_officer:
-                QMessageBox.warning(self, "错误", "同一个武将不能同时担任两个职位！")
-                # 返还操作次数
-                self.parent_window.actions_remaining += 1
-                self.parent_window.update_turn_info()
-                self.update_buttons_state()
-                return
-            
-            # 设置农业官员
-            old_agri = self.city.officer_agriculture
-            if agri_officer:
-                self.city.officer_agriculture = agri_officer
-            else:
-                self.city.officer_agriculture = None
-                
-            # 设置商业官员
-            old_comm = self.city.officer_commerce
-            if comm_officer:
-                self.city.officer_commerce = comm_officer
-            else:
-                self.city.officer_commerce = None
-            
-            # 生成日志信息
-            log_parts = []
-            if old_agri != agri_officer:
-                if agri_officer:
-                    log_parts.append(f"农业官员设为 {agri_officer.name}")
-                else:
-                    log_parts.append("取消农业官员")
-                    
-            if old_comm != comm_officer:
-                if comm_officer:
-                    log_parts.append(f"商业官员设为 {comm_officer.name}")
-                else:
-                    log_parts.append("取消商业官员")
-            
-            if log_parts:
-                self.log_label.setText("；".join(log_parts))
-            else:
-                self.log_label.setText("官员设置未变更")
-                
-            self.refresh()
-            self.world_update()
-        else:
-            # 用户取消，返还操作次数
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
+            # 同一武将兼任两职等冲突由 SetOfficers.validate 拦下
+            self.perform(SetOfficers(self.city.name, agri=agri_officer.name if agri_officer else "",
+                                     comm=comm_officer.name if comm_officer else ""))
+
+    def on_budget_policy(self):
+        """设置城市的预算策略"""
+        if not self.check_action_available():
+            return
+
+        policies = list(POLICIES.values())
+        labels = [p.label for p in policies]
+        current = labels.index(policy_of(self.city).label)
+        label, ok = QInputDialog.getItem(self, "预算策略", "金钱不足时的开支顺序：", labels, current, False)
+        if ok:
+            self.perform(SetBudgetPolicy(self.city.name, policy=policies[labels.index(label)].name))
 
     def update_buttons_state(self):
         """根据剩余操作次数更新按钮状态"""
@@ -436,6 +506,7 @@ class CityInfoWindow(QWidget):
         self.btn_trade_food.setEnabled(can_act)  # 新增
         self.btn_transfer_general.setEnabled(can_act)  # 新增
         self.btn_set_officers.setEnabled(can_act)  # 新增
+        self.btn_budget_policy.setEnabled(can_act)
         
         if not can_act:
             self.btn_explore.setToolTip("操作次数已用完，请结束回合")
@@ -446,6 +517,7 @@ class CityInfoWindow(QWidget):
             self.btn_trade_food.setToolTip("操作次数已用完，请结束回合")  # 新增
             self.btn_transfer_general.setToolTip("操作次数已用完，请结束回合")  # 新增
             self.btn_set_officers.setToolTip("操作次数已用完，请结束回合")  # 新增
+            self.btn_budget_policy.setToolTip("操作次数已用完，请结束回合")
         else:
             self.btn_explore.setToolTip("")
             self.btn_persuade.setToolTip("")
@@ -455,6 +527,7 @@ class CityInfoWindow(QWidget):
             self.btn_trade_food.setToolTip("")  # 新增
             self.btn_transfer_general.setToolTip("")  # 新增
             self.btn_set_officers.setToolTip("")  # 新增
+            self.btn_budget_policy.setToolTip("")
 
     def exists_enemy_neighbor(self, city):
         my_faction = city.owner
@@ -471,129 +544,67 @@ class CityInfoWindow(QWidget):
         dlg = CityIntelDialog(self.city, parent=self)
         dlg.exec()
         
-    def check_and_consume_action(self):
-        """检查并消耗操作次数，返回是否成功"""
-        if self.parent_window.consume_action():
-            self.update_buttons_state()
+    def check_action_available(self):
+        """检查本回合是否还有操作次数（操作成功后才扣除）"""
+        if self.parent_window.can_perform_action():
             return True
-        else:
-            QMessageBox.warning(self, "操作限制", "本回合操作次数已用完，请结束回合")
-            return False
+        QMessageBox.warning(self, "操作限制", "本回合操作次数已用完，请结束回合")
+        return False
+
+    def perform(self, action) -> ActionResult | None:
+        """通过行动层执行一次操作：成功时消耗操作次数并刷新，未通过校验时提示原因"""
+        result = self.parent_window.perform_action(action)
+        if not result.ok:
+            QMessageBox.warning(self, "错误", result.message)
+            return None
+        self.log_label.setText(result.message)
+        self.update_buttons_state()
+        self.refresh()
+        self.world_update()
+        return result
     
     def on_trade_food(self):
-        """粮食买卖功能"""
-        if not self.check_and_consume_action():
+        """粮食买卖功能：买入 1金钱换10粮食，卖出 10粮食换1金钱"""
+        if not self.check_action_available():
             return
 
         dlg = FoodTradeDialog(self.city, parent=self)
         if dlg.exec() == QDialog.Accepted:
             trade_type, amount = dlg.get_result()
-            
-            if trade_type == "buy":
-                # 买粮食：1金钱买10粮食
-                cost = amount
-                food_gain = amount * 10
-                
-                if cost > self.city.gold:
-                    QMessageBox.warning(self, "错误", "金钱不足")
-                    # 返还操作次数
-                    self.parent_window.actions_remaining += 1
-                    self.parent_window.update_turn_info()
-                    self.update_buttons_state()
-                    return
-                    
-                self.city.gold -= cost
-                self.city.food += food_gain
-                self.log_label.setText(f"购买粮食：花费 {cost} 金钱，获得 {food_gain} 粮食")
-                
-            else:  # sell
-                # 卖粮食：10粮食卖1金钱
-                food_cost = amount * 10
-                gold_gain = amount
-                
-                if food_cost > self.city.food:
-                    QMessageBox.warning(self, "错误", "粮食不足")
-                    # 返还操作次数
-                    self.parent_window.actions_remaining += 1
-                    self.parent_window.update_turn_info()
-                    self.update_buttons_state()
-                    return
-                    
-                self.city.food -= food_cost
-                self.city.gold += gold_gain
-                self.log_label.setText(f"出售粮食：出售 {food_cost} 粮食，获得 {gold_gain} 金钱")
-            
-            self.refresh()
-            self.world_update()
-        else:
-            # 用户取消，返还操作次数
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
-
+            self.perform(TradeFood(self.city.name, units=amount if trade_type == "buy" else -amount))
 
     def on_transfer_general(self):
         """调遣武将功能"""
-        if not self.check_and_consume_action():
+        if not self.check_action_available():
             return
 
         # 检查当前城市是否有可调遣的武将
         if not self.city.generals:
             QMessageBox.information(self, "提示", "当前城市没有可调遣的武将")
-            # 返还操作次数
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
             return
 
-        dlg = GeneralTransferDialog(self.city, self.parent_window.world_cities, parent=self)
+        dlg = GeneralTransferDialog(self.city, self.parent_window.world_cities, parent=self,
+                                    routes=self.parent_window.routes)
         if dlg.exec() == QDialog.Accepted:
             generals, target_city = dlg.get_result()
-            
-            if generals and target_city:
-                # 从当前城市移除选中的武将
-                for general in generals:
-                    self.city.remove_general(general)
-                    # 添加到目标城市
-                    target_city.generals.append(general)
-                
-                general_names = "、".join([g.name for g in generals])
-                self.log_label.setText(f"调遣 {len(generals)} 名武将到 {target_city.name}：{general_names}")
-                self.refresh()
-                self.world_update()
-            else:
+            if not generals or not target_city:
                 QMessageBox.warning(self, "提示", "请选择要调遣的武将和目标城市")
-                # 返还操作次数
-                self.parent_window.actions_remaining += 1
-                self.parent_window.update_turn_info()
-                self.update_buttons_state()
-        else:
-            # 用户取消，返还操作次数
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
+                return
+            # 从当前城市移除选中的武将，行军若干回合后抵达目标城市
+            self.perform(TransferGenerals(self.city.name, dest=target_city.name,
+                                          generals=tuple(g.name for g in generals)))
 
     def on_explore(self):
-        if not self.check_and_consume_action():
+        if not self.check_action_available():
             return
-
-        try:
-            res = self.city.explore()
-        except Exception as e:
-            res = f"探索失败：{e}"
-        self.log_label.setText(str(res))
-        self.refresh()
-        self.world_update()
+        self.perform(Explore(self.city.name))
 
     def on_persuade(self):
-        if not self.check_and_consume_action():
+        if not self.check_action_available():
             return
 
         if not self.city.prisoners:
             QMessageBox.information(self, "提示", "当前城市无囚犯")
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
             return
 
         # 弹出劝降窗口
@@ -602,44 +613,32 @@ class CityInfoWindow(QWidget):
             idx = dlg.list_widget.currentRow()
             if idx < 0:
                 QMessageBox.warning(self, "提示", "未选择武将")
-                # 返还操作次数
-                self.parent_window.actions_remaining += 1
-                self.parent_window.update_turn_info()
-                self.update_buttons_state()
                 return
             prisoner, _ = self.city.prisoners[idx]
-            try:
-                ok = self.city.persuade_prisoner(prisoner)
+            result = self.perform(Persuade(self.city.name, prisoner=prisoner.name))
+            if result is not None:
                 bold_name = f"<b>{prisoner.name}</b>"
-                msg = f"劝降成功, {bold_name} 加入 {self.city.owner.name}" if ok else f"劝降失败, {bold_name} 拒绝了你的请求"
-            except Exception as e:
-                msg = f"劝降失败：{e}"
-            self.log_label.setText(msg)
-            self.refresh()
-            self.world_update()
-        else:
-            # 用户取消劝降，返还操作次数
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
+                self.log_label.setText(f"劝降成功, {bold_name} 加入 {self.city.owner.name}" if result.data["joined"]
+                                       else f"劝降失败, {bold_name} 拒绝了你的请求")
 
-    def simulate_attack(self, armies: list["General"], enemy: "City")-> bool:
+    def simulate_attack(self, armies: list["General"], enemy: "City", action: Attack)-> bool:
         """
-        这是 attack_other_city 的“可视化日志版”。
-        完全保留你的双层循环逻辑，只是把所有 print 换成 logs.append。
+        出兵攻城：双方轮流先手，玩家挑选出阵武将与阵型，每场对战在战斗窗口中展示。
+        随机数全部由 BattleRandom 按本场种子派生，结束后把种子与每场对战的选择填入 action 并记入录像，
+        重演时由 Attack.apply 原样结算。
         """
         fight_or_cancel = False # 是否进行战斗，如果进行过至少一轮战斗，则为True，后续即使撤军也消耗行动次数
 
-        defend_armies = []
+        brng = BattleRandom(random.getrandbits(32))
+        action.seed = brng.seed
+        bouts = action.bouts # 每场对战的 [先手武将, 先手阵型, 应战武将, 应战阵型]
 
-        tmp_copy = enemy.generals.copy()
+        def record(retreat: bool):
+            action.retreat = retreat
+            self.parent_window.engine.record_action(action)
 
-        for general in tmp_copy:
-            if general.army <= 0:
-                run_away(general, enemy)
-                self.parent_window.refresh_faction_panel()
-            else:
-                defend_armies.append(general)
+        flee_unarmed(enemy, brng.flee) # 守城方无兵的武将先行逃亡
+        defend_armies = [g for g in enemy.generals if g.army > 0]
 
         attack = True  # 攻军先手
 
@@ -649,6 +648,7 @@ class CityInfoWindow(QWidget):
                 # 玩家选择阵型 + 武将
                 # TODO: 以下窗口反复打开关闭的过程均在三级窗口层次进行
                 # 玩家选择阵型
+                self.parent_window.log_list.addItem(matchup_hint(armies, defend_armies))
                 while True:
                     # 玩家取消阵型选择 → 重新选择武将
                     dlg = ArmySelectDialog(armies, single_mode=True)
@@ -657,43 +657,43 @@ class CityInfoWindow(QWidget):
                         msg = "作战已取消。部队撤回城市。"
                         self.parent_window.log_list.addItem(msg)
                         self.log_label.setText(msg)
-                        self.parent_window.refresh_faction_panel()
+                        record(retreat=True)
                         return fight_or_cancel
                     atk_general = dlg.get_selected()[0]
 
+                    # 敌人由玩家选择（先定对手，阵型窗口才能给出推演）
+                    while True:
+                        dlg = ArmySelectDialog(defend_armies, single_mode=True)   # 每次重新创建
+                        ret = dlg.exec()
+                        selected = dlg.get_selected()
+
+                        if ret == QDialog.Accepted and selected:
+                            dfd_general = selected[0]
+                            break  # 成功选择
+
+                        QMessageBox.warning(self, "提示", "必须选择一名敌方武将迎战！")
+
                     # 玩家选择阵型
-                    f_dlg = FormationSelectDialog(self, "请选择你的阵型")
+                    f_dlg = FormationSelectDialog(self, "请选择你的阵型",
+                                                  formation_advice(atk_general, dfd_general, is_first=True))
                     ret = f_dlg.exec()
 
                     if ret == QDialog.Accepted:
                         formation_atk = f_dlg.get_formation()
                         fight_or_cancel = True
                         break  # 正常进入战斗
-
-                # 敌人由玩家选择
-                while True:
-                    dlg = ArmySelectDialog(defend_armies, single_mode=True)   # 每次重新创建
-                    ret = dlg.exec()
-                    selected = dlg.get_selected()
-
-                    if ret == QDialog.Accepted and selected:
-                        dfd_general = selected[0]
-                        fight_or_cancel = True
-                        break  # 成功选择
-
-                    QMessageBox.warning(self, "提示", "必须选择一名敌方武将迎战！")
-                formation_dfd = random.choice(["锋矢阵", "方圆阵", "投石阵"])
+                formation_dfd = choose_formation(brng.choice, atk_general, dfd_general, is_first=False)
             else:
                 # TODO: 以下窗口反复打开关闭的过程均在三级窗口层次进行
-                # 守方选择阵型随机
-                atk_general = max(defend_armies, key=lambda g: g.leadership)
+                # 守方按配对优化选择出阵武将与对手，按均衡混合策略选择阵型
+                matchup = plan_matchups(defend_armies, armies)[0]
+                atk_general, dfd_general = matchup.first, matchup.second
 
-                formation_atk = random.choice(["锋矢阵", "方圆阵", "投石阵"])
-                
-                dfd_general = min(armies, key=lambda g: g.leadership)
+                formation_atk = choose_formation(brng.choice, atk_general, dfd_general, is_first=True)
                 # 玩家选择阵型
                 while True:
-                    fdlg = FormationSelectDialog(self, f"{atk_general.name}军向{dfd_general.name}发起挑战！请选择阵型迎战！")
+                    fdlg = FormationSelectDialog(self, f"{atk_general.name}军向{dfd_general.name}发起挑战！请选择阵型迎战！",
+                                                 formation_advice(atk_general, dfd_general, is_first=False))
                     ret = fdlg.exec()
                     if ret == QDialog.Accepted:
                         formation_dfd = fdlg.get_formation()
@@ -704,225 +704,54 @@ class CityInfoWindow(QWidget):
                 
             msg = f"{atk_general.name}军 向 {dfd_general.name}军发起了对战"# TODO-finished: 在主窗口的def on_world_update(self)中显示“atk_general军 向 dfd_general军发起了对战”
             self.parent_window.log_list.addItem(msg)
-            self.parent_window.refresh_faction_panel()
+            bouts.append([atk_general.name, formation_atk, dfd_general.name, formation_dfd])
 
             Army1 = Army(formation_atk, atk_general, atk_general.army)
             Army2 = Army(formation_dfd, dfd_general, dfd_general.army)  
 
-            
+            # 战斗窗口显示双方阵型和武将信息，中间区域逐条展示单挑与交战日志
             battle_window = BattleWindow(Army1, Army2, parent=self)
-            battle_window.setWindowTitle("战斗中……（请等待战斗结束）")
-            
-            # 添加关闭按钮（初始禁用）
-            close_btn = QPushButton("关闭战斗窗口")
-            close_btn.setEnabled(False)
-            close_btn.clicked.connect(battle_window.close)
-            
-            # 将关闭按钮添加到战斗窗口布局
-            battle_window.layout().addWidget(close_btn)
-            
-            battle_window.show()
-            current_battle_window = battle_window
-            # TODO-finished:此处打开一个战斗窗口，这个战斗窗口应该显示Army1和Army2的阵型和武将信息，并且两边是武将图像，中间有一个显示战斗日志的区域展示后面我标记的日志
-
-            # 单挑
-            to_duel = Army1
-            if random.choice([True, False]):
-                to_duel = Army2
-            # 随机选择一方主动触发单挑
-            duel_result = to_duel.duel(Army2 if to_duel == Army1 else Army1)           
-            if duel_result != "本回合未触发单挑":
-                # BattleWindow 日志
-                current_battle_window.append_log(f"<b>【单挑】</b>{duel_result}")
-
-                QApplication.processEvents()  # 确保UI更新
-                time.sleep(1)  # 等待1秒
-
-                item = QListWidgetItem()
-                item.setText(f"【单挑】{duel_result}")
-
-                # 设置加粗字体
-                font = item.font()
-                font.setBold(True)
-                item.setFont(font)
-
-                # 主窗口日志
-                self.parent_window.log_list.addItem(item)
-                self.parent_window.refresh_faction_panel() # TODO: 此处refresh需要吗？
-                # 单挑日志同时显示在战斗窗口的日志区域和主窗口的def on_world_update(self)中
-
-            # ------- 内层战斗循环 -------
-            while Army1.soldiers > 0 and Army2.soldiers > 0:
+            first_won, res, _ = battle_window.play_bout(brng.bout(len(bouts) - 1), self.parent_window.log_list)
 
-                res1 = Army1.attack_enemy(Army2)
-                #logs.append(res1["battle_log"]) 
-                #TODO-finished res1["battle_log"]日志只显示在战斗窗口的日志区域,res1["capture_log"]日志同时显示在战斗窗口的日志区域和主窗口的def on_world_update(self)中
-
-                # battle_log 仅 BattleWindow
-                current_battle_window.append_log(res1["battle_log"])
-                QApplication.processEvents()
-                time.sleep(1)
-
-                # capture_log 若存在，两个地方都显示
-                if res1["capture_log"]: # TODO: 我的capture_log和这里的是否为空对应了吗？
-                    current_battle_window.append_log(f"<b>{res1['capture_log']}</b>")
-                    QApplication.processEvents()
-                    time.sleep(1)
-                    self.parent_window.log_list.addItem(res1["capture_log"])
-                    self.refresh()
-                current_battle_window.update_army_info()
-                self.parent_window.refresh_faction_panel()
-                QApplication.processEvents()
-
-                if res1["win"]: # Army1获胜
-                    atk_general.army = Army1.soldiers
-                    dfd_general.army = 0
-                    if res1["capture"]:
-                        if attack:
-                            enemy.remove_general(dfd_general)
-                            self.city.prisoners.append((dfd_general, 0))   
-                            self.refresh()
-                        else:
-                            self.city.remove_general(dfd_general)
-                            enemy.prisoners.append((dfd_general, 0))
-                    else:
-                        if attack: # 攻军获胜,守军触发逃亡
-                            run_away(dfd_general, enemy)
-                            self.parent_window.refresh_faction_panel()
-                        # 守军获胜，攻军逃亡回self.city即可
-                    break
-
-                # 轮到Army2反击
-                res2 = Army2.attack_enemy(Army1)
-                # res2["battle_log"]日志只显示在战斗窗口的日志区域,res2["capture_log"]日志同时显示在战斗窗口的日志区域和主窗口的def on_world_update(self)中
-
-                current_battle_window.append_log(res2["battle_log"])
-                QApplication.processEvents()
-                time.sleep(1)
-
-                if res2["capture_log"]:
-                    current_battle_window.append_log(f"<b>{res2['capture_log']}</b>")
-                    QApplication.processEvents()
-                    time.sleep(1)
-                    self.parent_window.log_list.addItem(res2["capture_log"])
-                    self.refresh()
-
-                current_battle_window.update_army_info()
-                self.parent_window.refresh_faction_panel()
-                QApplication.processEvents()
-
-                if res2["win"]:# Army2获胜
-                    dfd_general.army = Army2.soldiers
-                    atk_general.army = 0
-                    if res2["capture"]:
-                        if attack:
-                            self.city.remove_general(atk_general)
-                            enemy.prisoners.append((atk_general, 0))
-                        else:
-                            enemy.remove_general(atk_general)
-                            self.city.prisoners.append((atk_general, 0))
-                            self.refresh()
-                    else:
-                        if not attack: # 攻军获胜,守军触发逃亡
-                            run_away(atk_general, enemy)  
-                            self.parent_window.refresh_faction_panel()
-                            
-                        # 攻军溃散时逃跑回self.city即可，无需逃亡其他城市 
-                    break
-            # ------- end 内层战斗循环 -------
-            
-            # 关闭战斗窗口，之前挑选出的一对武将的战斗结束
-            # 当前这场战斗结束，关闭窗口
-            # 当前这场战斗结束，启用关闭按钮
-            close_btn.setEnabled(True)
-            current_battle_window.setWindowTitle("战斗结束 - 请点击关闭按钮继续")
-            # 当前这场战斗结束，启用关闭按钮
-            current_battle_window.enable_close_button()
-            #current_battle_window.close()
-
-            # 等待用户关闭窗口
-            while current_battle_window.isVisible():
-                QApplication.processEvents()
-                time.sleep(0.1)
+            # 败者兵力归零：攻军败将被俘或逃回本城，守军败将被俘或逃亡
+            winner, loser = (Army1, Army2) if first_won else (Army2, Army1)
+            loser_is_attacker = attack != first_won
+            apply_bout(self.city, enemy, winner.general, loser.general, winner.soldiers,
+                       loser_is_attacker, res["capture"], brng.flee)
 
             # ------- 外层循环剔除溃逃武将 -------
-            if Army1.soldiers <= 0:
-                if attack:
-                    armies.remove(atk_general)
-                else:
-                    defend_armies.remove(atk_general)
+            if loser_is_attacker:
+                armies.remove(loser.general)
             else:
-                if Army2.soldiers > 0:
-                    assert(0), "跳出内层循环时必然有一队士兵为0但是Army1不为0是Army2同时不为0"
-                else: # Army2军队溃散
-                    if attack:
-                       defend_armies.remove(dfd_general)
-                    else:
-                        armies.remove(dfd_general) 
+                defend_armies.remove(loser.general)
 
             self.refresh() # 刷新窗口，self的武将可能在战斗中落败被俘
 
             attack = not attack # 取反，下一轮由另一方先攻
 
         fight_or_cancel = True #设置为True避免出现守城武将为空，不战而胜但是返回值为False的情况
+        record(retreat=False)
 
         # 战后总结
         if armies:
             if defend_armies:
                 assert(0), "不可能两个攻城军和守城军同时不为空时中止战斗！"
             else: # 守城军消耗殆尽
-                
-                if len(enemy.owner.cities) <= 1: # 最后一城
-                    if len(enemy.owner.cities) != 1:
-                        assert(0), "势力所拥有的城池数小于等于0"
-                    
-                    to_remove_generals: list["General"] = []
-
-                    for g in enemy.generals:
-                        to_remove_generals.append(g)
-                    
-                    for g in to_remove_generals:
-                        enemy.remove_general(g) # 从该城池移除该武将
-                        self.city.prisoners.append((g, 0)) #加入监狱
-
-                    to_remove_generals.clear()
-
-                    for g in enemy.owner.generals:
-                        to_remove_generals.append(g)
-
-                    for g in to_remove_generals:
-                        enemy.owner.remove_general(g)
-                    
-                    # TODO-finished: 在主窗口的def on_world_update(self)中显示“敌方势力 {enemy.owner.name} 被消灭！”
-                    msg = f"敌方势力 {enemy.owner.name} 被消灭！"
+                conqueror = self.city.owner
+                destroyed = finish_siege(self.city, enemy, armies, brng.flee)
+                if destroyed:
+                    msg = f"敌方势力 {destroyed} 被消灭！"
                     self.parent_window.log_list.addItem(msg)           # 主窗口显示
                     self.log_label.setText(msg)                        # 二级窗口 CityInfoWindow 显示
-                    self.parent_window.refresh_faction_panel()
 
-
-                enemy.owner.remove_city(enemy)
-                
-                # 剩余攻城军进入enemy，self的势力占领新城，将所有官员设置为空
-                for g in armies:
-                    self.city.remove_general(g)
-                    enemy.generals.append(g)
-                    
-                self.city.owner.add_city(enemy)
-                enemy.officer_agriculture = None
-                enemy.officer_commerce = None
-
-                 # 更新城市颜色
-                self.parent_window.update_city_color(enemy.name)
-
-                msg = f"我方势力 {self.city.owner.name} 成功占领 {enemy.name}！"
+                msg = f"我方势力 {conqueror.name} 成功占领 {enemy.name}！"
                 self.parent_window.log_list.addItem(msg)      # 主窗口日志
                 self.log_label.setText(msg)                   # 当前城市信息窗口
-                self.parent_window.refresh_faction_panel()
 
                 self.refresh()# 刷新窗口，因为我方武将离开了原城市进入了enemy
 
                 # === 新增：检查游戏是否结束 ===
-                self.parent_window.check_game_over(conquered_city=enemy, conqueror=self.city.owner)
+                self.parent_window.check_game_over(conquered_city=enemy, conqueror=conqueror)
 
         else: # 攻城军耗尽
             if not defend_armies:
@@ -931,15 +760,13 @@ class CityInfoWindow(QWidget):
                 msg = f"敌方势力 {enemy.owner.name} 成功防守 {enemy.name}！"
                 self.parent_window.log_list.addItem(msg)     # 主窗口日志
                 self.log_label.setText(msg)                  # 二级窗口显示
-                self.parent_window.refresh_faction_panel()
-                #TODO: 在主窗口和二级窗口显示敌方势力 {enemy.owner.name} 成功防守 {enemy.name}！
 
             # 如果攻城军耗尽，守城军依旧存在，攻城的将领要么在前面的逻辑被俘，要么已经逃回self，因此无需处理
 
         return fight_or_cancel# 无需返回日志，因为日志在运行过程中以及主窗口中已经显示出来了
 
     def on_attack(self):
-        if not self.check_and_consume_action():
+        if not self.check_action_available():
             return
 
         # TODO: 记主窗口为一级窗口，点击城市后打开的窗口为二级窗口，则选择出城作战的武将时打开三级窗口
@@ -948,78 +775,107 @@ class CityInfoWindow(QWidget):
 
         if not tmp_list:
             QMessageBox.warning(self, "提示", "没有可出战的武将")
-            # 返还操作次数
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
             return
 
         dlg = ArmySelectDialog(tmp_list, self) #给出的选项应该在士兵数大于0的武将中选择
         if dlg.exec() != QDialog.Accepted:
-            # 用户取消，返还操作次数
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
             return
         armies = dlg.get_selected()
         if not armies:
             QMessageBox.warning(self, "提示", "未选择武将")
-            # 返还操作次数
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
             return
 
         #TODO: 选择完毕武将后选择要攻击的城市，此时关闭旧的三级窗口，打开新的三级窗口
         dlg2 = CitySelectDialog(self.city, self)
         if dlg2.exec() != QDialog.Accepted:
-            # 用户取消，返还操作次数
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
             return
         enemy = dlg2.get_city()
 
-        # Step3 使用 simulate_attack 运行战斗得到 logs
-        if not self.simulate_attack(armies, enemy):# 用户在战斗过程中取消
-            # 返还操作次数
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
+        action = Attack(self.city.name, target=enemy.name, generals=tuple(g.name for g in armies))
+        error = action.validate(self.parent_window.engine, self.parent_window.player)
+        if error is not None:
+            QMessageBox.warning(self, "错误", error)
             return
 
+        # Step3 使用 simulate_attack 运行战斗，至少进行过一场对战才消耗操作次数
+        if self.simulate_attack(armies, enemy, action):
+            self.parent_window.consume_action()
+        self.update_buttons_state()
+
     def on_transfer(self):
-        if not self.check_and_consume_action():
+        if not self.check_action_available():
             return
         dlg = TransferDialog(self, self.city)
         if dlg.exec() == QDialog.Accepted:
             dest, food, gold = dlg.get_result()
-            if food > self.city.food or gold > self.city.gold:
-                QMessageBox.warning(self, "错误", "资源不足")
-                # 返还操作次数
-                self.parent_window.actions_remaining += 1
-                self.parent_window.update_turn_info()
-                self.update_buttons_state()
-                return
-            self.city.food -= food
-            self.city.gold -= gold
-            dest.food += food
-            dest.gold += gold
-            self.log_label.setText(f"向 {dest.name} 运输 粮{food} 金{gold}")
-            self.refresh()
-            self.world_update()
-        else:
-            # 用户取消运输，返还操作次数
-            self.parent_window.actions_remaining += 1
-            self.parent_window.update_turn_info()
-            self.update_buttons_state()
+            self.perform(Transport(self.city.name, dest=dest.name, food=food, gold=gold))
 
 class CityNodeSignals(QObject):
     """专门用于信号的辅助类"""
     city_clicked = Signal(object)  # 定义信号
 
+# ========== 地图细节层级（LOD） ==========
+# lod 为场景坐标到屏幕像素的缩放比例（QStyleOptionGraphicsItem.levelOfDetailFromTransform）
+LOD_LABEL = 0.25 # 低于此值不绘制城名（24pt 字号缩到约 8 像素以下已无法辨认）
+LOD_SIMPLE_NODE = 0.1 # 低于此值城池画成无描边的方块
+LOD_SIMPLE_EDGE = 0.25 # 低于此值道路改用 1 像素细线
+LOD_SMOOTH = 0.3 # 视图缩放高于此值才开启抗锯齿和平滑缩放
+
+def painter_lod(painter: QPainter) -> float:
+    return QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+
+class CityLabel(QGraphicsSimpleTextItem):
+    """城名标签：缩小到看不清时直接跳过绘制"""
+    def paint(self, painter, option, widget=None):
+        if painter_lod(painter) < LOD_LABEL:
+            return
+        super().paint(painter, option, widget)
+
+class RoadItem(QGraphicsLineItem):
+    """城池间道路：缩小时退化为不抗锯齿的 1 像素细线"""
+    def paint(self, painter, option, widget=None):
+        if painter_lod(painter) >= LOD_SIMPLE_EDGE:
+            super().paint(painter, option, widget)
+            return
+        pen = QPen(self.pen())
+        pen.setCosmetic(True)
+        pen.setWidth(1)
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.setPen(pen)
+        painter.drawLine(self.line())
+
+class FactionPalette:
+    """
+    势力 -> 城池底色画刷，每个势力只解析一次
+    - 蜀/魏/吴沿用原来的红/蓝/绿，无主城池为灰色
+    - 其他势力按势力名的 CRC32 取色相（与 Python 的字符串哈希随机化无关，每次运行颜色一致）
+    """
+    KNOWN_COLORS = {
+        "蜀": QColor(200, 50, 50, 220),    # 红色 - 蜀
+        "魏": QColor(50, 50, 200, 220),    # 蓝色 - 魏
+        "吴": QColor(50, 200, 50, 220),    # 绿色 - 吴
+    }
+    NEUTRAL_COLOR = QColor(150, 150, 150, 220) # 灰色 - 无主
+
+    def __init__(self):
+        self._brushes: dict[str, QBrush] = {}
+        self._neutral = QBrush(self.NEUTRAL_COLOR)
+
+    def brush(self, faction: Faction | None) -> QBrush:
+        if faction is None:
+            return self._neutral
+        brush = self._brushes.get(faction.name)
+        if brush is None:
+            color = self.KNOWN_COLORS.get(faction.name)
+            if color is None:
+                hue = zlib.crc32(faction.name.encode("utf-8")) % 360
+                color = QColor.fromHsv(hue, 190, 200, 220)
+            brush = self._brushes[faction.name] = QBrush(color)
+        return brush
+
 class CityNode(QGraphicsEllipseItem):
     R = 80
+    palette = FactionPalette()
     
     def __init__(self, city: City, x: float, y: float):
         super().__init__(-CityNode.R, -CityNode.R, CityNode.R*2, CityNode.R*2)
@@ -1030,14 +886,16 @@ class CityNode(QGraphicsEllipseItem):
         self.signals = CityNodeSignals()
         
         # 初始颜色设置
+        self._brush = None
         self.update_color()
         
         self.setPen(QPen(Qt.black, 3))
         self.setFlag(QGraphicsEllipseItem.ItemIsSelectable, True)
         self.setFlag(QGraphicsEllipseItem.ItemIsFocusable, True)
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache) # 平移时直接复用缓存的位图
 
         # 城市名称标签
-        text = QGraphicsSimpleTextItem(city.name, self)
+        text = CityLabel(city.name, self)
         font = text.font()
         font.setPointSize(24)
         font.setBold(True)
@@ -1045,20 +903,22 @@ class CityNode(QGraphicsEllipseItem):
         br = text.boundingRect()
         text.setPos(-br.width()/2, -br.height()/2)
         text.setBrush(QBrush(Qt.white))
+
+    def paint(self, painter, option, widget=None):
+        if painter_lod(painter) >= LOD_SIMPLE_NODE:
+            super().paint(painter, option, widget)
+            return
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.brush())
+        painter.drawRect(self.rect())
     
     def update_color(self):
-        """根据城市所有者更新颜色"""
-        if self.city.owner.name == "蜀":
-            color = QColor(200, 50, 50, 220)    # 红色 - 蜀
-        elif self.city.owner.name == "魏":
-            color = QColor(50, 50, 200, 220)    # 蓝色 - 魏
-        elif self.city.owner.name == "吴":
-            color = QColor(50, 200, 50, 220)    # 绿色 - 吴
-        else:
-            color = QColor(150, 150, 150, 220)  # 灰色 - 其他
-        
-        self.setBrush(QBrush(color))
-        self.update()  # 强制重绘
+        """根据城市所有者更新颜色；setBrush 只登记重绘区域，同一轮事件循环内的重绘由场景合并执行"""
+        brush = CityNode.palette.brush(self.city.owner)
+        if brush is not self._brush:
+            self._brush = brush
+            self.setBrush(brush)
     
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
@@ -1077,14 +937,9 @@ class TransferDialog(QDialog):
         # target choice
         mainwin = self.parent().parent()
         self.dest_combo = QComboBox()
-         # 直接在下拉框中存储城市对象
-        cities = [
-            c for c in mainwin.world_cities
-            if c != origin_city and c.owner == origin_city.owner
-        ]
-
-        for c in cities:
-            self.dest_combo.addItem(c.name, c)  # 第二个参数是关联的数据
+         # 直接在下拉框中存储城市对象；只列出己方领土内连通的城池，由近到远
+        for name, hops in mainwin.routes.reachable(origin_city.owner, origin_city):
+            self.dest_combo.addItem(f"{name}（{hops}程）", mainwin.cities_by_name[name])  # 第二个参数是关联的数据
         layout.addRow("目标城市", self.dest_combo)
 
         self.food_spin = QSpinBox(); self.food_spin.setRange(0, origin_city.food)
@@ -1105,38 +960,135 @@ class TransferDialog(QDialog):
             return dest, self.food_spin.value(), self.gold_spin.value()
         return None, 0, 0
 
+# ========== 武将表格（模型/视图） ==========
+SORT_ROLE = Qt.UserRole + 1 # 排序使用的原始数值
+
+class GeneralTableModel(QAbstractTableModel):
+    """
+    武将名册的表格模型，供各武将选择/情报对话框共用
+    - 每名武将的一行在构造（或 reload）时算好并缓存，data() 只做下标访问
+    - Qt.UserRole 返回 General 对象，SORT_ROLE 返回用于排序的原始数值
+    """
+    COLUMNS = [
+        ("姓名", "name"),
+        ("统率", "leadership"),
+        ("武力", "martial"),
+        ("智力", "intellect"),
+        ("政治", "politics"),
+        ("兵力", "army"),
+    ]
+
+    def __init__(self, generals: list["General"], parent=None):
+        super().__init__(parent)
+        self._generals: list["General"] = []
+        self._rows: list[tuple] = []
+        self.reload(generals)
+
+    def reload(self, generals: list["General"]):
+        """重新读取名册（武将属性或兵力变化后调用）"""
+        self.beginResetModel()
+        self._generals = list(generals)
+        self._rows = [tuple(getattr(g, attr) for _, attr in self.COLUMNS) for g in self._generals]
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return str(self._rows[row][index.column()])
+        if role == SORT_ROLE:
+            return self._rows[row][index.column()]
+        if role == Qt.UserRole:
+            return self._generals[row]
+        if role == Qt.TextAlignmentRole and index.column() > 0:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section][0]
+        return None
+
+class GeneralTable(QWidget):
+    """
+    可排序、可筛选的武将表格：上方输入框按姓名筛选，点击表头按列排序
+    - 行高固定，视图只绘制可见行，数千名武将也能即时打开、流畅滚动
+    - multi_select=True 时点击即可切换多选
+    """
+    def __init__(self, generals: list["General"], multi_select=False, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("按姓名筛选")
+        layout.addWidget(self.filter_edit)
+
+        self.model = GeneralTableModel(generals, self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setSortRole(SORT_ROLE)
+        self.proxy.setFilterKeyColumn(0)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.filter_edit.textChanged.connect(self.proxy.setFilterFixedString)
+
+        self.view = QTableView()
+        self.view.setModel(self.proxy)
+        self.view.setSortingEnabled(True)
+        self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.view.setSelectionMode(
+            QAbstractItemView.MultiSelection if multi_select else QAbstractItemView.SingleSelection
+        )
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.view.verticalHeader().setVisible(False)
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.view)
+
+    def selected_generals(self) -> list["General"]:
+        """按表格当前显示顺序返回选中的武将"""
+        rows = sorted(self.view.selectionModel().selectedRows(), key=lambda idx: idx.row())
+        return [idx.data(Qt.UserRole) for idx in rows]
+
+    def general_at(self, pos):
+        """视口坐标 pos 处的武将，没有则返回 None"""
+        index = self.view.indexAt(pos)
+        return index.data(Qt.UserRole) if index.isValid() else None
+
+    def row_rect(self, pos):
+        """视口坐标 pos 所在行的矩形（视口坐标）"""
+        return self.view.visualRect(self.view.indexAt(pos))
+
 class ArmySelectDialog(QDialog):
     def __init__(self, armies, parent=None, single_mode=False):
         super().__init__(parent)
         self.armies = armies
         self.single_mode = single_mode
         self.setWindowTitle("选择武将")
-        self.resize(400, 500)
+        self.resize(480, 500)
 
         layout = QVBoxLayout(self)
-        self.list = QListWidget()
-        self.list.setSelectionMode(
-            QListWidget.SingleSelection if single_mode else QListWidget.MultiSelection
-        )
-
-        for g in armies:
-            item = QListWidgetItem(f"{g.name} | 统率:{g.leadership} 武力:{g.martial} 兵:{g.army}")
-            item.setData(Qt.UserRole, g)
-            self.list.addItem(item)
-
-        layout.addWidget(self.list)
+        self.table = GeneralTable(armies, multi_select=not single_mode)
+        layout.addWidget(self.table)
 
         btn = QPushButton("确定")
         btn.clicked.connect(self.accept)
         layout.addWidget(btn)
 
     def get_selected(self):
-        items = self.list.selectedItems()
-        if not items:
+        selected = self.table.selected_generals()
+        if not selected:
             return []
         if self.single_mode:
-            return [items[0].data(Qt.UserRole)]
-        return [i.data(Qt.UserRole) for i in items]
+            return selected[:1]
+        return selected
 
 class CitySelectDialog(QDialog):
     def __init__(self, city: City, parent=None):
@@ -1170,8 +1122,20 @@ class CitySelectDialog(QDialog):
             return None
         return self.targets[idx]
 
+def matchup_hint(own, enemies, limit: int = 3) -> str:
+    """玩家先手时的对阵建议（pairing.plan_matchups 的前几组）"""
+    matchups = plan_matchups(own, enemies)[:limit]
+    return "对阵建议：" + "；".join(f"{m.first.name} 对 {m.second.name}（胜率约 {m.win_probability:.0%}）"
+                                  for m in matchups)
+
 class FormationSelectDialog(QDialog):
-    def __init__(self, parent=None, wintitle="选择阵型"):
+    """
+    阵型选择窗口
+    - advice: strategy.formation_advice 给出的各阵型推演（对方阵型按电脑的均衡混合策略计），
+      提供时每个选项后显示胜率与双方期望伤亡，并默认选中胜率最高（按显示的百分比比较，同胜率时伤亡最少）的阵型；
+      对均衡策略而言己方支撑内的阵型胜率本就相同，推荐的差别主要在伤亡
+    """
+    def __init__(self, parent=None, wintitle="选择阵型", advice=None):
         super().__init__(parent)
         self.setWindowTitle(wintitle)
         self.resize(300, 200)#设置选择阵型的窗口大小
@@ -1179,7 +1143,17 @@ class FormationSelectDialog(QDialog):
         layout = QVBoxLayout(self)
 
         self.combo = QComboBox()
-        self.combo.addItems(["锋矢阵", "方圆阵", "投石阵"])
+        if advice:
+            for item in advice:
+                self.combo.addItem(f"{item.formation}（胜率 {item.win_probability:.0%}，"
+                                   f"我军损失约 {item.expected_loss:.0f}，敌军损失约 {item.expected_enemy_loss:.0f}）",
+                                   item.formation)
+            best = max(range(len(advice)), key=lambda i: (round(advice[i].win_probability, 2), -advice[i].expected_loss))
+            self.combo.setCurrentIndex(best)
+            layout.addWidget(QLabel(f"推荐：{advice[best].formation}（按对方的均衡阵型推演，不计单挑）"))
+        else:
+            for formation in FORMATIONS:
+                self.combo.addItem(formation, formation)
         layout.addWidget(self.combo)
 
         btn = QPushButton("确定")
@@ -1187,7 +1161,7 @@ class FormationSelectDialog(QDialog):
         layout.addWidget(btn)
 
     def get_formation(self):
-        return self.combo.currentText()
+        return self.combo.currentData()
 
 class FoodTradeDialog(QDialog):
     """粮食买卖对话框"""
@@ -1262,10 +1236,15 @@ class FoodTradeDialog(QDialog):
 
 class GeneralTransferDialog(QDialog):
     """武将调遣对话框 - 支持多选"""
-    def __init__(self, current_city: City, all_cities: list[City], parent=None):
+    def __init__(self, current_city: City, all_cities: list[City], parent=None, routes: RouteCache = None):
         super().__init__(parent)
         self.current_city = current_city
         self.all_cities = [c for c in all_cities if c != current_city and c.owner == current_city.owner]
+        self.distances: dict[str, int] = {} # 目标城名 -> 跳数
+        if routes is not None: # 只保留己方领土内连通的城池，由近到远
+            self.distances = dict(routes.reachable(current_city.owner, current_city))
+            self.all_cities = sorted((c for c in self.all_cities if c.name in self.distances),
+                                     key=lambda c: (self.distances[c.name], c.name))
         
         self.setWindowTitle("调遣武将")
         self.resize(500, 400)
@@ -1274,22 +1253,18 @@ class GeneralTransferDialog(QDialog):
         
         # 武将选择（多选）
         layout.addWidget(QLabel("选择要调遣的武将（可多选）:"))
-        self.general_list = QListWidget()
-        self.general_list.setSelectionMode(QListWidget.MultiSelection)  # 设置为多选模式
-        
-        for general in current_city.generals:
-            item = QListWidgetItem(f"{general.name} (统率:{general.leadership} 武力:{general.martial} 兵力:{general.army})")
-            item.setData(Qt.UserRole, general)
-            self.general_list.addItem(item)
-        
-        layout.addWidget(self.general_list)
+        self.general_table = GeneralTable(current_city.generals, multi_select=True)  # 多选模式
+        layout.addWidget(self.general_table)
         
         # 目标城市选择
         layout.addWidget(QLabel("选择目标城市:"))
         self.city_combo = QComboBox()
         for city in self.all_cities:
             generals_count = len(city.generals)
-            self.city_combo.addItem(f"{city.name} (现有武将:{generals_count})", city)
+            if city.name in self.distances:
+                self.city_combo.addItem(f"{city.name} (现有武将:{generals_count}，{self.distances[city.name]}程)", city)
+            else:
+                self.city_combo.addItem(f"{city.name} (现有武将:{generals_count})", city)
         layout.addWidget(self.city_combo)
         
         # 信息显示
@@ -1298,7 +1273,7 @@ class GeneralTransferDialog(QDialog):
         layout.addWidget(self.info_label)
         
         # 连接信号，实时更新信息
-        self.general_list.itemSelectionChanged.connect(self.update_info)
+        self.general_table.view.selectionModel().selectionChanged.connect(self.update_info)
         self.city_combo.currentIndexChanged.connect(self.update_info)
         
         # 按钮
@@ -1333,12 +1308,7 @@ class GeneralTransferDialog(QDialog):
     
     def get_selected_generals(self):
         """获取选中的武将列表"""
-        selected_generals = []
-        for item in self.general_list.selectedItems():
-            general = item.data(Qt.UserRole)
-            if general:
-                selected_generals.append(general)
-        return selected_generals
+        return self.general_table.selected_generals()
     
     def get_result(self):
         """返回选择的武将列表和目标城市"""
@@ -1391,31 +1361,21 @@ class CityIntelDialog(QDialog):
         self.city = city
         self.generals = city.generals
 
-        # 记录悬浮窗口与上一个 item
+        # 记录悬浮窗口与上一个悬停的武将
         self.hover_window: HoverImageWindow | None = None
-        self._last_item = None
+        self._last_general = None
 
         layout = QVBoxLayout(self)
 
-        # ================= 武将列表 =================
-        self.list_widget = QListWidget()
-        self.list_widget.setMouseTracking(True)
-        self.list_widget.leaveEvent = self._on_list_leave
-        layout.addWidget(self.list_widget)
-
-        for g in self.generals:
-            text = (
-                f"{g.name} | "
-                f"统:{g.leadership} 武:{g.martial} 智:{g.intellect} "
-                f"政:{g.politics} | 兵:{g.army}"
-            )
-            item = QListWidgetItem()
-            item.setText(text)
-            item.setData(Qt.UserRole, g)
-            self.list_widget.addItem(item)
+        # ================= 武将表格 =================
+        self.table = GeneralTable(self.generals)
+        viewport = self.table.view.viewport()
+        viewport.setMouseTracking(True)
+        viewport.leaveEvent = self._on_list_leave
+        layout.addWidget(self.table)
 
         # 用于捕获鼠标移动事件
-        self.list_widget.mouseMoveEvent = self._on_mouse_move
+        viewport.mouseMoveEvent = self._on_mouse_move
 
         btn_box = QDialogButtonBox(QDialogButtonBox.Close)
         btn_box.rejected.connect(self.reject)
@@ -1431,27 +1391,25 @@ class CityIntelDialog(QDialog):
         except:
             pos = event.pos()
 
-        item = self.list_widget.itemAt(pos)
-        if item is None:
+        g = self.table.general_at(pos)
+        if g is None:
             self._hide_hover()
-            self._last_item = None
-        else:
-            if item != self._last_item:
-                self._last_item = item
-                self._show_hover(item)
+            self._last_general = None
+        elif g is not self._last_general:
+            self._last_general = g
+            self._show_hover(g, pos)
 
-        return QListWidget.mouseMoveEvent(self.list_widget, event)
+        return QWidget.mouseMoveEvent(self.table.view.viewport(), event)
 
     def _on_list_leave(self, event):
         self._hide_hover()
-        self._last_item = None
-        return super(QListWidget, self.list_widget).leaveEvent(event)
+        self._last_general = None
+        return QWidget.leaveEvent(self.table.view.viewport(), event)
 
     # ======================================================================
     # 显示已有 HoverImageWindow
     # ======================================================================
-    def _show_hover(self, item):
-        g: General = item.data(Qt.UserRole)
+    def _show_hover(self, g: General, pos):
         img_path = f"image/{g.name}.jpg"
 
         pix = QPixmap(img_path)
@@ -1470,8 +1428,8 @@ class CityIntelDialog(QDialog):
         dialog_pos = self.mapToGlobal(self.rect().topLeft())
         x = dialog_pos.x() + self.width() + 10
 
-        rect = self.list_widget.visualItemRect(item)
-        global_item_top = self.list_widget.viewport().mapToGlobal(rect.topLeft())
+        rect = self.table.row_rect(pos)
+        global_item_top = self.table.view.viewport().mapToGlobal(rect.topLeft())
         y = global_item_top.y()
 
         self.hover_window.move(x, y)
@@ -1609,10 +1567,11 @@ class MapView(QGraphicsView):
         super().__init__(parent)
         sc = QGraphicsScene(self)
         sc.parent = parent
+        sc.setItemIndexMethod(QGraphicsScene.BspTreeIndex) # 城池与道路都是静态的，BSP 树加速可见区域查询
         self.setScene(sc)
         
-        self.setRenderHint(QPainter.Antialiasing)
-        self.setRenderHint(QPainter.SmoothPixmapTransform)
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        self.update_render_hints()
         
         # 设置视图属性
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
@@ -1650,11 +1609,18 @@ class MapView(QGraphicsView):
             # 设置默认背景
             self.scene().setBackgroundBrush(QBrush(QColor(200, 220, 240)))
     
+    def update_render_hints(self):
+        """按当前缩放比例开关抗锯齿：缩得很小时这些细节看不出来，却是绘制的主要开销"""
+        smooth = self.transform().m11() >= LOD_SMOOTH
+        self.setRenderHint(QPainter.Antialiasing, smooth)
+        self.setRenderHint(QPainter.SmoothPixmapTransform, smooth)
+
     def resizeEvent(self, event):
         """当窗口大小改变时，重新调整视图"""
         super().resizeEvent(event)
         if self.background_item:
             self.fitInView(self.background_item, Qt.KeepAspectRatioByExpanding)
+        self.update_render_hints()
     
     def wheelEvent(self, event):
         """支持鼠标滚轮缩放"""
@@ -1671,6 +1637,7 @@ class MapView(QGraphicsView):
             zoom_factor = zoom_out_factor
         
         self.scale(zoom_factor, zoom_factor)
+        self.update_render_hints()
         
         # 将鼠标位置调整回原来的场景坐标
         new_pos = self.mapToScene(event.position().toPoint())
@@ -1678,7 +1645,8 @@ class MapView(QGraphicsView):
         self.translate(delta.x(), delta.y())
 
 class MainWindow(QMainWindow):
-    def __init__(self, faction: Faction, world_cities: list[City], other_factions: list[Faction]):
+    def __init__(self, faction: Faction, world_cities: list[City], other_factions: list[Faction],
+                 recorder: CommandLog = None, engine: GameEngine = None):
         super().__init__()
         self.setWindowTitle("三国志 - 地图界面")
         self.faction = faction
@@ -1687,14 +1655,32 @@ class MainWindow(QMainWindow):
         self.game_over = False
 
         self.other_factions = other_factions # 记录其他势力列表，供电脑回合使用
+        self.planner_pool = planning_pool(max(1, len(other_factions))) # 电脑势力并行规划与攻城推演（子进程）
 
         self.player = faction
         self.world = world_cities
 
+        # 回合引擎：电脑行动、在途队伍与月度更新（replay.py 无界面重演时使用同一个引擎）
+        self.engine = engine or GameEngine(faction, other_factions, world_cities, actions_per_turn=8)
+        self.engine.planner_pool = self.planner_pool
+        self.engine.recorder = recorder # 对局录像，为 None 时不录制
+        self.engine.player_defense = self.defend_city
+        self.engine.on_conquest = lambda city, conqueror: self.check_game_over(conquered_city=city, conqueror=conqueror)
+        self.routes = self.engine.routes
+        self.transit = self.engine.transit
+        self.cities_by_name = self.engine.cities_by_name
+
+        # 界面刷新合并：模型事件只记录脏区域，下一帧统一重绘
+        self._dirty_cities: set[str] = set() # 信息变化的城池名
+        self._dirty_owners: set[str] = set() # 归属变化、需要重新着色的城池名
+        self._dirty_panel: set[str] = set() # 势力面板中需要重建的行：cities / generals
+        self._flush_pending = False
+        self._panel_lines = {}
+        bus.subscribe(self.on_model_changed)
+
         # 添加回合操作计数器
-        self.actions_remaining = 8  # 每回合剩余的操作次数
-        self.actions_per_turn = 8  # 每回合允许的操作次数
-        self.current_turn = 1  # 当前回合数
+        self.actions_per_turn = self.engine.actions_per_turn  # 每回合允许的操作次数
+        self.actions_remaining = self.actions_per_turn  # 每回合剩余的操作次数
 
         central = QWidget()
         h = QHBoxLayout()
@@ -1722,10 +1708,16 @@ class MainWindow(QMainWindow):
         self.end_turn_btn.clicked.connect(self.on_end_turn)
         self.end_turn_btn.setStyleSheet("font-size: 16px; font-weight: bold; padding: 10px;")
         right.addWidget(self.end_turn_btn)
+
+        # 撤销本回合最近一次钱粮/人事操作（出兵、探索、劝降涉及随机，不可撤销）
+        self.undo_btn = QPushButton("撤销上一步")
+        self.undo_btn.clicked.connect(self.on_undo)
+        right.addWidget(self.undo_btn)
         
         self.log_list = QListWidget()
         right.addWidget(self.log_list, 1)
         h.addLayout(right, 1)
+        self.engine.log = self.log_list.addItem
 
         self.scene = self.map.scene()
 
@@ -1803,6 +1795,21 @@ class MainWindow(QMainWindow):
         self.refresh_faction_panel()
         self.update_turn_info()
 
+    @property
+    def current_turn(self) -> int:
+        """当前回合数（由回合引擎维护）"""
+        return self.engine.current_turn
+
+    def record(self, kind: str, **fields):
+        """把一条玩家操作写入对局录像"""
+        self.engine.record(kind, **fields)
+
+    def closeEvent(self, event):
+        """关闭主窗口时停掉规划子进程并释放共享内存快照"""
+        self.planner_pool.shutdown(cancel_futures=True)
+        self.engine.close()
+        return super().closeEvent(event)
+
     def update_turn_info(self):
         """更新回合信息显示"""
         self.turn_info.setText(
@@ -1815,6 +1822,7 @@ class MainWindow(QMainWindow):
             self.turn_info.setStyleSheet("color: red; font-weight: bold;")
         else:
             self.turn_info.setStyleSheet("color: black;")
+        self.undo_btn.setEnabled(self.engine.can_undo())
 
     def check_game_over(self, conquered_city: City = None, conqueror: Faction = None):
         """检查游戏是否结束"""
@@ -1875,14 +1883,52 @@ class MainWindow(QMainWindow):
         )
         dialog.exec()
 
+    # ==== 模型事件与合并刷新 ====
+    def on_model_changed(self, event):
+        """模型变更回调：只记录脏区域，实际重绘推迟到 flush_ui"""
+        if event.kind == "city":
+            self._dirty_cities.add(event.name)
+            if event.part == "owner":
+                self._dirty_owners.add(event.name)
+        elif event.kind == "faction" and event.name == self.faction.name:
+            self._dirty_panel.add(event.part)
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        """同一帧内的多次变更只安排一次刷新"""
+        if not self._flush_pending:
+            self._flush_pending = True
+            QTimer.singleShot(16, self.flush_ui)
+
+    @profiler.profiled("MainWindow.flush_ui")
+    def flush_ui(self):
+        self._flush_pending = False
+        cities, self._dirty_cities = self._dirty_cities, set()
+        owners, self._dirty_owners = self._dirty_owners, set()
+        panel, self._dirty_panel = self._dirty_panel, set()
+
+        if owners:
+            self.repaint_owner_changes(owners)
+        if panel:
+            self.rebuild_faction_panel(panel)
+        if self.info_window is not None and self.info_window.isVisible() and self.info_window.city.name in cities:
+            self.info_window.refresh()
+
+    @profiler.profiled("MainWindow.repaint_owner_changes")
+    def repaint_owner_changes(self, city_names):
+        """只为归属发生变化的城池换色，由场景合并为一次重绘"""
+        for name in city_names:
+            self.update_city_color(name)
+
     def update_city_color(self, city_name: str):
         """更新指定城市的颜色"""
         if city_name in self.city_nodes:
             node = self.city_nodes[city_name]
             node.update_color()
     
+    @profiler.profiled("MainWindow.update_all_city_colors")
     def update_all_city_colors(self):
-        """更新所有城市的颜色"""
+        """更新所有城市的颜色（全量校正，正常流程由 repaint_owner_changes 增量换色）"""
         for city_name, node in self.city_nodes.items():
             node.update_color()
 
@@ -1898,30 +1944,21 @@ class MainWindow(QMainWindow):
             )
             if reply == QMessageBox.No:
                 return
-        
-        # 执行电脑回合逻辑
-        self.execute_computer_turn()
-        
+
+        profiler.begin_turn(self.current_turn)
+        self.record("end_turn")
+
+        # 电脑行动、在途队伍到达与月度更新
+        player_city_logs = self.engine.end_turn()
+
         # 重置玩家操作次数
         self.actions_remaining = self.actions_per_turn
-        self.current_turn += 1
         self.update_turn_info()
 
-        # 确保所有城市颜色正确显示
-        self.update_all_city_colors()
-
-        # 更新所有城市状态（月度更新）
-        player_city_logs = []
-        for city in self.world_cities:
-            # 月度更新
-            monthly_log = city.monthly_update()
-            if city.owner == self.player:
-                player_city_logs.append(monthly_log)
-            
-            # 更新监狱
-            prisoner_log = city.update_prisoners()
-            if prisoner_log != "无逃脱事件":
-                player_city_logs.append(prisoner_log)
+        # 电脑回合中易主的城池立即换色（其余脏区域照常在下一帧刷新）
+        if self._dirty_owners:
+            owners, self._dirty_owners = self._dirty_owners, set()
+            self.repaint_owner_changes(owners)
 
         # 显示玩家城市的更新日志
         if player_city_logs:
@@ -1933,442 +1970,34 @@ class MainWindow(QMainWindow):
         self.log_list.addItem(f"=== 第 {self.current_turn} 回合开始 ===")
         self.refresh_faction_panel()
 
-    def execute_computer_turn(self):
-        """执行电脑势力的回合操作"""
-        self.log_list.addItem("=== 电脑势力行动开始 ===")
-        
-        # 电脑也有操作次数限制（每个势力独立）
-        computer_actions_per_faction = self.actions_per_turn
-        
-        # 按照势力顺序执行
-        for faction in self.other_factions:
-            if not faction.cities:  # 势力已灭亡
-                continue
-                
-            actions_remaining = computer_actions_per_faction
-            self.log_list.addItem(f"--- {faction.name}势力行动 ---")
-            
-            # 第零阶段：劝降囚犯（高优先级）
-            if actions_remaining > 0:
-                actions_remaining = self.execute_computer_persuade_prisoners(faction, actions_remaining)
-
-             # 第一阶段：内部管理（设置官员、买卖粮食、调遣武将）
-            if actions_remaining > 0:
-                actions_remaining = self.execute_computer_internal_management(faction, actions_remaining)
-
-            # 第二阶段：内部资源调配（粮草运输）
-            if actions_remaining > 0:
-                actions_remaining = self.execute_computer_resource_management(faction, actions_remaining)
-            
-            # 第二阶段：军事行动（攻击玩家）
-            if actions_remaining > 0:
-                actions_remaining = self.execute_computer_military_actions(faction, actions_remaining)
+        if profiler.enabled:
+            print(profiler.end_turn())
 
-
-            if actions_remaining > 0: #还有多余行动力时随机挑选城市进行探索
-                while actions_remaining > 0:
-                    actions_remaining -= 1
-                    random_city = random.choice(faction.cities)
-                    random_city.explore()
-            
-            self.log_list.addItem(f"--- {faction.name}势力行动结束 ---")
-
-    def execute_computer_persuade_prisoners(self, faction: Faction, actions_remaining):
-        """电脑劝降囚犯逻辑"""
-        # 收集所有有囚犯的城市
-        cities_with_prisoners: list[City] = []
-        
-        for city in faction.cities:
-            if city.prisoners:
-                cities_with_prisoners.append(city)
-        
-        if not cities_with_prisoners:
-            return actions_remaining
-        
-        # 按城市重要性排序（城池数量少的势力更急需武将）
-        cities_with_prisoners.sort(key=lambda c: len(faction.cities))
-        
-        for city in cities_with_prisoners:
-            if actions_remaining <= 0:
-                break
-            
-            for prisoner, _ in city.prisoners:
-                if actions_remaining <= 0:
-                    break
-                if city.persuade_prisoner(prisoner):
-                    self.refresh_faction_panel()
-                actions_remaining -= 1
-        
-        return actions_remaining
-
-    def execute_computer_set_officers(self, city: City):
-        """电脑设置官员逻辑"""
-        if not city.generals:
-            return False
-        
-        changed = False
-        # 只有一个武将的情况
-        if len(city.generals) == 1:
-            single_general = city.generals[0]
-            
-            intell = single_general.intellect
-            polit = single_general.politics
-
-            if intell >= polit: #该武将适合开发商业
-                if city.officer_commerce:
-                    if city.officer_commerce != single_general:
-                        assert(0), "城市只有一个武将,且城市的商业开发官员有人担任，但是两者不是一人，出现问题！"
-                else:
-                    city.officer_commerce = single_general
-                    changed = True
-            else: #该武将适合开发农业
-                if city.officer_agriculture:
-                    if city.officer_agriculture != single_general:
-                        assert(0), "城市只有一个武将,且城市的农业业开发官员有人担任，但是两者不是一人，出现问题！"
-                else:
-                    city.officer_agriculture = single_general
-                    changed = True
-                
-            return changed
-
-        # 不止一个武将
-        # 找出政治最高的武将作为农业官员候选人
-        best_agri = max(city.generals, key=lambda g: g.politics)
-        
-        # 找出智力最高的武将作为商业官员候选人
-        best_comm = max(city.generals, key=lambda g: g.intellect)
-        
-        # 避免同一个武将担任两个职位
-        if best_agri == best_comm:
-            # 如果同一个武将，选择次优的
-            other_generals = [g for g in city.generals if g != best_agri]
-            if other_generals:
-                second_best_comm = max(other_generals, key=lambda g: g.intellect)
-                best_comm = second_best_comm
-        
-        # 设置农业官员（如果比当前的好或者当前没有）
-        if (not city.officer_agriculture or 
-            best_agri.politics > city.officer_agriculture.politics):
-            city.officer_agriculture = best_agri
-            changed = True
-        
-        # 设置商业官员（如果比当前的好或者当前没有）
-        if (not city.officer_commerce or 
-            best_comm.intellect > city.officer_commerce.intellect):
-            city.officer_commerce = best_comm
-            changed = True
-        
-        return changed
-    
-    def execute_computer_transfer_generals(self, faction: Faction, actions_remaining):
-        """电脑调遣武将逻辑 - 优化版"""
-        # 找出需要增援的城市（边境城市或兵力不足的城市）
-        reinforcement_needed = []
-        
-        for city in faction.cities:
-            # 检查是否是边境城市（有敌方邻居）
-            is_border_city = any(neighbor.owner != faction for neighbor in city.neighbors)
-            
-            # 计算城市总兵力
-            total_army = sum(g.army for g in city.generals)
-            
-            # 如果是边境城市且兵力不足，需要增援
-            if is_border_city and total_army < 2000:
-                reinforcement_needed.append((city, total_army))
-        
-        if not reinforcement_needed:
-            return actions_remaining
-        
-        # 按兵力需求排序（兵力越少的越需要增援）
-        reinforcement_needed.sort(key=lambda x: x[1])
-        
-        # 找出有富余兵力的城市（内陆城市或兵力充足的城市）
-        donor_cities = []
-        
-        for city in faction.cities:
-            # 检查是否是内陆城市（没有敌方邻居）
-            is_inland = all(neighbor.owner == faction for neighbor in city.neighbors)
-            
-            total_army = sum(g.army for g in city.generals)
-            
-            # 如果是内陆城市且兵力充足，可以作为捐赠城市
-            if is_inland and total_army > 1500 and len(city.generals) > 1:
-                donor_cities.append((city, total_army))
-        
-        if not donor_cities:
-            return actions_remaining
-        
-        # 按兵力富余程度排序
-        donor_cities.sort(key=lambda x: x[1], reverse=True)
-        
-        # 为需要增援的城市调遣武将（一次可以调遣多名）
-        for target_city, target_army in reinforcement_needed:
-            if actions_remaining <= 0:
-                break
-                
-            # 计算需要的增援兵力
-            needed_army = 2000 - target_army
-            
-            # 从捐赠城市选择武将调遣
-            for donor_city, donor_army in donor_cities:
-                if actions_remaining <= 0:
-                    break
-                    
-                if donor_army <= 1000:  # 捐赠城市兵力不足
-                    continue
-                    
-                # 选择要调遣的武将（选择兵力适中的，避免调走主力）
-                available_generals = [g for g in donor_city.generals if g.army > 0]
-                if len(available_generals) <= 1:  # 至少要保留1名武将
-                    continue
-                    
-                # 按兵力排序，选择中间力量的武将（不调最强的，也不调最弱的）
-                sorted_generals = sorted(available_generals, key=lambda g: g.army)
-                transfer_candidates = []
-                
-                # 尝试选择1-3名武将进行调遣
-                if len(sorted_generals) >= 4:
-                    transfer_candidates = sorted_generals[1:3]  # 选择第2、3名
-                elif len(sorted_generals) >= 3:
-                    transfer_candidates = [sorted_generals[1]]  # 选择第2名
-                else:
-                    transfer_candidates = [sorted_generals[0]]  # 选择最弱的
-                
-                if transfer_candidates:
-                    # 执行调遣
-                    for general in transfer_candidates:
-                        donor_city.remove_general(general)
-                        target_city.generals.append(general)
-                    
-                    general_names = "、".join([g.name for g in transfer_candidates])
-                    self.log_list.addItem(f"{faction.name}势力从{donor_city.name}调遣{len(transfer_candidates)}名武将到{target_city.name}：{general_names}")
-                    actions_remaining -= 1
-                    
-                    # 更新捐赠城市兵力
-                    donor_army = sum(g.army for g in donor_city.generals)
-                    if donor_army <= 1000:
-                        break
-        
-        return actions_remaining
-
-    def execute_computer_trade_food(self, city: City):
-        """电脑买卖粮食逻辑 - 优化版"""
-        # 计算粮食需求（每个士兵每回合消耗1粮食）
-        army_food_consumption = sum(g.army for g in city.generals)
-        
-        # 计算官员维护费用（假设每个官员需要一定金钱维护）
-        officer_maintenance = 0
-        if city.officer_agriculture:
-            officer_maintenance += city.officer_agriculture.monthly_salary()  # 农业官员维护费
-        if city.officer_commerce:
-            officer_maintenance += city.officer_commerce.monthly_salary()  # 商业官员维护费
-        
-        # 计算开发所需的最低金钱（官员维护 + 缓冲）
-        development_min_gold = officer_maintenance + 100
-        
-        # 情况1：买粮食（当粮食不足且有钱留给开发时）
-        if city.food < army_food_consumption:
-            # 计算缺粮数量
-            food_deficit = army_food_consumption - city.food
-            
-            # 计算可以用于买粮食的最大金钱（要保留开发所需金钱）
-            available_gold_for_food = max(0, city.gold - development_min_gold)
-            
-            if available_gold_for_food > 0:
-                # 买足够的粮食来满足军队消耗（至少买缺粮部分）
-                buy_amount = min(food_deficit // 10 + 1, available_gold_for_food)
-                
-                if buy_amount > 0:
-                    cost = buy_amount
-                    food_gain = buy_amount * 10
-                    
-                    city.gold -= cost
-                    city.food += food_gain
-                    self.log_list.addItem(f"{city.owner.name}势力在{city.name}购买粮食：花费{cost}金钱，获得{food_gain}粮食（解决缺粮问题）")
-                    return True
-        
-        # 情况2：卖粮食（当粮食过剩且金钱不足支付开发时）
-        elif city.food > army_food_consumption * 3:  # 粮食是军队消耗的3倍以上
-            if city.gold < development_min_gold:
-                # 计算可以卖的粮食数量（保留军队3回合的消耗）
-                food_surplus = city.food - army_food_consumption * 3
-                max_sell_food = min(food_surplus, 2000)  # 每次最多卖2000粮食
-                
-                if max_sell_food >= 10:  # 至少能卖1单位（10粮食）
-                    # 计算需要卖多少粮食来获得足够的开发资金
-                    gold_needed = development_min_gold - city.gold
-                    sell_units = min(gold_needed, max_sell_food // 10)
-                    
-                    if sell_units > 0:
-                        food_cost = sell_units * 10
-                        gold_gain = sell_units
-                        
-                        city.food -= food_cost
-                        city.gold += gold_gain
-                        self.log_list.addItem(f"{city.owner.name}势力在{city.name}出售粮食：出售{food_cost}粮食，获得{gold_gain}金钱（用于开发资金）")
-                        return True
-        
-        # 情况3：战略性卖粮（当粮食极其过剩时）
-        elif city.food > army_food_consumption * 5 and city.food > 5000:
-            # 即使金钱充足，也卖一些过剩粮食换取更多资金
-            food_surplus = city.food - army_food_consumption * 3  # 保留3倍消耗
-            max_sell_units = min(food_surplus // 10, 300)  # 最多卖300单位
-            
-            if max_sell_units > 0:
-                sell_units = max_sell_units // 2  # 卖一半的过剩粮食
-                food_cost = sell_units * 10
-                gold_gain = sell_units
-                
-                city.food -= food_cost
-                city.gold += gold_gain
-                self.log_list.addItem(f"{city.owner.name}势力在{city.name}出售过剩粮食：出售{food_cost}粮食，获得{gold_gain}金钱")
-                return True
-        
-        # 情况4：紧急买粮（当粮食严重不足且可能饿死士兵时）
-        elif city.food < army_food_consumption // 2:  # 粮食不足军队消耗的一半
-            # 即使金钱紧张也要买粮
-            emergency_buy_amount = min((army_food_consumption - city.food) // 10 + 1, city.gold)
-            
-            if emergency_buy_amount > 0:
-                cost = emergency_buy_amount
-                food_gain = emergency_buy_amount * 10
-                
-                city.gold -= cost
-                city.food += food_gain
-                self.log_list.addItem(f"{city.owner.name}势力在{city.name}紧急购买粮食：花费{cost}金钱，获得{food_gain}粮食（避免军队缺粮）")
-                return True
-        
-        return False
-
-    def execute_computer_internal_management(self, faction: Faction, actions_remaining):
-        """执行电脑内部管理（设置官员、买卖粮食、调遣武将）"""
-        # 1. 首先设置官员（每个城市最多消耗1次行动）
-        if actions_remaining > 0:
-            for city in faction.cities:
-                if actions_remaining <= 0:
-                    break
-                if self.execute_computer_set_officers(city):
-                    actions_remaining -= 1
-                    self.log_list.addItem(f"{faction.name}势力在{city.name}设置了官员")
-        
-        # 2. 买卖粮食（根据资源状况决定）
-        if actions_remaining > 0:
-            for city in faction.cities:
-                if actions_remaining <= 0:
-                    break
-                if self.execute_computer_trade_food(city):
-                    actions_remaining -= 1
-        
-        # 3. 调遣武将（优化兵力分布）
-        if actions_remaining > 0:
-            actions_remaining = self.execute_computer_transfer_generals(faction, actions_remaining)
-        
-        return actions_remaining
-
-    def execute_computer_resource_management(self, faction, actions_remaining):
-        """执行电脑资源管理（粮草运输）"""
-        # 找出需要粮草的城市（粮草少于需求-500）
-        needy_cities = []
-
-        for city in faction.cities:
-            needy_food = 0
-            for general in city.generals:
-                needy_food += general.army
-            if city.food < needy_food - 500:
-                needy_cities.append(city)
-        
-        if not needy_cities:
-            return actions_remaining
-        
-        # 找出有富余粮草的城市（粮草多于需求+500）
-        donor_cities = []
-
-        for city in faction.cities:
-            needy_food = 0
-            for general in city.generals:
-                needy_food += general.army
-            if city.food > needy_food + 500:
-                donor_cities.append(city)
-        
-        if not donor_cities:
-            return actions_remaining
-        
-        # 为每个需要粮草的城市寻找最近的捐赠城市
-        for needy_city in needy_cities:
-            if actions_remaining <= 0:
-                break
-                
-            # 寻找最近的捐赠城市（简化：随机选择）
-            if donor_cities:
-                donor_city = random.choice(donor_cities)
-                transfer_amount = min(500, donor_city.food - 500, 1000 - needy_city.food)
-                
-                if transfer_amount > 0:
-                    donor_city.food -= transfer_amount
-                    needy_city.food += transfer_amount
-                    self.log_list.addItem(f"{faction.name}势力从{donor_city.name}向{needy_city.name}运输{transfer_amount}粮草")
-                    actions_remaining -= 1
-                    
-                    # 如果捐赠城市粮草不足了，从列表中移除
-                    needy_food = 0
-                    for general in donor_city.generals:
-                        needy_food += general.army
-                    if donor_city.food <= needy_food + 500: # 不再富余
-                        donor_cities.remove(donor_city)
-        
-        return actions_remaining
-
-    def execute_computer_military_actions(self, faction: Faction, actions_remaining):
-        """执行电脑军事行动（攻击玩家）"""
-        # 收集所有可以攻击敌方城市的电脑城市
-        attackable_cities: list[Tuple[City,City]] = []
-        for city in faction.cities:
-            # 检查是否有相邻的非faction城市
-            player_neighbors = [neighbor for neighbor in city.neighbors if neighbor.owner != faction]
-            if player_neighbors and any(g.army > 800 for g in city.generals):
-                for player_targets in player_neighbors:
-                    attackable_cities.append((city, player_targets))
-        
-        if not attackable_cities:
-            return actions_remaining
-        
-        # 随机打乱攻击顺序
-        random.shuffle(attackable_cities)
-        
-        for attack_city, player_targets in attackable_cities:
-            if actions_remaining <= 0:
-                break
-                
-            if random.random() > 0.5:
-                # 50% 概率选择不攻击，保存行动次数
-                continue
-            
-            # 选择出战武将（选择兵力大于800的）
-            available_generals = [g for g in attack_city.generals if g.army > 800]
-            if available_generals:
-                # 电脑可以选择多个武将攻击（最多3个）
-                max_attackers = min(3, len(available_generals))
-                attacking_generals = sorted(available_generals, key=lambda g: g.army, reverse=True)[:max_attackers]
-                
-                self.log_list.addItem(f"{faction.name}势力从{attack_city.name}向{player_targets.name}发动攻击！")
-                
-                # 执行电脑攻击
-                self.execute_computer_attack(attack_city, attacking_generals, player_targets)
-                
-                # 无论攻击是否成功都消耗行动次数
-                actions_remaining -= 1
-        
-        return actions_remaining
-
-    def execute_computer_attack(self, origin_city, armies, target_city):
-        """执行电脑攻击（会触发战斗界面）"""
-        # 创建战斗管理对象来执行战斗
-        battle_manager = ComputerBattleManager(self, origin_city, armies, target_city)
-
-        # 战斗结束后更新城市颜色
-        self.update_city_color(target_city.name)
+    def defend_city(self, origin_city: City, target_city: City, armies: list[General], seed: int):
+        """回合引擎的 player_defense 钩子：电脑攻打玩家城池，弹出战斗界面由玩家应战"""
+        battle_manager = ComputerBattleManager(self, origin_city, armies, target_city, seed)
         return battle_manager.execute_battle()
 
+    def perform_action(self, action) -> ActionResult:
+        """通过回合引擎执行玩家行动（校验、执行、录像），成功时消耗一次操作次数"""
+        result = self.engine.execute(self.player, action)
+        if result.ok:
+            self.consume_action()
+        return result
+
+    def on_undo(self):
+        """撤销上一步，返还操作次数"""
+        result = self.engine.undo()
+        if result is None:
+            return
+        self.actions_remaining += 1
+        self.log_list.addItem(f"已撤销：{result.message}")
+        self.update_turn_info()
+        self.refresh_faction_panel()
+        if self.info_window is not None and self.info_window.isVisible() and self.info_window.is_player_city:
+            self.info_window.refresh()
+            self.info_window.update_buttons_state()
+
     def consume_action(self):
         """消耗一次操作次数"""
         if self.actions_remaining > 0:
@@ -2407,7 +2036,7 @@ class MainWindow(QMainWindow):
         ex = x2 - ux * R
         ey = y2 - uy * R
 
-        line = QGraphicsLineItem(sx, sy, ex, ey)
+        line = RoadItem(sx, sy, ex, ey)
         pen = QPen(QColor(120, 120, 120), 8)  # 进一步加粗连接线
         line.setPen(pen)
         self.scene.addItem(line)
@@ -2431,31 +2060,40 @@ class MainWindow(QMainWindow):
         #self.log_list.addItem("世界状态更新；(示例)")
 
     def refresh_faction_panel(self):
+        """请求重建整个势力面板（合并到下一帧执行）"""
+        self._dirty_panel.update(("cities", "generals"))
+        self.schedule_flush()
+
+    @profiler.profiled("MainWindow.rebuild_faction_panel")
+    def rebuild_faction_panel(self, parts):
+        """只重新拼接发生变化的行（cities / generals），其余行沿用缓存"""
         f = self.faction
-        info = f"势力：{f.name}\n主公：{f.ruler.name}\n城池：{', '.join([c.name for c in f.cities])}\n武将：{', '.join([g.name for g in f.generals])}"
+        if "cities" in parts or "cities" not in self._panel_lines:
+            self._panel_lines["cities"] = f"城池：{', '.join([c.name for c in f.cities])}"
+        if "generals" in parts or "generals" not in self._panel_lines:
+            self._panel_lines["generals"] = f"武将：{', '.join([g.name for g in f.generals])}"
+        info = f"势力：{f.name}\n主公：{f.ruler.name}\n{self._panel_lines['cities']}\n{self._panel_lines['generals']}"
         self.lbl_faction.setText(info)
 
 class ComputerBattleManager:
-    """电脑战斗管理器"""
-    def __init__(self, main_window, origin_city: City, armies: list[General], target_city: City):
+    """
+    电脑攻打玩家城池时的交互战斗
+    随机数全部由 BattleRandom 按 seed 派生，每场对战的出阵武将与阵型记入录像，可用 replay.py 重演
+    """
+    def __init__(self, main_window, origin_city: City, armies: list[General], target_city: City, seed: int):
         self.main_window = main_window
         self.origin_city = origin_city
         self.armies = armies
         self.target_city = target_city
         self.faction = origin_city.owner
-        self.player = target_city.owner == main_window.player # 目标城市是否为玩家所有,如果是则为True
+        self.rng = BattleRandom(seed)
+        self.bouts: list[list[str]] = [] # 每场对战的 [先手武将, 先手阵型, 应战武将, 应战阵型]
     
+    @profiler.profiled("ComputerBattleManager.execute_battle")
     def execute_battle(self):
-        """执行战斗"""
-        defend_armies: list[General] = []
-
-        tmp_copy = self.target_city.generals.copy()
-        for general in tmp_copy:
-            if general.army <= 0:
-                run_away(general, self.target_city)
-                self.main_window.refresh_faction_panel()
-            else:
-                defend_armies.append(general)
+        """执行战斗：电脑先手时玩家选择迎战阵型；玩家先手时由玩家选择出阵武将、阵型以及对方应战的武将"""
+        flee_unarmed(self.target_city, self.rng.flee) # 守城方无兵的武将先行逃亡
+        defend_armies = [g for g in self.target_city.generals if g.army > 0]
         
         attack = True  # 攻军先手
 
@@ -2463,343 +2101,88 @@ class ComputerBattleManager:
         while self.armies and defend_armies:
             if attack:
                 # 电脑选择出阵武将以及阵型
-                atk_general = max(self.armies, key=lambda g: g.leadership)
-
-                formation_atk = random.choice(["锋矢阵", "方圆阵", "投石阵"])
+                matchup = plan_matchups(self.armies, defend_armies)[0] # 电脑按配对优化选择出阵武将与对方迎战的武将
+                atk_general, dfd_general = matchup.first, matchup.second
 
-                dfd_general = min(defend_armies, key=lambda g: g.leadership) # 电脑选择对方迎战的武将
+                formation_atk = choose_formation(self.rng.choice, atk_general, dfd_general, is_first=True)
 
-                if self.player: # 攻打玩家城市，由玩家选择阵型
-                    # 玩家选择阵型
-                    while True:
-                        fdlg = FormationSelectDialog(self.main_window, wintitle= f"{atk_general.name}军向{dfd_general.name}军发起挑战,请选择阵型迎战")
-                        ret = fdlg.exec()
-                        if ret == QDialog.Accepted:
-                            formation_dfd = fdlg.get_formation()
-                            break
-                        else:
-                            QMessageBox.warning(self.main_window, "提示", "敌方来袭，必须选择阵型迎战！")
-                else:
-                    formation_dfd = random.choice(["锋矢阵", "方圆阵", "投石阵"])
+                # 攻打玩家城市，由玩家选择阵型
+                while True:
+                    fdlg = FormationSelectDialog(self.main_window, wintitle= f"{atk_general.name}军向{dfd_general.name}军发起挑战,请选择阵型迎战",
+                                                 advice=formation_advice(atk_general, dfd_general, is_first=False))
+                    ret = fdlg.exec()
+                    if ret == QDialog.Accepted:
+                        formation_dfd = fdlg.get_formation()
+                        break
+                    else:
+                        QMessageBox.warning(self.main_window, "提示", "敌方来袭，必须选择阵型迎战！")
             else:
-                if self.player: # 玩家城市被攻打，由玩家选择出阵武将和阵型
-                    # 玩家选择出阵武将
-                    while True:
-                        adlg = ArmySelectDialog(defend_armies, parent=self.main_window, single_mode=True)
-                        ret = adlg.exec()
-                        selected = adlg.get_selected()
-                        if ret == QDialog.Accepted and selected:
-                            atk_general = selected[0]
-                            break
-                        else:
-                            QMessageBox.warning(self.main_window, "提示", "敌方来袭，必须选择武将迎战！")
-                    
-                    # 玩家选择阵型
-                    while True:
-                        fdlg = FormationSelectDialog(self.main_window, wintitle="请选择阵型出战")
-                        ret = fdlg.exec()
-                        if ret == QDialog.Accepted:
-                            formation_atk = fdlg.get_formation()
-                            break
-                        else:
-                            QMessageBox.warning(self.main_window, "提示", "敌方来袭，必须选择阵型迎战！")
-                    
-                    # 由玩家选择敌方接受挑战的武将
-                    while True:
-                        ddlg = ArmySelectDialog(self.armies, parent=self.main_window, single_mode=True)
-                        ret = ddlg.exec()
-                        selected = ddlg.get_selected()
-                        if ret == QDialog.Accepted and selected:
-                            dfd_general = selected[0]
-                            break
-                        else:
-                            QMessageBox.warning(self.main_window, "提示", "敌方来袭，必须选择武将迎战！")
-                else:
-                    atk_general = max(defend_armies, key=lambda g: g.leadership)
-                    formation_atk = random.choice(["锋矢阵", "方圆阵", "投石阵"])
-                    dfd_general = min(self.armies, key=lambda g: g.leadership)
-                    #dfd_general = max(self.armies, key=lambda g: g.leadership)
-
-                formation_dfd = random.choice(["锋矢阵", "方圆阵", "投石阵"])
+                # 玩家城市被攻打，由玩家选择出阵武将和阵型
+                self.main_window.log_list.addItem(matchup_hint(defend_armies, self.armies))
+                while True:
+                    adlg = ArmySelectDialog(defend_armies, parent=self.main_window, single_mode=True)
+                    ret = adlg.exec()
+                    selected = adlg.get_selected()
+                    if ret == QDialog.Accepted and selected:
+                        atk_general = selected[0]
+                        break
+                    else:
+                        QMessageBox.warning(self.main_window, "提示", "敌方来袭，必须选择武将迎战！")
+                
+                # 由玩家选择敌方接受挑战的武将（先定对手，阵型窗口才能给出推演）
+                while True:
+                    ddlg = ArmySelectDialog(self.armies, parent=self.main_window, single_mode=True)
+                    ret = ddlg.exec()
+                    selected = ddlg.get_selected()
+                    if ret == QDialog.Accepted and selected:
+                        dfd_general = selected[0]
+                        break
+                    else:
+                        QMessageBox.warning(self.main_window, "提示", "敌方来袭，必须选择武将迎战！")
+
+                # 玩家选择阵型
+                while True:
+                    fdlg = FormationSelectDialog(self.main_window, wintitle="请选择阵型出战",
+                                                 advice=formation_advice(atk_general, dfd_general, is_first=True))
+                    ret = fdlg.exec()
+                    if ret == QDialog.Accepted:
+                        formation_atk = fdlg.get_formation()
+                        break
+                    else:
+                        QMessageBox.warning(self.main_window, "提示", "敌方来袭，必须选择阵型迎战！")
+
+                formation_dfd = choose_formation(self.rng.choice, atk_general, dfd_general, is_first=False)
                 
             msg = f"{atk_general.name}军 向 {dfd_general.name}军发起了对战"# TODO-finished: 在主窗口的def on_world_update(self)中显示“atk_general军 向 dfd_general军发起了对战”
             self.main_window.log_list.addItem(msg)
-            self.main_window.refresh_faction_panel()
+            self.bouts.append([atk_general.name, formation_atk, dfd_general.name, formation_dfd])
 
             Army1 = Army(formation_atk, atk_general, atk_general.army)
             Army2 = Army(formation_dfd, dfd_general, dfd_general.army)  
 
-            if self.player: # 如果玩家参与战斗，显示战斗窗口
-                battle_window = BattleWindow(Army1, Army2, parent=self.main_window)
-                battle_window.setWindowTitle("战斗中……（请等待战斗结束）")
-                
-                # 添加关闭按钮（初始禁用）
-                close_btn = QPushButton("关闭战斗窗口")
-                close_btn.setEnabled(False)
-                close_btn.clicked.connect(battle_window.close)
-                
-                # 将关闭按钮添加到战斗窗口布局
-                battle_window.layout().addWidget(close_btn)
-                
-                battle_window.show()
-                current_battle_window = battle_window
-                # TODO-finished:此处打开一个战斗窗口，这个战斗窗口应该显示Army1和Army2的阵型和武将信息，并且两边是武将图像，中间有一个显示战斗日志的区域展示后面我标记的日志
-
-                # 单挑
-                to_duel = Army1
-                if random.choice([True, False]):
-                    to_duel = Army2
-                # 随机选择一方主动触发单挑
-                duel_result = to_duel.duel(Army2 if to_duel == Army1 else Army1)           
-                if duel_result != "本回合未触发单挑":
-                    # BattleWindow 日志
-                    current_battle_window.append_log(f"<b>【单挑】</b>{duel_result}")
-
-                    QApplication.processEvents()  # 确保UI更新
-                    time.sleep(1)  # 等待1秒
-
-                    item = QListWidgetItem()
-                    item.setText(f"【单挑】{duel_result}")
-
-                    # 设置加粗字体
-                    font = item.font()
-                    font.setBold(True)
-                    item.setFont(font)
-
-                    # 主窗口日志
-                    self.main_window.log_list.addItem(item)
-                    self.main_window.refresh_faction_panel() # TODO: 此处refresh需要吗？
-                    # 单挑日志同时显示在战斗窗口的日志区域和主窗口的def on_world_update(self)中
-
-                # ------- 内层战斗循环 -------
-                while Army1.soldiers > 0 and Army2.soldiers > 0:
-
-                    res1 = Army1.attack_enemy(Army2)
-                    #logs.append(res1["battle_log"]) 
-                    #TODO-finished res1["battle_log"]日志只显示在战斗窗口的日志区域,res1["capture_log"]日志同时显示在战斗窗口的日志区域和主窗口的def on_world_update(self)中
-
-                    # battle_log 仅 BattleWindow
-                    current_battle_window.append_log(res1["battle_log"])
-                    QApplication.processEvents()
-                    time.sleep(1)
-
-                    # capture_log 若存在，两个地方都显示
-                    if res1["capture_log"]: # TODO: 我的capture_log和这里的是否为空对应了吗？
-                        current_battle_window.append_log(f"<b>{res1['capture_log']}</b>")
-                        QApplication.processEvents()
-                        time.sleep(1)
-                        self.main_window.log_list.addItem(res1["capture_log"])
-                    current_battle_window.update_army_info()
-                    self.main_window.refresh_faction_panel()
-                    QApplication.processEvents()
-
-                    if res1["win"]: # Army1获胜
-                        atk_general.army = Army1.soldiers
-                        dfd_general.army = 0
-                        if res1["capture"]:
-                            if attack:
-                                self.target_city.remove_general(dfd_general)
-                                self.origin_city.prisoners.append((dfd_general, 0))   
-                            else:
-                                self.origin_city.remove_general(dfd_general)
-                                self.target_city.prisoners.append((dfd_general, 0))
-                        else:
-                            if attack: # 攻军获胜,守军触发逃亡
-                                run_away(dfd_general, self.target_city)
-                                self.main_window.refresh_faction_panel()
-                            # 守军获胜，攻军逃亡回self.city即可
-                        break
+            # 战斗窗口显示双方阵型和武将信息，中间区域逐条展示单挑与交战日志
+            battle_window = BattleWindow(Army1, Army2, parent=self.main_window)
+            first_won, res, _ = battle_window.play_bout(self.rng.bout(len(self.bouts) - 1), self.main_window.log_list)
 
-                    # 轮到Army2反击
-                    res2 = Army2.attack_enemy(Army1)
-                    # res2["battle_log"]日志只显示在战斗窗口的日志区域,res2["capture_log"]日志同时显示在战斗窗口的日志区域和主窗口的def on_world_update(self)中
-
-                    current_battle_window.append_log(res2["battle_log"])
-                    QApplication.processEvents()
-                    time.sleep(1)
-
-                    if res2["capture_log"]:
-                        current_battle_window.append_log(f"<b>{res2['capture_log']}</b>")
-                        QApplication.processEvents()
-                        time.sleep(1)
-                        self.main_window.log_list.addItem(res2["capture_log"])
-
-                    current_battle_window.update_army_info()
-                    self.main_window.refresh_faction_panel()
-                    QApplication.processEvents()
-
-                    if res2["win"]:# Army2获胜
-                        dfd_general.army = Army2.soldiers
-                        atk_general.army = 0
-                        if res2["capture"]:
-                            if attack:
-                                self.origin_city.remove_general(atk_general)
-                                self.target_city.prisoners.append((atk_general, 0))
-                            else:
-                                self.target_city.remove_general(atk_general)
-                                self.origin_city.prisoners.append((atk_general, 0))
-                        else:
-                            if not attack: # 攻军获胜,守军触发逃亡
-                                run_away(atk_general, self.target_city)   
-                                self.main_window.refresh_faction_panel()
-                            # 攻军溃散时逃跑回self.city即可，无需逃亡其他城市 
-                        break
-                # ------- end 内层战斗循环 -------
-                
-                # 关闭战斗窗口，之前挑选出的一对武将的战斗结束
-                # 当前这场战斗结束，关闭窗口
-                # 当前这场战斗结束，启用关闭按钮
-                close_btn.setEnabled(True)
-                current_battle_window.setWindowTitle("战斗结束 - 请点击关闭按钮继续")
-                # 当前这场战斗结束，启用关闭按钮
-                current_battle_window.enable_close_button()
-                #current_battle_window.close()
-
-                # 等待用户关闭窗口
-                while current_battle_window.isVisible():
-                    QApplication.processEvents()
-                    time.sleep(0.1)
-            else:
-                # 单挑
-                to_duel = Army1
-                if random.choice([True, False]):
-                    to_duel = Army2
-                # 随机选择一方主动触发单挑
-                to_duel.duel(Army2 if to_duel == Army1 else Army1)           
-
-                # ------- 内层战斗循环 -------
-                while Army1.soldiers > 0 and Army2.soldiers > 0:
-                    res1 = Army1.attack_enemy(Army2)
-
-                    # capture_log 若存在，两个地方都显示
-                    if res1["capture_log"]:
-                        self.main_window.log_list.addItem(res1["capture_log"])
-
-                    self.main_window.refresh_faction_panel()
-
-                    if res1["win"]: # Army1获胜
-                        atk_general.army = Army1.soldiers
-                        dfd_general.army = 0
-                        if res1["capture"]:
-                            if attack:
-                                self.target_city.remove_general(dfd_general)
-                                self.origin_city.prisoners.append((dfd_general, 0))   
-                            else:
-                                self.origin_city.remove_general(dfd_general)
-                                self.target_city.prisoners.append((dfd_general, 0))
-                        else:
-                            if attack: # 攻军获胜,守军触发逃亡
-                                run_away(dfd_general, self.target_city)
-                                self.main_window.refresh_faction_panel()
-                            # 守军获胜，攻军逃亡回self.city即可
-                        break
+            # 败者兵力归零：攻军败将被俘或逃回出发城，守军败将被俘或逃亡
+            winner, loser = (Army1, Army2) if first_won else (Army2, Army1)
+            loser_is_attacker = attack != first_won
+            apply_bout(self.origin_city, self.target_city, winner.general, loser.general, winner.soldiers,
+                       loser_is_attacker, res["capture"], self.rng.flee)
 
-                    # 轮到Army2反击
-                    res2 = Army2.attack_enemy(Army1)
-
-                    if res2["capture_log"]:
-                        self.main_window.log_list.addItem(res2["capture_log"])
-
-                    self.main_window.refresh_faction_panel()
-
-                    if res2["win"]:# Army2获胜
-                        dfd_general.army = Army2.soldiers
-                        atk_general.army = 0
-                        if res2["capture"]:
-                            if attack:
-                                self.origin_city.remove_general(atk_general)
-                                self.target_city.prisoners.append((atk_general, 0))
-                            else:
-                                self.target_city.remove_general(atk_general)
-                                self.origin_city.prisoners.append((atk_general, 0))
-                        else:
-                            if not attack: # 攻军获胜,守军触发逃亡
-                                run_away(atk_general, self.target_city)   
-                                self.main_window.refresh_faction_panel()
-                            # 攻军溃散时逃跑回self.city即可，无需逃亡其他城市 
-                        break
-                # ------- end 内层战斗循环 -------
-                
             # ------- 外层循环剔除溃逃武将 -------
-            if Army1.soldiers <= 0:
-                if attack:
-                    self.armies.remove(atk_general)
-                else:
-                    defend_armies.remove(atk_general)
+            if loser_is_attacker:
+                self.armies.remove(loser.general)
             else:
-                if Army2.soldiers > 0:
-                    assert(0), "跳出内层循环时必然有一队士兵为0但是Army1不为0是Army2同时不为0"
-                else: # Army2军队溃散
-                    if attack:
-                       defend_armies.remove(dfd_general)
-                    else:
-                        self.armies.remove(dfd_general) 
+                defend_armies.remove(loser.general)
 
             attack = not attack # 取反，下一轮由另一方先攻
 
-        # 战后总结
-        if self.armies:
-            if defend_armies:
-                assert(0), "不可能两个攻城军和守城军同时不为空时中止战斗！"
-            else: # 守城军消耗殆尽
-                if len(self.target_city.owner.cities) <= 1: # 最后一城
-                    if len(self.target_city.owner.cities) != 1:
-                        assert(0), "势力所拥有的城池数小于等于0"
-                    
-                    to_remove_generals: list["General"] = []
-
-                    for g in self.target_city.generals:
-                        to_remove_generals.append(g)
-                    
-                    for g in to_remove_generals:
-                        self.target_city.remove_general(g) # 从该城池移除该武将
-                        self.origin_city.prisoners.append((g, 0)) #加入监狱
-
-                    to_remove_generals.clear()
-
-                    for g in self.target_city.owner.generals:
-                        to_remove_generals.append(g)
-
-                    for g in to_remove_generals:
-                        self.target_city.owner.remove_general(g)
-                    
-                    # TODO-finished: 在主窗口的def on_world_update(self)中显示“敌方势力 {enemy.owner.name} 被消灭！”
-                    msg = f"敌方势力 {self.target_city.owner.name} 被消灭！"
-                    self.main_window.log_list.addItem(msg)           # 主窗口显示
-                    self.main_window.refresh_faction_panel()
-
-                self.target_city.owner.remove_city(self.target_city)
-                
-                # 剩余攻城军进入enemy，self的势力占领新城，将所有官员设置为空
-                for g in self.armies:
-                    self.origin_city.remove_general(g)
-                    self.target_city.generals.append(g)
-                    
-                self.origin_city.owner.add_city(self.target_city)
-                self.target_city.officer_agriculture = None
-                self.target_city.officer_commerce = None
-
-                # 更新城市颜色
-                self.main_window.update_city_color(self.target_city.name)
-
-                msg = f"势力 {self.origin_city.owner.name} 成功占领 {self.target_city.name}！"
-                self.main_window.log_list.addItem(msg)      # 主窗口日志
-                self.main_window.refresh_faction_panel()
-                # === 新增：检查游戏是否结束 ===
-                self.main_window.check_game_over(conquered_city=self.target_city, conqueror=self.origin_city.owner)
-
-        else: # 攻城军耗尽
-            if not defend_armies:
-                assert(0), "攻城军和守城军无法同时为0！"
-            else:
-                msg = f"势力 {self.target_city.owner.name} 成功防守 {self.target_city.name}！"
-                self.main_window.log_list.addItem(msg)     # 主窗口日志
-                self.main_window.refresh_faction_panel()
-                #TODO: 在主窗口和二级窗口显示敌方势力 {enemy.owner.name} 成功防守 {enemy.name}！
-
-            # 如果攻城军耗尽，守城军依旧存在，攻城的将领要么在前面的逻辑被俘，要么已经逃回self，因此无需处理
-
-        return # 无需返回日志，因为日志在运行过程中以及主窗口中已经显示出来了
+        self.main_window.record("defend", origin=self.origin_city.name, target=self.target_city.name,
+                                seed=self.rng.seed, bouts=self.bouts)
+        # 战后总结：攻军尚存则占领城池（最后一城则消灭其势力），否则守城成功
+        return self.main_window.engine.settle_siege(self.origin_city, self.target_city, self.armies,
+                                                    defend_armies, self.rng.flee)
 
 class VictoryDialog(QDialog):
     """胜利对话框"""
@@ -2968,55 +2351,6 @@ class GameOverDialog(QDialog):
         self.accept()
         QApplication.quit()
 
-def load_generals_from_json(file_path="generals.json"):
-    """从JSON文件加载武将数据"""
-    if not os.path.exists(file_path):
-        print(f"错误：找不到文件 {file_path}")
-        return None
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    return data
-
-def create_general_from_data(gen_data):
-    """从字典数据创建General对象"""
-    return General(
-        name=gen_data["name"],
-        leadership=gen_data["leadership"],
-        martial=gen_data["martial"],
-        intellect=gen_data["intellect"],
-        politics=gen_data["politics"],
-        loyalty=gen_data["loyalty"],
-        _greed=gen_data.get("greed", 0.3)  # 默认贪婪值
-    )
-
-def initialize_game_from_data(data):
-    """从加载的数据初始化游戏"""
-    factions = {}
-    wild_generals = []
-    
-    # 创建在野武将
-    for wild_data in data["wild_generals"]:
-        wild_generals.append(create_general_from_data(wild_data))
-    
-    # 创建势力
-    for faction_name, faction_data in data["factions"].items():
-        # 创建君主
-        ruler = create_general_from_data(faction_data["ruler"])
-        
-        # 创建势力
-        faction = Faction(faction_name, ruler)
-        
-        # 添加武将到势力
-        for gen_data in faction_data["generals"]:
-            general = create_general_from_data(gen_data)
-            faction.add_general(general)
-        
-        factions[faction_name] = faction
-    
-    return factions, wild_generals
-
 if __name__ == "__main__":
     app = QApplication(sys.argv)
 
@@ -3026,97 +2360,18 @@ if __name__ == "__main__":
         print("无法加载武将数据，使用默认数据")
         # 这里可以保留原来的硬编码数据作为备用
         sys.exit(1)
-    
-    # 初始化游戏
-    factions, wild_generals = initialize_game_from_data(data)
-    
-    shu = factions["蜀"]
-    wei = factions["魏"] 
-    wu = factions["吴"]
-    
-    # ======================
-    # 创建城市并分配武将
-    # ======================
-    
-    # 蜀国城市
-    yizhou = City("益州", food=1200, gold=900, owner=shu)
-    hanzhong = City("汉中", food=900, gold=700, owner=shu)
-    jingzhou = City("荆州", food=1000, gold=800, owner=shu)
-    
-    # 分配蜀国武将到城市（前4个）
-    shu_generals = [g for g in shu.generals if g != shu.ruler]
-    yizhou.generals.extend([shu.ruler, shu_generals[0], shu_generals[1]])  # 刘备、诸葛亮、关羽
-    hanzhong.generals.extend([shu_generals[2], shu_generals[3], shu_generals[6], shu_generals[7]])  # 张飞、赵云
-    jingzhou.generals.extend([shu_generals[4], shu_generals[5], shu_generals[8], shu_generals[9]])  # 马超、黄忠
-    
-    # 魏国城市
-    shangyong = City("上庸", food=900, gold=700, owner=wei)
-    chenliu = City("陈留", food=1100, gold=1000, owner=wei)
-    xuchang = City("许昌", food=1300, gold=1200, owner=wei)
-    
-    # 分配魏国武将到城市
-    wei_generals = [g for g in wei.generals if g != wei.ruler]
-    shangyong.generals.extend([wei_generals[0], wei_generals[1], wei_generals[6], wei_generals[7]])  # 司马懿、夏侯惇
-    chenliu.generals.extend([wei_generals[2], wei_generals[3], wei_generals[8], wei_generals[9]])  # 夏侯渊、张辽
-    xuchang.generals.extend([wei.ruler, wei_generals[4], wei_generals[5]])  # 曹操、徐晃、张郃
-    
-    # 吴国城市
-    wucheng = City("吴", food=1100, gold=900, owner=wu)
-    kuaiji = City("会稽", food=950, gold=850, owner=wu)
-    chaisang = City("柴桑", food=1000, gold=900, owner=wu)
-    
-    # 分配吴国武将到城市
-    wu_generals = [g for g in wu.generals if g != wu.ruler]
-    wucheng.generals.extend([wu.ruler, wu_generals[0], wu_generals[1]])  # 孙权、周瑜、吕蒙
-    kuaiji.generals.extend([wu_generals[2], wu_generals[3], wu_generals[6], wu_generals[7]])  # 陆逊、甘宁
-    chaisang.generals.extend([wu_generals[4], wu_generals[5], wu_generals[8], wu_generals[9]])  # 太史慈、黄盖
-    
-    # 添加城市到势力
-    for city in [yizhou, hanzhong, jingzhou]:
-        shu.add_city(city)
-    for city in [shangyong, chenliu, xuchang]:
-        wei.add_city(city)
-    for city in [wucheng, kuaiji, chaisang]:
-        wu.add_city(city)
-    
-    # 分配在野武将到随机城市
-    for wild_general in wild_generals:
-        random_city = random.choice([yizhou, hanzhong, jingzhou, shangyong, chenliu, xuchang, wucheng, kuaiji, chaisang])
-        random_city.wild_generals.append(wild_general)
-    
-    # ======================
-    # 设置城市连接关系
-    # ======================
-    yizhou.neighbors = [hanzhong, jingzhou]
-    hanzhong.neighbors = [yizhou, shangyong]
-    jingzhou.neighbors = [yizhou, kuaiji]
-    kuaiji.neighbors = [jingzhou, wucheng]
-    wucheng.neighbors = [kuaiji, chaisang]
-    chaisang.neighbors = [wucheng, chenliu]
-    chenliu.neighbors = [chaisang, xuchang]
-    xuchang.neighbors = [chenliu, shangyong]
-    shangyong.neighbors = [xuchang, hanzhong]
-    
-    # 设置初始兵力
-    for faction in [shu, wei, wu]:
-        for general in faction.generals:
-            if general.martial >= 80:  # 武力高的武将初始兵力多
-                general.army = random.randint(800, 1000)
-            else:
-                general.army = random.randint(500, 800)
-    
-    # ======================
-    # 世界城市列表
-    # ======================
-    world = [yizhou, hanzhong, jingzhou, shangyong, chenliu, xuchang, wucheng, kuaiji, chaisang]
-    
-    shu.add_general(shu.ruler)
-    wei.add_general(wei.ruler)
-    wu.add_general(wu.ruler)
-    
+
+    # 整局只用一个随机种子；种子与玩家操作一起写入录像，可用 replay.py 重演
+    seed = random.randrange(2 ** 32)
+    random.seed(seed)
+    scenario = build_world(data, "蜀")
+
+    os.makedirs("replays", exist_ok=True)
+    recorder = CommandLog(time.strftime("replays/game_%Y%m%d_%H%M%S.jsonl"), seed, "generals.json",
+                          scenario.player.name)
 
     # 打开主界面（玩家暂定为蜀）
-    main = MainWindow(shu, world, [wei, wu])
+    main = MainWindow(scenario.player, scenario.world, scenario.other_factions, recorder)
     main.resize(1200, 800)
     main.show()
     sys.exit(app.exec())
@@ -0,0 +1,101 @@
+"""
+攻城中出阵武将的配对优化（与界面无关）
+
+攻城时先手一方每场挑一名己方武将、一名对方武将对战。把整场攻城近似为一次指派：
+己方每名武将至多对上一名对方武将，最大化期望胜场数（各对胜率之和），用匈牙利算法求解。
+- pair_win_probability: 先手武将对应战武将的胜率，取双方按纳什均衡选阵型时的博弈值（strategy.solve_zero_sum），
+  各阵型组合的胜率用 forecast.quick_win_probability 估计；统率与兵力分桶后缓存，几十对几十的攻城也只需估计一次；
+- plan_matchups: 给出完整的对阵顺序（把握最大的排在前面），电脑据此出阵，玩家据此得到建议。
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Mapping, Optional, Sequence
+
+from attribute import FORMATIONS, General
+from forecast import Side, quick_win_probability
+from strategy import bucket_of, solve_zero_sum
+
+@dataclass
+class Matchup:
+    """一组对阵：first 先手挑战 second"""
+    first: General
+    second: General
+    win_probability: float # first 获胜的概率
+
+@lru_cache(maxsize=8192)
+def _bucket_value(leadership1: int, soldiers1: int, leadership2: int, soldiers2: int) -> float:
+    table = [[quick_win_probability(Side(leadership1, f1, soldiers1), Side(leadership2, f2, soldiers2))
+              for f2 in FORMATIONS] for f1 in FORMATIONS]
+    return solve_zero_sum(table)[2]
+
+def pair_win_probability(first: General, second: General, soldiers: Optional[Mapping[str, int]] = None) -> float:
+    """
+    first 先手挑战 second、双方按均衡混合策略选阵型时 first 的胜率
+    - soldiers: 武将名 -> 兵力，覆盖 general.army（后台推演时兵力记在局部变量中）
+    """
+    soldiers = soldiers or {}
+    return _bucket_value(*bucket_of(first, soldiers.get(first.name)), *bucket_of(second, soldiers.get(second.name)))
+
+def assign(cost: Sequence[Sequence[float]]) -> List[int]:
+    """
+    匈牙利算法（带势能的 O(n²m) 版本）：行数 n 不超过列数 m，
+    每行指派一个不同的列使总代价最小，返回每行分到的列下标
+    """
+    n, m = len(cost), len(cost[0]) if cost else 0
+    inf = float("inf")
+    u = [0.0] * (n + 1) # 行势能
+    v = [0.0] * (m + 1) # 列势能
+    owner = [0] * (m + 1) # 列 j 当前指派给的行（1 起始，0 表示空）
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        slack = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True: # 从第 i 行出发找一条增广路
+            used[j0] = True
+            i0, delta, j1 = owner[j0], inf, 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    reduced = cost[i0 - 1][j - 1] - u[i0] - v[j]
+                    if reduced < slack[j]:
+                        slack[j], way[j] = reduced, j0
+                    if slack[j] < delta:
+                        delta, j1 = slack[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    slack[j] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0: # 沿增广路翻转
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+    result = [0] * n
+    for j in range(1, m + 1):
+        if owner[j]:
+            result[owner[j] - 1] = j - 1
+    return result
+
+def plan_matchups(own: Sequence[General], enemies: Sequence[General],
+                  soldiers: Optional[Mapping[str, int]] = None) -> List[Matchup]:
+    """
+    own 一方先手时的对阵安排：最大化期望胜场数的一一配对，按胜率从高到低排列；
+    双方人数不等时只配 min(双方人数) 组，多出的武将留作后备
+    - soldiers: 同 pair_win_probability
+    """
+    if not own or not enemies:
+        return []
+    table = [[pair_win_probability(g, e, soldiers) for e in enemies] for g in own]
+    if len(own) <= len(enemies):
+        pairs = [(i, j) for i, j in enumerate(assign([[-p for p in row] for row in table]))]
+    else: # 行多于列时对转置后的表指派
+        transposed = [[-table[i][j] for i in range(len(own))] for j in range(len(enemies))]
+        pairs = [(i, j) for j, i in enumerate(assign(transposed))]
+    matchups = [Matchup(own[i], enemies[j], table[i][j]) for i, j in pairs]
+    matchups.sort(key=lambda m: m.win_probability, reverse=True)
+    return matchups
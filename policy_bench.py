@@ -0,0 +1,112 @@
+"""
+预算策略的无界面对比
+
+对每种预算策略（以及电脑自选 auto）用同一组随机种子各跑若干局无界面对局：
+所有城池固定使用该策略，玩家势力不行动，电脑攻打玩家城池时按电脑之间的规则自动结算。
+输出每种策略的每秒回合数，以及终局各势力的平均城池数、兵力与金钱。
+
+    python policy_bench.py                        # 每种策略 5 局，每局 60 回合
+    python policy_bench.py --games 10 --turns 100 --policies development frontier
+    python policy_bench.py --store world.bin      # 世界状态放在映射文件里，可另开进程用 world_store 查看
+    python policy_bench.py --workers 4            # 电脑势力在 4 个子进程中并行规划（结果与串行相同）
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import argparse
+import random
+import time
+
+from ai_planner import planning_pool
+from battle import simulate_siege
+from budget import POLICIES
+from game import GameEngine
+from scenario import build_world, load_generals_from_json
+from world_store import WorldStore
+
+AUTO = "auto" # 电脑按局势为各城挑选策略
+
+@dataclass
+class GameStats:
+    """一局的结果"""
+    turns: int
+    seconds: float
+    cities: Dict[str, int] = field(default_factory=dict) # 势力名 -> 城池数
+    soldiers: Dict[str, int] = field(default_factory=dict) # 势力名 -> 总兵力
+    gold: Dict[str, float] = field(default_factory=dict) # 势力名 -> 总金钱
+
+def run_game(data, seed: int, turns: int, policy: str, player: str = "蜀",
+             store_path: Optional[str] = None, pool=None) -> GameStats:
+    """
+    用 seed 开一局，固定预算策略（AUTO 为电脑自选）跑 turns 回合
+    - store_path: 城池与武将的数值绑定到该映射文件上，每回合结束后写入名单并落盘（见 world_store），不影响对局结果
+    - pool: 电脑势力规划用的进程池（见 ai_planner.planning_pool），不影响对局结果
+    """
+    random.seed(seed)
+    scenario = build_world(data, player)
+    engine = GameEngine(scenario.player, scenario.other_factions, scenario.world, planner_pool=pool)
+    engine.budget_policy = None if policy == AUTO else policy
+
+    def auto_defend(origin, target, attackers, seed):
+        defenders = [g for g in target.generals if g.army > 0]
+        engine.commit_outcome(origin, target, attackers, simulate_siege(attackers, defenders, random.Random(seed)))
+    engine.player_defense = auto_defend
+
+    factions = [scenario.player] + scenario.other_factions
+    store = None
+    if store_path:
+        store = WorldStore.create(store_path, scenario.world, factions)
+        store.bind(scenario.world, factions)
+    started = time.perf_counter()
+    for _ in range(turns):
+        if sum(1 for f in factions if f.cities) <= 1: # 天下一统
+            break
+        engine.end_turn()
+        if store is not None:
+            store.capture(scenario.world, factions, engine.current_turn)
+            store.flush()
+    elapsed = time.perf_counter() - started
+    engine.close()
+    if store is not None:
+        store.close() # 解除绑定，下面的统计读的是对象上的值
+
+    stats = GameStats(engine.current_turn - 1, elapsed)
+    for faction in factions:
+        stats.cities[faction.name] = len(faction.cities)
+        stats.soldiers[faction.name] = sum(g.army for c in faction.cities for g in c.generals)
+        stats.gold[faction.name] = sum(c.gold for c in faction.cities)
+    return stats
+
+def summarize(policy: str, games: List[GameStats]) -> str:
+    turns = sum(g.turns for g in games)
+    seconds = sum(g.seconds for g in games)
+    lines = [f"[{policy}] {len(games)} 局 {turns} 回合，{turns / seconds if seconds > 0 else float('inf'):.1f} 回合/秒"]
+    for name in games[0].cities:
+        avg = lambda values: sum(values) / len(values)
+        lines.append(f"  {name}：城池 {avg([g.cities[name] for g in games]):.1f}  "
+                     f"兵力 {avg([g.soldiers[name] for g in games]):.0f}  "
+                     f"金钱 {avg([g.gold[name] for g in games]):.0f}")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="比较不同预算策略的回合耗时与对局结果")
+    parser.add_argument("--games", type=int, default=5, help="每种策略的对局数（种子 1..N）")
+    parser.add_argument("--turns", type=int, default=60, help="每局最多回合数")
+    parser.add_argument("--policies", nargs="+", default=[*POLICIES, AUTO], choices=[*POLICIES, AUTO])
+    parser.add_argument("--scenario", default="generals.json")
+    parser.add_argument("--store", help="把世界状态放在该映射文件里（后一局覆盖前一局）")
+    parser.add_argument("--workers", type=int, default=0, help="电脑势力并行规划的子进程数（0 为在本进程依次规划）")
+    args = parser.parse_args(argv)
+
+    data = load_generals_from_json(args.scenario)
+    pool = planning_pool(args.workers) if args.workers > 0 else None
+    try:
+        for policy in args.policies:
+            games = [run_game(data, seed, args.turns, policy, store_path=args.store, pool=pool)
+                     for seed in range(1, args.games + 1)]
+            print(summarize(policy, games))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+if __name__ == "__main__":
+    main()
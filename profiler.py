@@ -0,0 +1,112 @@
+"""
+回合耗时分析（默认关闭）
+
+设置环境变量 SANGUO_PROFILE=1 或在代码中令 profiler.enabled = True 即可开启：
+- 每个回合结束时输出各阶段的耗时汇总（调用次数、总耗时、平均、最大）；
+- 同时把本回合的事件写入 SANGUO_PROFILE_DIR（默认 profile/）下的
+  turn_<回合>.json，格式为 Chrome Trace，可直接拖进 chrome://tracing 或 Perfetto 查看。
+关闭时 phase()/profiled() 只多一次布尔判断。
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Dict, List
+import json
+import os
+import threading
+import time
+
+@dataclass
+class ProfileEvent:
+    """一次计时记录"""
+    name: str
+    start: float # 相对分析器创建时刻的秒数
+    duration: float # 秒
+    thread: int
+    args: Dict[str, str] = field(default_factory=dict)
+
+class TurnProfiler:
+    def __init__(self):
+        self.enabled = bool(os.environ.get("SANGUO_PROFILE"))
+        self.output_dir = os.environ.get("SANGUO_PROFILE_DIR", "profile")
+        self.turn = 0
+        self.events: List[ProfileEvent] = []
+        self._origin = time.perf_counter()
+
+    # ==== 计时接口 ====
+    @contextmanager
+    def phase(self, name: str, **args):
+        """计时一段代码：with profiler.phase("魏:plan"): ..."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.events.append(ProfileEvent(name, start - self._origin, end - start,
+                                            threading.get_ident(), {k: str(v) for k, v in args.items()}))
+
+    def profiled(self, name: str = None):
+        """装饰器：为函数/方法计时，name 缺省为函数的限定名"""
+        def decorator(func):
+            label = name or func.__qualname__
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.phase(label):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # ==== 回合汇总 ====
+    def begin_turn(self, turn: int):
+        self.turn = turn
+        self.events = []
+
+    def report(self) -> str:
+        """本回合各阶段耗时汇总，按总耗时降序"""
+        stats: Dict[str, List[float]] = {}
+        for e in self.events:
+            stats.setdefault(e.name, []).append(e.duration)
+
+        lines = [f"=== 第 {self.turn} 回合耗时分析 ===",
+                 f"{'阶段':<40}{'次数':>6}{'总计(ms)':>12}{'平均(ms)':>12}{'最大(ms)':>12}"]
+        for name, durations in sorted(stats.items(), key=lambda kv: sum(kv[1]), reverse=True):
+            total = sum(durations)
+            lines.append(f"{name:<40}{len(durations):>6}{total * 1000:>12.2f}"
+                         f"{total / len(durations) * 1000:>12.2f}{max(durations) * 1000:>12.2f}")
+        return "\n".join(lines)
+
+    def to_json(self) -> List[dict]:
+        return [{"name": e.name, "start": e.start, "duration": e.duration, "thread": e.thread, "args": e.args}
+                for e in self.events]
+
+    def to_chrome_trace(self) -> dict:
+        """Chrome Trace Event 格式（完整事件 ph=X，时间单位微秒）"""
+        return {
+            "traceEvents": [
+                {"name": e.name, "ph": "X", "ts": e.start * 1e6, "dur": e.duration * 1e6,
+                 "pid": os.getpid(), "tid": e.thread, "args": e.args}
+                for e in self.events
+            ],
+            "displayTimeUnit": "ms",
+            "otherData": {"turn": self.turn},
+        }
+
+    def export(self, path: str, chrome: bool = True):
+        """写出本回合事件：chrome=True 为 Chrome Trace，否则为简单的 JSON 事件列表"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace() if chrome else self.to_json(), f, ensure_ascii=False)
+
+    def end_turn(self) -> str:
+        """结束本回合：写出 Chrome Trace 并返回耗时汇总"""
+        text = self.report()
+        self.export(os.path.join(self.output_dir, f"turn_{self.turn}.json"))
+        return text
+
+profiler = TurnProfiler()
@@ -0,0 +1,201 @@
+"""
+对局录像与快进重演
+
+录制：CommandLog 把一局游戏写成 JSON Lines——第一行是文件头（随机种子、剧本文件、玩家势力、每回合操作次数），
+之后每行一条命令 {"t": 回合, "k": 类型, ...}：
+- 玩家行动：explore / persuade / trade_food / transport / transfer_generals / set_officers / attack
+  （字段即 actions.py 中行动的字段），以及 undo（撤销上一次行动）与 end_turn
+- defend：电脑攻打玩家城池时玩家的应对（每场对战的出阵武将与阵型）
+- plan：电脑势力本回合的规划（actions 为各行动的记录），重演时原样执行，不再重新规划
+每条命令写入后立即落盘，游戏中途退出也能重演到退出前的一刻。
+
+重演：Replayer 用同一个种子和剧本重建世界，按顺序通过 GameEngine.execute 重新执行玩家行动，回合结束时交给引擎，
+电脑势力执行录像中记下的规划（录制之后 AI 改动也不影响重演），无需界面。有玩家参与的攻城按 battle.replay_siege 重新结算。
+录像与重演不一致时（命令顺序、攻城种子或势力对不上）抛出 ReplayDesync，重演就此中止。
+
+    python replay.py replays/xxx.jsonl                # 无界面快进到终局，输出每秒回合数
+    python replay.py replays/xxx.jsonl --turn 20      # 快进到第 20 回合开始
+    python replay.py replays/xxx.jsonl --turn 20 --show     # 快进后打开地图界面
+    python replay.py replays/xxx.jsonl --battles      # 有玩家参与的对战用战斗窗口逐场回放
+"""
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import random
+import sys
+import time
+
+from actions import Action, action_from_record
+from attribute import City, Faction, General
+from battle import fight_bout, replay_siege
+from game import GameEngine
+from scenario import build_world, load_generals_from_json
+
+LOG_VERSION = 2
+
+class CommandLog:
+    """对局录像的写入端，path 为 None 时只保存在内存中"""
+    def __init__(self, path: Optional[str], seed: int, scenario: str = "generals.json", player: str = "蜀",
+                 actions_per_turn: int = 8):
+        self.header = {"version": LOG_VERSION, "seed": seed, "scenario": scenario, "player": player,
+                       "actions_per_turn": actions_per_turn}
+        self.commands: List[dict] = []
+        self._file = None
+        if path is not None:
+            self._file = open(path, "w", encoding="utf-8")
+            self._write(self.header)
+
+    def _write(self, entry: dict):
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+    def record(self, turn: int, kind: str, **fields):
+        entry = {"t": turn, "k": kind, **fields}
+        self.commands.append(entry)
+        if self._file is not None:
+            self._write(entry)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def load_log(path: str) -> Tuple[dict, List[dict]]:
+    """读取录像，返回 (文件头, 命令列表)"""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    if not lines or lines[0].get("version") != LOG_VERSION:
+        raise ValueError(f"{path} 不是可识别的对局录像")
+    return lines[0], lines[1:]
+
+class ReplayDesync(Exception):
+    """重演结果与录像不符（录制之后规则或数据发生了变化）"""
+
+class Replayer:
+    """
+    按录像重演一局游戏
+    - fight: 结算单场对战的函数，签名同 battle.fight_bout；换成战斗窗口即可可视化回放
+    - pool: 电脑之间攻城推演用的进程池（见 ai_planner.planning_pool），不影响重演结果
+    """
+    def __init__(self, header: dict, commands: List[dict], data=None, pool=None,
+                 log: Callable[[str], None] = None, fight=fight_bout):
+        random.seed(header["seed"])
+        data = data or load_generals_from_json(header["scenario"])
+        scenario = build_world(data, header["player"])
+        self.engine = GameEngine(scenario.player, scenario.other_factions, scenario.world,
+                                 header["actions_per_turn"], log, planner_pool=pool)
+        self.engine.player_defense = self.defend
+        self.engine.recorded_plan = self.plan
+        self.engine.fight = fight
+        self.pending = deque(commands)
+
+    @property
+    def log(self):
+        return self.engine.log
+
+    def _take(self, kind: str) -> dict:
+        command = self.pending.popleft() if self.pending else None
+        if command is None or command["k"] != kind:
+            found = command["k"] if command else "录像结尾"
+            raise ReplayDesync(f"第 {self.engine.current_turn} 回合：应为 {kind}，录像中为 {found}")
+        return command
+
+    # ==== 引擎钩子 ====
+    def plan(self, faction: Faction) -> List[Action]:
+        command = self._take("plan")
+        if command["faction"] != faction.name:
+            raise ReplayDesync(f"第 {self.engine.current_turn} 回合：应为{faction.name}的规划，录像中为{command['faction']}")
+        return [action_from_record(record) for record in command["actions"]]
+
+    def defend(self, origin: City, target: City, attackers: List[General], seed: int):
+        command = self._take("defend")
+        if (command["origin"], command["target"], command["seed"]) != (origin.name, target.name, seed):
+            raise ReplayDesync(f"第 {self.engine.current_turn} 回合：{origin.name}攻打{target.name}与录像不一致")
+        conqueror = origin.owner
+        conquered, destroyed = replay_siege(origin, target, attackers, seed, command["bouts"],
+                                            log=self.log, fight=self.engine.fight)
+        if destroyed:
+            self.log(f"敌方势力 {destroyed} 被消灭！")
+        if conquered:
+            self.log(f"势力 {conqueror.name} 成功占领 {target.name}！")
+
+    # ==== 玩家命令 ====
+    def apply(self, command: dict):
+        """执行一条玩家命令"""
+        engine = self.engine
+        if command["t"] != engine.current_turn:
+            raise ReplayDesync(f"命令 {command['k']} 属于第 {command['t']} 回合，当前为第 {engine.current_turn} 回合")
+        kind = command["k"]
+
+        if kind == "end_turn":
+            for line in engine.end_turn():
+                self.log(line)
+        elif kind == "undo":
+            if engine.undo() is None:
+                raise ReplayDesync(f"第 {engine.current_turn} 回合：没有可撤销的行动")
+        else:
+            action = action_from_record(command)
+            if kind == "attack" and random.getrandbits(32) != action.seed: # 界面开战前抽取种子
+                raise ReplayDesync(f"第 {engine.current_turn} 回合：攻打{action.target}的随机种子与录像不一致")
+            result = engine.execute(engine.player, action)
+            if not result.ok:
+                raise ReplayDesync(f"第 {engine.current_turn} 回合：{kind} 未通过校验（{result.message}）")
+            self.log(result.message)
+
+    def run(self, until_turn: Optional[int] = None) -> int:
+        """重演到录像结尾或第 until_turn 回合开始，返回执行的回合数"""
+        start = self.engine.current_turn
+        while self.pending:
+            if until_turn is not None and self.engine.current_turn >= until_turn:
+                break
+            self.apply(self.pending.popleft())
+        return self.engine.current_turn - start
+
+def ownership_summary(engine: GameEngine) -> Dict[str, List[str]]:
+    """势力 -> 城池名，用于比较两次重演的终局"""
+    summary: Dict[str, List[str]] = {}
+    for city in engine.world_cities:
+        summary.setdefault(city.owner.name if city.owner else "无主", []).append(city.name)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="快进重演对局录像")
+    parser.add_argument("path", help="录像文件（.jsonl）")
+    parser.add_argument("--turn", type=int, default=None, help="快进到该回合开始时停下")
+    parser.add_argument("--show", action="store_true", help="快进结束后打开地图界面")
+    parser.add_argument("--battles", action="store_true", help="有玩家参与的对战用战斗窗口回放")
+    parser.add_argument("--verbose", action="store_true", help="输出重演日志")
+    args = parser.parse_args(argv)
+
+    header, commands = load_log(args.path)
+    log = print if args.verbose else None
+
+    app = None
+    fight = fight_bout
+    if args.show or args.battles: # 只有需要界面时才加载 PySide6
+        from PySide6.QtWidgets import QApplication
+        from main import BattleWindow, MainWindow
+        app = QApplication(sys.argv)
+        if args.battles:
+            fight = lambda army1, army2, rng: BattleWindow(army1, army2).play_bout(rng, delay=0.3)
+
+    replayer = Replayer(header, commands, log=log, fight=fight)
+    started = time.perf_counter()
+    turns = replayer.run(args.turn)
+    elapsed = time.perf_counter() - started
+
+    engine = replayer.engine
+    print(f"重演 {turns} 个回合，用时 {elapsed:.3f} 秒（{turns / elapsed if elapsed > 0 else float('inf'):.1f} 回合/秒），"
+          f"当前第 {engine.current_turn} 回合")
+    for faction, cities in ownership_summary(engine).items():
+        print(f"  {faction}：{'、'.join(cities)}")
+
+    if args.show:
+        window = MainWindow(engine.player, engine.world_cities, engine.other_factions, engine=engine)
+        window.resize(1200, 800)
+        window.show()
+        sys.exit(app.exec())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+开局剧本：从 generals.json 读取武将、建立城池与势力
+
+建立世界的过程会消耗全局 random（在野武将的落点、初始兵力），
+只要在调用 build_world 之前用同一个种子 random.seed，得到的开局就完全相同（重演依赖这一点）。
+"""
+from dataclasses import dataclass
+from typing import List
+import json
+import os
+import random
+
+from attribute import City, Faction, General
+from scenario_cache import FLOAT_FIELDS, INT_FIELDS, Roster, load_cached
+
+@dataclass
+class Scenario:
+    player: Faction
+    other_factions: List[Faction]
+    world: List[City]
+
+def load_generals_from_json(file_path="generals.json", use_cache: bool = True):
+    """
+    从JSON文件加载武将数据
+    - use_cache: 使用 scenario_cache 的二进制缓存，剧本内容不变时跳过 JSON 解析，
+      命中缓存时返回按列的 Roster（build_world 同样接受），否则返回剧本字典
+    """
+    if not os.path.exists(file_path):
+        print(f"错误：找不到文件 {file_path}")
+        return None
+
+    if use_cache:
+        return load_cached(file_path, lambda raw: json.loads(raw.decode("utf-8")))
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    return data
+
+def create_general_from_data(gen_data):
+    """从字典数据创建General对象"""
+    return General(
+        name=gen_data["name"],
+        leadership=gen_data["leadership"],
+        martial=gen_data["martial"],
+        intellect=gen_data["intellect"],
+        politics=gen_data["politics"],
+        loyalty=gen_data["loyalty"],
+        _greed=gen_data.get("greed", 0.3)  # 默认贪婪值
+    )
+
+def initialize_game_from_roster(roster: Roster):
+    """从缓存读出的各列直接创建武将与势力，结果与 initialize_game_from_data 读同一份剧本字典相同"""
+    factions = {}
+    wild_generals = []
+    columns = [roster.columns[name] for name in INT_FIELDS + FLOAT_FIELDS]
+    for owner, is_ruler, name, *values in zip(roster.owners, roster.rulers, roster.names, *columns):
+        leadership, martial, intellect, politics, loyalty, greed = values
+        general = General(name, leadership, martial, intellect, politics, loyalty, _greed=greed)
+        if owner < 0:
+            wild_generals.append(general)
+        elif is_ruler: # 君主排在本势力的武将之前
+            factions[roster.factions[owner]] = Faction(roster.factions[owner], general)
+        else: # 名单来自缓存、不会重复，直接追加，免去 add_general 逐个比较整个名单
+            faction = factions[roster.factions[owner]]
+            general.faction = faction
+            faction.generals.append(general)
+    return factions, wild_generals
+
+def initialize_game_from_data(data):
+    """从加载的数据（剧本字典或缓存的 Roster）初始化游戏"""
+    if isinstance(data, Roster):
+        return initialize_game_from_roster(data)
+
+    factions = {}
+    wild_generals = []
+
+    # 创建在野武将
+    for wild_data in data["wild_generals"]:
+        wild_generals.append(create_general_from_data(wild_data))
+
+    # 创建势力
+    for faction_name, faction_data in data["factions"].items():
+        # 创建君主
+        ruler = create_general_from_data(faction_data["ruler"])
+
+        # 创建势力
+        faction = Faction(faction_name, ruler)
+
+        # 添加武将到势力
+        for gen_data in faction_data["generals"]:
+            general = create_general_from_data(gen_data)
+            faction.add_general(general)
+
+        factions[faction_name] = faction
+
+    return factions, wild_generals
+
+def build_world(data, player_name: str = "蜀") -> Scenario:
+    """按固定的三国开局布置城池、武将与道路，player_name 为玩家势力"""
+    # 初始化游戏
+    factions, wild_generals = initialize_game_from_data(data)
+
+    shu = factions["蜀"]
+    wei = factions["魏"]
+    wu = factions["吴"]
+
+    # ======================
+    # 创建城市并分配武将
+    # ======================
+
+    # 蜀国城市
+    yizhou = City("益州", food=1200, gold=900, owner=shu)
+    hanzhong = City("汉中", food=900, gold=700, owner=shu)
+    jingzhou = City("荆州", food=1000, gold=800, owner=shu)
+
+    # 分配蜀国武将到城市（前4个）
+    shu_generals = [g for g in shu.generals if g != shu.ruler]
+    yizhou.generals.extend([shu.ruler, shu_generals[0], shu_generals[1]])  # 刘备、诸葛亮、关羽
+    hanzhong.generals.extend([shu_generals[2], shu_generals[3], shu_generals[6], shu_generals[7]])  # 张飞、赵云
+    jingzhou.generals.extend([shu_generals[4], shu_generals[5], shu_generals[8], shu_generals[9]])  # 马超、黄忠
+
+    # 魏国城市
+    shangyong = City("上庸", food=900, gold=700, owner=wei)
+    chenliu = City("陈留", food=1100, gold=1000, owner=wei)
+    xuchang = City("许昌", food=1300, gold=1200, owner=wei)
+
+    # 分配魏国武将到城市
+    wei_generals = [g for g in wei.generals if g != wei.ruler]
+    shangyong.generals.extend([wei_generals[0], wei_generals[1], wei_generals[6], wei_generals[7]])  # 司马懿、夏侯惇
+    chenliu.generals.extend([wei_generals[2], wei_generals[3], wei_generals[8], wei_generals[9]])  # 夏侯渊、张辽
+    xuchang.generals.extend([wei.ruler, wei_generals[4], wei_generals[5]])  # 曹操、徐晃、张郃
+
+    # 吴国城市
+    wucheng = City("吴", food=1100, gold=900, owner=wu)
+    kuaiji = City("会稽", food=950, gold=850, owner=wu)
+    chaisang = City("柴桑", food=1000, gold=900, owner=wu)
+
+    # 分配吴国武将到城市
+    wu_generals = [g for g in wu.generals if g != wu.ruler]
+    wucheng.generals.extend([wu.ruler, wu_generals[0], wu_generals[1]])  # 孙权、周瑜、吕蒙
+    kuaiji.generals.extend([wu_generals[2], wu_generals[3], wu_generals[6], wu_generals[7]])  # 陆逊、甘宁
+    chaisang.generals.extend([wu_generals[4], wu_generals[5], wu_generals[8], wu_generals[9]])  # 太史慈、黄盖
+
+    # 添加城市到势力
+    for city in [yizhou, hanzhong, jingzhou]:
+        shu.add_city(city)
+    for city in [shangyong, chenliu, xuchang]:
+        wei.add_city(city)
+    for city in [wucheng, kuaiji, chaisang]:
+        wu.add_city(city)
+
+    # 分配在野武将到随机城市
+    for wild_general in wild_generals:
+        random_city = random.choice([yizhou, hanzhong, jingzhou, shangyong, chenliu, xuchang, wucheng, kuaiji, chaisang])
+        random_city.wild_generals.append(wild_general)
+
+    # ======================
+    # 设置城市连接关系
+    # ======================
+    yizhou.neighbors = [hanzhong, jingzhou]
+    hanzhong.neighbors = [yizhou, shangyong]
+    jingzhou.neighbors = [yizhou, kuaiji]
+    kuaiji.neighbors = [jingzhou, wucheng]
+    wucheng.neighbors = [kuaiji, chaisang]
+    chaisang.neighbors = [wucheng, chenliu]
+    chenliu.neighbors = [chaisang, xuchang]
+    xuchang.neighbors = [chenliu, shangyong]
+    shangyong.neighbors = [xuchang, hanzhong]
+
+    # 设置初始兵力
+    for faction in [shu, wei, wu]:
+        for general in faction.generals:
+            if general.martial >= 80:  # 武力高的武将初始兵力多
+                general.army = random.randint(800, 1000)
+            else:
+                general.army = random.randint(500, 800)
+
+    # ======================
+    # 世界城市列表
+    # ======================
+    world = [yizhou, hanzhong, jingzhou, shangyong, chenliu, xuchang, wucheng, kuaiji, chaisang]
+
+    shu.add_general(shu.ruler)
+    wei.add_general(wei.ruler)
+    wu.add_general(wu.ruler)
+
+    player = factions[player_name]
+    return Scenario(player, [f for f in (shu, wei, wu) if f is not player], world)
@@ -0,0 +1,187 @@
+"""
+剧本文件的二进制缓存
+
+load_generals_from_json 每次启动都要解析整份 JSON；大型 MOD 的武将名单解析起来很慢，而内容很少变化。
+这里把建立世界真正用到的字段编译成按列存放的二进制文件，按 JSON 内容的 SHA-256 命名：
+源文件不变时直接用 mmap 映射缓存、按列读出武将属性，完全跳过 JSON 解析；源文件一改，哈希不同，自动重新编译。
+
+文件布局（小端）：
+    头部   MAGIC(8) 版本(u32) 武将数(u32) 势力数(u32) 源文件哈希(32 字节) 填充(4)
+    之后依次为各列，每列前有字节长度(u64)，按 8 字节对齐：
+    势力名    偏移表 u32 × (势力数 + 1) + UTF-8 字节串
+    武将名    偏移表 u32 × (武将数 + 1) + UTF-8 字节串
+    所属      i32 × 武将数（势力下标，在野武将为 -1，顺序与 JSON 中一致：先在野武将，再各势力）
+    是否君主  u8 × 武将数
+    统率、武力、智力、政治  各 i32 × 武将数
+    忠义、贪婪              各 f64 × 武将数
+命中缓存时读出的是按列的 Roster 而不是剧本字典，scenario.build_world 直接按列创建武将，不再拼装中间的字典。
+"""
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"RTKSCN\x00\x01"
+VERSION = 1
+CACHE_DIR = ".scenario_cache" # 缓存目录，位于剧本文件旁
+DEFAULT_GREED = 0.3 # 与 create_general_from_data 的缺省值一致
+INT_FIELDS = ("leadership", "martial", "intellect", "politics")
+FLOAT_FIELDS = ("loyalty", "greed")
+
+_HEADER = struct.Struct("<8sIII32s4x") # 补齐到 8 字节对齐
+_LENGTH = struct.Struct("<Q")
+
+def source_digest(raw: bytes) -> bytes:
+    return hashlib.sha256(raw).digest()
+
+def cache_path(file_path: str, digest: bytes) -> str:
+    """剧本 file_path 内容哈希为 digest 时的缓存文件路径"""
+    folder = os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(folder, f"{stem}.{digest.hex()[:16]}.bin")
+
+# ========== 编译 ==========
+
+def _rows(data) -> Tuple[List[str], List[Tuple[int, bool, dict]]]:
+    """按 JSON 中的顺序展开为 (势力名列表, [(势力下标, 是否君主, 武将字典)])"""
+    factions = list(data["factions"])
+    rows = [(-1, False, g) for g in data["wild_generals"]]
+    for index, name in enumerate(factions):
+        faction = data["factions"][name]
+        rows.append((index, True, faction["ruler"]))
+        rows.extend((index, False, g) for g in faction["generals"])
+    return factions, rows
+
+def _strings(values: List[str]) -> bytes:
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = array("I", [0])
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    return _native(offsets).tobytes() + b"".join(encoded)
+
+def _native(column: array) -> array:
+    """列统一按小端存放"""
+    if sys.byteorder != "little":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+def compile_scenario(data, digest: bytes, out_path: str) -> bool:
+    """
+    把剧本字典 data 编译为缓存文件；出现缓存格式无法表示的数据（如非整数的属性）时不写入并返回 False
+    先写临时文件再改名，其他进程不会读到写了一半的缓存
+    """
+    factions, rows = _rows(data)
+    columns = [_strings(factions), _strings([g["name"] for _, _, g in rows]),
+               _native(array("i", (index for index, _, _ in rows))).tobytes(),
+               bytes(int(is_ruler) for _, is_ruler, _ in rows)]
+    for name in INT_FIELDS:
+        values = [g[name] for _, _, g in rows]
+        if not all(isinstance(v, int) and -2 ** 31 <= v < 2 ** 31 for v in values):
+            return False
+        columns.append(_native(array("i", values)).tobytes())
+    for name in FLOAT_FIELDS:
+        values = [g.get(name, DEFAULT_GREED) if name == "greed" else g[name] for _, _, g in rows]
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            return False
+        columns.append(_native(array("d", values)).tobytes())
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    temp = f"{out_path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(rows), len(factions), digest))
+        for column in columns:
+            f.write(_LENGTH.pack(len(column)))
+            f.write(column)
+            f.write(b"\0" * (-len(column) % 8))
+    os.replace(temp, out_path)
+    return True
+
+# ========== 读取 ==========
+
+@dataclass
+class Roster:
+    """
+    缓存中读出的武将名单，按列存放，行的顺序与 JSON 中一致：先在野武将，再各势力的君主与武将
+    同一份 Roster 可以反复用来建立世界（每次创建新的武将对象）
+    """
+    factions: List[str] # 势力名，顺序与 JSON 中一致
+    owners: List[int] # 每名武将的势力下标，在野为 -1
+    rulers: List[int] # 每名武将是否君主（0 / 1）
+    names: List[str]
+    columns: Dict[str, list] # 属性名（INT_FIELDS、FLOAT_FIELDS）-> 各武将的值
+
+def _column(view: memoryview, offset: int) -> Tuple[memoryview, int]:
+    """读出 offset 处的一列，返回 (列内容, 下一列的偏移)"""
+    (length,) = _LENGTH.unpack_from(view, offset)
+    start = offset + _LENGTH.size
+    end = start + length
+    if end > len(view):
+        raise ValueError("缓存文件被截断")
+    return view[start:end], end + (-length % 8)
+
+def _decode_strings(column: memoryview, count: int) -> List[str]:
+    offsets = _column_array(column[:4 * (count + 1)], "I").tolist()
+    blob = column[4 * (count + 1):].tobytes()
+    return [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(count)]
+
+def _column_array(column: memoryview, typecode: str):
+    """按列的类型解释内存；小端机器上直接在映射的内存上 cast，不复制"""
+    if sys.byteorder == "little":
+        return column.cast(typecode)
+    values = array(typecode, column.tobytes())
+    values.byteswap()
+    return values
+
+def _decode(view: memoryview, digest: Optional[bytes]) -> Roster:
+    """从映射的内存读出各列（各列的视图都是局部变量，返回后随即释放）"""
+    magic, version, count, faction_count, stored = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version != VERSION or (digest is not None and stored != digest):
+        raise ValueError("缓存文件与剧本不匹配")
+    offset = _HEADER.size
+    column, offset = _column(view, offset)
+    factions = _decode_strings(column, faction_count)
+    column, offset = _column(view, offset)
+    names = _decode_strings(column, count)
+    column, offset = _column(view, offset)
+    owners = _column_array(column, "i").tolist()
+    rulers, offset = _column(view, offset)
+    rulers = rulers.tolist()
+    columns = {}
+    for name, typecode in [(name, "i") for name in INT_FIELDS] + [(name, "d") for name in FLOAT_FIELDS]:
+        column, offset = _column(view, offset)
+        columns[name] = _column_array(column, typecode).tolist()
+    return Roster(factions, owners, rulers, names, columns)
+
+def read_scenario(path: str, digest: Optional[bytes] = None) -> Roster:
+    """mmap 读取缓存文件中的武将名单；digest 不为 None 时校验源文件哈希"""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    roster = _decode(memoryview(mapped), digest) # 出错时映射随异常一起交给垃圾回收
+    mapped.close()
+    return roster
+
+def load_cached(file_path: str, parse):
+    """
+    读取剧本 file_path：缓存命中时 mmap 读取并返回 Roster，否则返回 parse(原始字节) 解析出的剧本字典并编译缓存
+    缓存损坏或无法写入时退回直接解析，不影响游戏启动
+    """
+    with open(file_path, "rb") as f:
+        raw = f.read()
+    digest = source_digest(raw)
+    path = cache_path(file_path, digest)
+    if os.path.exists(path):
+        try:
+            return read_scenario(path, digest)
+        except (OSError, ValueError, struct.error, UnicodeDecodeError):
+            pass # 缓存损坏，重新编译
+    data = parse(raw)
+    try:
+        compile_scenario(data, digest, path)
+    except OSError:
+        pass # 目录只读等情况下不缓存
+    return data
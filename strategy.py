@@ -0,0 +1,128 @@
+"""
+电脑选阵型的混合策略（与界面无关）
+
+一场对战中双方的阵型选择是一个 3×3 的零和博弈：收益取 forecast.payoff_matrix 推演的先攻方胜率，
+先攻方要最大化、应战方要最小化。电脑按纳什均衡的混合策略抽取阵型，玩家无论选什么阵型都占不到便宜。
+
+- solve_zero_sum: 求零和博弈双方的最优混合策略。均衡策略一定落在下列候选点之一：
+  取 s 个行作支撑、s 个列使其收益相等（s = 1 即纯策略），逐一枚举解出候选点，取保底收益最好的一个；
+  只有 3 个阵型时候选点不过几十个，而且不受收益表中大量 0 与 1（阵型相克时胜负几乎确定）造成的退化影响。
+- formation_mix: 按统率与兵力分桶后查表，同一桶内的对阵只解一次博弈；
+- choose_formation: 用给定的随机数源按混合策略抽取阵型（只消耗一个随机数）；
+- formation_advice: 阵型选择界面的各阵型推演，与 formation_mix 查同一张分桶后的收益表，同一对阵只推演一次；
+  对方阵型按电脑实际使用的均衡混合策略计。均衡下己方支撑内的阵型胜率相同，差别只在伤亡。
+"""
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from itertools import combinations
+from typing import List, Mapping, Optional, Sequence, Tuple
+
+from attribute import FORMATIONS, General
+from forecast import FormationAdvice, Payoff, payoff_matrix
+
+LEADERSHIP_BUCKET = 5 # 统率按 5 点分桶
+SOLDIER_BUCKET = 50 # 兵力按 50 人分桶
+EPS = 1e-9
+
+@dataclass(frozen=True)
+class FormationMix:
+    """一场对战双方的均衡混合策略，概率与 FORMATIONS 顺序一致"""
+    first: Tuple[float, ...] # 先攻方
+    second: Tuple[float, ...] # 应战方
+    value: float # 均衡下先攻方的胜率
+
+def _solve(matrix: List[List[float]], rhs: List[float]) -> Optional[List[float]]:
+    """高斯消元解小线性方程组，奇异时返回 None"""
+    n = len(rhs)
+    rows = [list(matrix[i]) + [rhs[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < EPS:
+            return None
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(n):
+            if r != col:
+                factor = rows[r][col] / rows[col][col]
+                for c in range(col, n + 1):
+                    rows[r][c] -= factor * rows[col][c]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+def _maximin(payoff: Sequence[Sequence[float]]) -> Tuple[List[float], float]:
+    """行方最大化 min_j (x·payoff)_j 的混合策略 x 及其保底收益"""
+    n, m = len(payoff), len(payoff[0])
+    best, best_value = None, -float("inf")
+    for size in range(1, min(n, m) + 1):
+        for support in combinations(range(n), size):
+            for columns in combinations(range(m), size):
+                # 支撑内概率之和为 1，所选各列收益两两相等
+                equations = [[1.0] * size]
+                equations += [[payoff[i][columns[k]] - payoff[i][columns[0]] for i in support] for k in range(1, size)]
+                weights = _solve(equations, [1.0] + [0.0] * (size - 1))
+                if weights is None or min(weights) < -EPS:
+                    continue
+                x = [0.0] * n
+                for i, w in zip(support, weights):
+                    x[i] = max(w, 0.0)
+                total = sum(x)
+                x = [w / total for w in x]
+                value = min(sum(x[i] * payoff[i][j] for i in range(n)) for j in range(m))
+                if value > best_value + EPS:
+                    best, best_value = x, value
+    return best, best_value
+
+def solve_zero_sum(payoff: Sequence[Sequence[float]]) -> Tuple[List[float], List[float], float]:
+    """零和博弈（行方收益 payoff[i][j]，行方最大化）的均衡：(行方混合策略, 列方混合策略, 博弈值)"""
+    row, value = _maximin(payoff)
+    negated = [[-payoff[i][j] for i in range(len(payoff))] for j in range(len(payoff[0]))] # 列方视角
+    column, _ = _maximin(negated)
+    return row, column, value
+
+def _bucket(value: int, size: int) -> int:
+    return max(size, round(value / size) * size)
+
+def bucket_of(general: General, soldiers: Optional[int] = None) -> Tuple[int, int]:
+    """武将按 (统率, 兵力) 分桶后的代表值，同一桶内的武将视为同一对手；soldiers 缺省取 general.army"""
+    return _bucket(general.leadership, LEADERSHIP_BUCKET), _bucket(general.army if soldiers is None else soldiers,
+                                                                 SOLDIER_BUCKET)
+
+def payoff_for(first: General, second: General) -> Payoff:
+    """先攻武将 first 与应战武将 second 分桶后的阵型收益表（payoff_matrix 按桶缓存）"""
+    return payoff_matrix(*bucket_of(first), *bucket_of(second))
+
+@lru_cache(maxsize=1024)
+def _bucket_mix(leadership1: int, soldiers1: int, leadership2: int, soldiers2: int) -> FormationMix:
+    cells = payoff_matrix(leadership1, soldiers1, leadership2, soldiers2).cells
+    row, column, value = solve_zero_sum([[f.win_probability for f in line] for line in cells])
+    return FormationMix(tuple(row), tuple(column), value)
+
+def formation_mix(first: General, second: General, soldiers: Optional[Mapping[str, int]] = None) -> FormationMix:
+    """
+    先攻武将 first 与应战武将 second 按当前兵力的均衡混合策略（统率与兵力分桶后缓存）
+    - soldiers: 武将名 -> 兵力，覆盖 general.army（后台推演时兵力记在局部变量中）
+    """
+    soldiers = soldiers or {}
+    return _bucket_mix(*bucket_of(first, soldiers.get(first.name)), *bucket_of(second, soldiers.get(second.name)))
+
+def choose_formation(rng, first: General, second: General, is_first: bool,
+                     soldiers: Optional[Mapping[str, int]] = None) -> str:
+    """电脑在 first 先攻、second 应战的对战中为己方（is_first 为先攻方）抽取阵型；soldiers 同 formation_mix"""
+    mix = formation_mix(first, second, soldiers)
+    weights = mix.first if is_first else mix.second
+    roll = rng.random()
+    for formation, weight in zip(FORMATIONS, weights):
+        roll -= weight
+        if roll < 0:
+            return formation
+    return FORMATIONS[max(range(len(FORMATIONS)), key=lambda i: weights[i])] # 浮点误差兜底
+
+def formation_advice(first: General, second: General, is_first: bool) -> List[FormationAdvice]:
+    """
+    己方（is_first 为先攻方）选用各阵型时的推演，与 FORMATIONS 顺序一致，对方阵型按电脑抽取时的均衡混合策略计：
+    查 formation_mix 所用的分桶收益表，电脑选阵型时已算过则只是查表；期望伤亡按实际兵力与分桶兵力之比折回
+    """
+    mix = formation_mix(first, second)
+    own, enemy = (first, second) if is_first else (second, first)
+    own_scale, enemy_scale = own.army / bucket_of(own)[1], enemy.army / bucket_of(enemy)[1]
+    return [replace(item, expected_loss=item.expected_loss * own_scale,
+                    expected_enemy_loss=item.expected_enemy_loss * enemy_scale)
+            for item in payoff_for(first, second).advice(is_first, mix.second if is_first else mix.first)]
@@ -0,0 +1,106 @@
+"""
+城中驻军的口粮结算（与界面无关）
+
+月度更新时城中武将按列表顺序依次领粮：粮草够吃的武将吃掉与兵力相同的粮草；
+第一个吃不饱的武将缺口为 (兵力 - 剩余粮草)，此后粮草为 0，之后每个有兵的武将缺口都是全部兵力；
+缺口的一半（向下取整）士兵逃亡，只要有人吃不饱，粮仓就被吃空。
+这等价于对兵力做前缀和：前缀和不超过粮草的武将全部吃饱（bisect 找到第一个超出的位置），之后只需看兵力是否为 0。
+
+- ration: 结算一座城池；
+- ration_all: 把所有城池的兵力拼成一条数组，一次算完前缀和再逐城切分；
+  装有 numpy 且武将较多时整条数组向量化计算，结果与纯 Python 路径完全一致；
+- proportional=True 为按比例配给的规则变体：粮草不足时按兵力比例分粮（向下取整），
+  每个武将的缺口 = 兵力 - 分到的粮草，同样逃亡一半，粮仓吃空。
+"""
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from itertools import accumulate, chain
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError: # numpy 为可选依赖，没有时走纯 Python 路径
+    np = None
+
+NUMPY_MIN_GENERALS = 4096 # 武将总数达到该值才走 numpy（数组太小时转换开销大于收益）
+
+@dataclass
+class Ration:
+    """一座城池本月的口粮结算结果"""
+    food: int # 结算时的粮草（已计入本月农业收入）
+    count: int # 结算时城中的武将数
+    food_left: int # 结算后剩余的粮草
+    deserters: List[Tuple[int, int]] = field(default_factory=list) # (武将在城中的下标, 逃兵数)，按下标升序
+
+def ration(armies: Sequence[int], food: int, proportional: bool = False) -> Ration:
+    """按城中武将顺序结算一座城池的口粮，armies 为各武将兵力"""
+    return ration_all([(armies, food)], proportional)[0]
+
+def ration_all(garrisons: Sequence[Tuple[Sequence[int], int]], proportional: bool = False) -> List[Ration]:
+    """结算所有城池的口粮，garrisons 为每座城池的 (各武将兵力, 粮草)"""
+    if np is not None and sum(len(armies) for armies, _ in garrisons) >= NUMPY_MIN_GENERALS:
+        return _ration_all_numpy(garrisons, proportional)
+
+    cumulative = [0, *accumulate(chain.from_iterable(armies for armies, _ in garrisons))] # 全局前缀和
+    rations = []
+    start = 0
+    for armies, food in garrisons:
+        end = start + len(armies)
+        rations.append(_settle(armies, food, cumulative, start, end, proportional))
+        start = end
+    return rations
+
+def _settle(armies: Sequence[int], food: int, cumulative: List[int], start: int, end: int,
+            proportional: bool) -> Ration:
+    """用全局前缀和 cumulative 中 [start, end] 一段结算一座城池"""
+    base = cumulative[start]
+    total = cumulative[end] - base
+    count = len(armies)
+    if total <= food or not armies: # 全部吃饱（最常见的情况）
+        return Ration(food, count, food - total)
+    if proportional:
+        share = max(food, 0)
+        return Ration(food, count, 0, [(i, (army - army * share // total) // 2)
+                                       for i, army in enumerate(armies) if army > 0])
+
+    # 第一个吃不饱的武将：城内前缀和 cumulative[j] - base 首次超过粮草的位置
+    hungry = bisect_right(cumulative, base + food, start + 1, end + 1) - 1
+    first = hungry - start
+    deserters = [(first, (cumulative[hungry + 1] - base - food) // 2)]
+    deserters.extend((i, armies[i] // 2) for i in range(first + 1, count) if armies[i] > 0)
+    return Ration(food, count, 0, deserters)
+
+def _ration_all_numpy(garrisons, proportional) -> List[Ration]:
+    """ration_all 的向量化实现：整条兵力数组一次前缀和，逐城只处理吃不饱的武将"""
+    sizes = np.fromiter((len(armies) for armies, _ in garrisons), dtype=np.int64, count=len(garrisons))
+    foods = np.fromiter((food for _, food in garrisons), dtype=np.int64, count=len(garrisons))
+    armies = np.fromiter(chain.from_iterable(a for a, _ in garrisons), dtype=np.int64, count=int(sizes.sum()))
+
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    cumulative = np.concatenate(([0], np.cumsum(armies)))
+    totals = cumulative[ends] - cumulative[starts]
+    city = np.repeat(np.arange(len(garrisons)), sizes) # 每个武将所在城池的序号
+    food = foods[city]
+
+    if proportional:
+        short = (totals > foods) & (sizes > 0)
+        share = armies * np.maximum(food, 0) // np.maximum(totals[city], 1)
+        lost = (armies - share) // 2
+        hungry = short[city] & (armies > 0)
+    else:
+        before = cumulative[:-1] - cumulative[starts][city] # 城内排在前面的武将总兵力
+        # 排在前面的武将都吃饱时，轮到该武将还剩 food - before；否则粮草已经为 0
+        fed_so_far = (before <= food) | (np.arange(len(armies)) == starts[city])
+        left = np.where(fed_so_far, food - before, 0)
+        hungry = armies > left
+        lost = (armies - left) // 2
+        short = np.bincount(city[hungry], minlength=len(garrisons)) > 0
+
+    food_left = np.where(short, 0, foods - totals)
+    rations = [Ration(f, n, left) for f, n, left in zip(foods.tolist(), sizes.tolist(), food_left.tolist())]
+    indices = np.nonzero(hungry)[0]
+    owners = city[indices]
+    for c, i, n in zip(owners.tolist(), (indices - starts[owners]).tolist(), lost[indices].tolist()):
+        rations[c].deserters.append((i, n))
+    return rations
@@ -0,0 +1,63 @@
+import itertools
+import random
+
+from ai_planner import (best_officer_pair, expected_fight, expected_fights, expected_siege, expected_sieges,
+                        officer_scores, plan_officers)
+from attribute import City, Faction, General
+
+def make_city(name: str, rng: random.Random, faction: Faction, count: int) -> City:
+    city = City(name, 1000, 1000, faction, commerce_progress=rng.choice([0.0, 250.0, 480.0]))
+    faction.add_city(city)
+    for i in range(count):
+        general = General(f"{name}{i}", 50, 50, rng.randint(10, 100), rng.randint(10, 100), 0.5,
+                          _greed=rng.random(), army=100)
+        faction.add_general(general)
+        city.add_general(general)
+    return city
+
+def brute_force(city: City) -> float:
+    """枚举所有 (商业官, 农业官) 组合（含空缺）的最优收益"""
+    comm, agri = officer_scores(city)
+    options = [None, *range(len(city.generals))]
+    return max((comm[c] if c is not None else 0.0) + (agri[a] if a is not None else 0.0)
+               for c, a in itertools.product(options, options) if c is None or c != a)
+
+def test_best_pair_matches_brute_force():
+    rng = random.Random(3)
+    faction = Faction("蜀", General("刘备", 50, 50, 50, 50, 0.5, _greed=0.5))
+    for n in range(12):
+        city = make_city(f"c{n}", rng, faction, n % 5)
+        agri, comm, value, _ = best_officer_pair(city)
+        assert abs(value - brute_force(city)) < 1e-9
+        assert agri is None or agri is not comm
+
+def test_officer_scores_compare_monthly_gain_with_monthly_salary():
+    faction = Faction("蜀", General("刘备", 50, 50, 50, 50, 0.5, _greed=0.5))
+    city = City("成都", 1000, 1000, faction, commerce_progress=0.0, agriculture_progress=480.0)
+    general = General("诸葛亮", 50, 50, 50, 40, 0.5, _greed=0.0, army=100) # 月俸 50
+    city.add_general(general)
+    comm, agri = officer_scores(city)
+    # 商业每月 +10 点，12 个月任期内平均多出 10×6.5 点收入，每点每月 1 金
+    assert abs(comm[0] - (65.0 - 50.0)) < 1e-9
+    # 农业只剩 20 点空间：第 3 个月起封顶，平均 (8+16+20×10)/12 点，每点每月 2.5 金
+    assert abs(agri[0] - (224 / 12 * 2.5 - 50.0)) < 1e-9
+
+def test_plan_officers_takes_each_city_best_pair():
+    rng = random.Random(5)
+    faction = Faction("蜀", General("刘备", 50, 50, 50, 50, 0.5, _greed=0.5))
+    cities = [make_city(f"c{n}", rng, faction, 4) for n in range(6)]
+    expected = {city.name: best_officer_pair(city)[:2] for city in cities}
+    for city, agri, comm in plan_officers(faction):
+        assert (agri, comm) == expected[city.name]
+
+def test_batched_fights_match_one_by_one():
+    rng = random.Random(7) # 数目超过 NUMPY_MIN_FIGHTS，装有 numpy 时走向量化路径
+    fights = [(rng.randint(20, 100), rng.randint(0, 1000), rng.randint(20, 100), rng.randint(0, 1000))
+              for _ in range(200)]
+    assert expected_fights(fights) == [expected_fight(*fight) for fight in fights]
+
+def test_batched_sieges_match_one_by_one():
+    rng = random.Random(8)
+    side = lambda: [(rng.randint(20, 100), rng.choice([0, rng.randint(100, 1000)])) for _ in range(rng.randint(0, 4))]
+    sieges = [(side(), side()) for _ in range(80)]
+    assert expected_sieges(sieges) == [expected_siege(atk, dfd) for atk, dfd in sieges]
@@ -0,0 +1,47 @@
+import pickle
+import random
+
+from attribute import City, Faction, General
+from battle import detached_fighters, simulate_job, simulate_siege
+from pairing import plan_matchups
+
+def make_side(faction_name: str, specs):
+    """specs: [(统率, 兵力)]，第一名武将为主公"""
+    generals = [General(f"{faction_name}{i}", leadership, 50, 50, 50, 0.5, _greed=0.1, army=army)
+                for i, (leadership, army) in enumerate(specs)]
+    faction = Faction(faction_name, generals[0])
+    for general in generals:
+        faction.add_general(general)
+    return generals
+
+def test_siege_sends_the_planned_pairs():
+    attackers = make_side("魏", [(90, 300), (70, 900), (55, 600), (40, 800)])
+    defenders = make_side("吴", [(85, 700), (60, 400), (45, 950)])
+    outcome = simulate_siege(attackers, defenders, random.Random(5))
+    assert outcome.bouts
+
+    # 逐场按推演中的兵力重新规划，每场都应是当时把握最大的一组
+    soldiers = {g.name: g.army for g in attackers + defenders}
+    atk_side, dfd_side = list(attackers), list(defenders)
+    attack = True
+    for bout in outcome.bouts:
+        movers, others = (atk_side, dfd_side) if attack else (dfd_side, atk_side)
+        planned = plan_matchups(movers, others, soldiers)[0]
+        assert (bout.first, bout.second) == (planned.first.name, planned.second.name)
+        soldiers[bout.winner], soldiers[bout.loser] = bout.winner_soldiers, 0
+        side = atk_side if bout.loser_is_attacker else dfd_side
+        side[:] = [g for g in side if g.name != bout.loser]
+        attack = not attack
+
+    # 推演不改动武将本身
+    assert [g.army for g in attackers] == [300, 900, 600, 800]
+
+def test_detached_fighters_give_the_same_outcome():
+    attackers = make_side("魏", [(90, 300), (70, 900), (55, 600)])
+    defenders = make_side("吴", [(85, 700), (60, 400), (45, 950)])
+    city = City("建业", 1000, 1000, defenders[0].faction) # 势力连着城池，副本不应把它们带进子进程
+    defenders[0].faction.add_city(city)
+
+    copies = pickle.loads(pickle.dumps((detached_fighters(attackers), detached_fighters(defenders), 11)))
+    assert copies[1][0].faction.ruler is copies[1][0] and not copies[1][0].faction.cities
+    assert simulate_job(*copies) == simulate_siege(attackers, defenders, random.Random(11))
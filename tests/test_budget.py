@@ -0,0 +1,128 @@
+import copy
+import random
+
+from actions import SetBudgetPolicy
+from attribute import MAX_SOLDIERS, City, Faction, General
+from budget import AGRICULTURE, COMMERCE, POLICIES, CostSheet, FrontierRecruitFirst, RecruitFirst, allocate
+from game import GameEngine
+
+def baseline_update(city: City) -> str:
+    """原先 City.monthly_update 的逐项结算（商业 -> 农业 -> 武将顺序募兵），返回日志"""
+    logs = [f"\n=== {city.name} 城市月度更新 ==="]
+    commerce_level = int(city.commerce_progress // city.progress_per_level)
+    commerce_income = city.base_commerce_income + commerce_level * 100
+    logs.append(f"商业开发 {commerce_level}级 -> 收入 {commerce_income} 金")
+    agriculture_level = int(city.agriculture_progress // city.progress_per_level)
+    food_income = city.base_agriculture_income + agriculture_level * 2500
+    logs.append(f"农业开发 {agriculture_level}级 -> 收入 {food_income} 粮草")
+
+    total_salary = 0
+    for officer in city.generals:
+        if officer.army < MAX_SOLDIERS:
+            total_salary += round(officer.monthly_salary() * ((MAX_SOLDIERS - officer.army) / MAX_SOLDIERS))
+    if city.officer_agriculture is not None:
+        total_salary += city.officer_agriculture.monthly_salary()
+    if city.officer_commerce is not None:
+        total_salary += city.officer_commerce.monthly_salary()
+    logs.append(f"官员总俸禄需求: {total_salary} 金")
+
+    city.food += food_income
+    food_res = city.food
+    for officer in city.generals:
+        if food_res >= officer.army:
+            food_res -= officer.army
+        else:
+            lost_soldiers = int((officer.army - food_res) / 2)
+            food_res = 0
+            officer.army = max(0, officer.army - lost_soldiers)
+            logs.append(f" {city.name} 粮草不足！{officer.name} 军出现士兵逃亡 {lost_soldiers} 人")
+    city.food = food_res
+
+    city.gold += commerce_income
+    gold_before_salary = city.gold
+    if city.officer_commerce and city.gold >= city.officer_commerce.monthly_salary():
+        city.gold -= city.officer_commerce.monthly_salary()
+        inc = city.officer_commerce.intellect / 5.0
+        city.commerce_progress = min(city.commerce_progress + inc, city.max_progress)
+        logs.append(f"商业开发 +{inc:.1f}（总进度 {city.commerce_progress:.1f}/{city.max_progress}）")
+    if city.officer_agriculture and city.gold >= city.officer_agriculture.monthly_salary():
+        city.gold -= city.officer_agriculture.monthly_salary()
+        inc = city.officer_agriculture.politics / 5.0
+        city.agriculture_progress = min(city.agriculture_progress + inc, city.max_progress)
+        logs.append(f"农业开发 +{inc:.1f}（总进度 {city.agriculture_progress:.1f}/{city.max_progress}）")
+    for general in city.generals:
+        if general.army < MAX_SOLDIERS:
+            recruit_salary = general.monthly_salary() / MAX_SOLDIERS
+            num_recruit = min(MAX_SOLDIERS - general.army, int(city.gold // recruit_salary))
+            general.army += num_recruit
+            city.gold = max(0, city.gold - int(num_recruit * recruit_salary))
+    logs.append(f"结算前金 {gold_before_salary} -> 结算后金 {city.gold}")
+    return "\n".join(logs)
+
+def make_general(name: str, army: int, greed: float = 0.2) -> General:
+    return General(name, 60, 60, 70, 80, 0.5, _greed=greed, army=army)
+
+def random_city(rng: random.Random, index: int) -> City:
+    generals = [make_general(f"将{index}_{i}", rng.choice([0, MAX_SOLDIERS, rng.randint(0, MAX_SOLDIERS)]),
+                             rng.random())
+                for i in range(rng.randint(0, 6))]
+    # 金钱从分文没有到足够全部开支，粮草有充足也有短缺
+    city = City(f"城{index}", rng.choice([0, rng.randint(0, 4000)]), rng.choice([0, rng.randint(0, 3000)]), None,
+                generals=generals, commerce_progress=rng.uniform(0, 500), agriculture_progress=rng.uniform(0, 500))
+    if generals and rng.random() < 0.7:
+        city.officer_commerce = rng.choice(generals)
+    if generals and rng.random() < 0.7:
+        city.officer_agriculture = rng.choice(generals)
+    return city
+
+def test_development_first_matches_baseline_spending():
+    rng = random.Random(3)
+    for index in range(300):
+        city = random_city(rng, index)
+        expected = copy.deepcopy(city)
+        expected_log = baseline_update(expected)
+        assert city.monthly_update() == expected_log
+        assert (city.gold, city.food) == (expected.gold, expected.food)
+        assert (city.commerce_progress, city.agriculture_progress) == \
+            (expected.commerce_progress, expected.agriculture_progress)
+        assert [g.army for g in city.generals] == [g.army for g in expected.generals]
+
+def test_recruit_first_pays_recruits_before_officers():
+    generals = [make_general("甲", 400, 0.25), make_general("乙", 900, 0.25)] # 月俸 62.5，每兵 0.0625 金
+    city = City("成都", 0, 100, None, generals=generals, officer_commerce=generals[0])
+    costs = CostSheet.build(generals, city.officer_commerce, None, MAX_SOLDIERS)
+    armies = [g.army for g in generals]
+
+    development = allocate(costs, city.gold, armies)
+    assert development.commerce and development.recruits == [600, 8] # 先付 62.5 开发商业，余钱募兵
+
+    city.budget_policy = RecruitFirst.name
+    order = POLICIES[city.budget_policy].order(city, costs)
+    assert order == [0, 1, COMMERCE, AGRICULTURE]
+    recruit = allocate(costs, city.gold, armies, order)
+    assert not recruit.commerce and recruit.recruits == [600, 100] # 钱先用于补满兵力，商业本月跳过
+    assert recruit.gold == 57
+
+def test_frontier_policy_depends_on_neighbors():
+    shu, wei = Faction("蜀", make_general("刘备", 0)), Faction("魏", make_general("曹操", 0))
+    inner, border, enemy = City("成都", 0, 0, shu), City("汉中", 0, 0, shu), City("长安", 0, 0, wei)
+    inner.neighbors, border.neighbors, enemy.neighbors = [border], [inner, enemy], [border]
+    costs = CostSheet.build([make_general("甲", 0), make_general("乙", 0)], None, None, MAX_SOLDIERS)
+
+    frontier = POLICIES[FrontierRecruitFirst.name]
+    assert frontier.order(border, costs) == POLICIES[RecruitFirst.name].order(border, costs)
+    assert frontier.order(inner, costs) == [COMMERCE, AGRICULTURE, 0, 1]
+
+def test_set_budget_policy_undo():
+    ruler = make_general("刘备", 0)
+    shu = Faction("蜀", ruler)
+    city = City("成都", 0, 0, None)
+    shu.add_city(city)
+    engine = GameEngine(shu, [], [city])
+
+    assert not engine.execute(shu, SetBudgetPolicy("成都", policy="hoard")).ok # 未知策略
+    assert engine.execute(shu, SetBudgetPolicy("成都", policy=RecruitFirst.name)).ok
+    assert city.budget_policy == RecruitFirst.name
+    engine.undo()
+    assert city.budget_policy == "development"
+    assert not engine.can_undo()
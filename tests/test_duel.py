@@ -0,0 +1,51 @@
+import math
+
+import pytest
+
+import duel
+from duel import DIFF_RANGE, MARTIAL_NOISE, trigger_chance, win_chance
+
+def baseline_trigger(diff_martial, diff_intel, charges):
+    """原先 Army.duel 中现算的触发概率（锋矢阵逐个累加 0.15）"""
+    def sigmoid(x):
+        return 1 / (1 + math.exp(-x))
+    formation_bonus = 0.0
+    for _ in range(charges):
+        formation_bonus += 0.15
+    return sigmoid(0.1 * diff_martial - 0.08 * diff_intel + formation_bonus)
+
+def integrated_win(diff_martial, steps: int = 4000):
+    """对发起方的波动做中点积分：P(武力差 + u1 - u2 > 0)，u1、u2 为 [-w, w] 上的均匀分布"""
+    w = MARTIAL_NOISE
+    total = 0.0
+    for k in range(steps):
+        u1 = -w + (k + 0.5) * 2 * w / steps
+        total += min(max((diff_martial + u1 + w) / (2 * w), 0.0), 1.0)
+    return total / steps
+
+@pytest.fixture(autouse=True)
+def fresh_tables(monkeypatch):
+    """每个用例都从空表开始，确保查的是本次建出的表"""
+    monkeypatch.setattr(duel, "_trigger_table", None)
+    monkeypatch.setattr(duel, "_win_table", None)
+
+def test_trigger_table_matches_direct_formula_bit_for_bit():
+    for charges in range(3):
+        for m in range(-DIFF_RANGE, DIFF_RANGE + 1):
+            for i in range(-DIFF_RANGE, DIFF_RANGE + 1):
+                assert trigger_chance(m, i, charges) == baseline_trigger(m, i, charges)
+
+def test_win_table_matches_triangular_distribution():
+    for m in range(-DIFF_RANGE, DIFF_RANGE + 1):
+        assert win_chance(m) == duel._win_probability(m)
+        assert abs(win_chance(m) - integrated_win(m)) < 1e-6
+    assert win_chance(0) == 0.5
+    assert win_chance(-2 * MARTIAL_NOISE) == 0.0 and win_chance(2 * MARTIAL_NOISE) == 1.0
+
+def test_out_of_range_inputs_fall_back_to_direct_computation():
+    for m, i, charges in ((150, 0, 1), (-101, 30, 0), (0, 101, 2), (3.5, -2, 1), (10, 10, 3), (-400, 400, 0)):
+        assert trigger_chance(m, i, charges) == baseline_trigger(m, i, charges)
+    for m in (101, -101, 250, 3.5, -7.25):
+        assert win_chance(m) == duel._win_probability(m)
+        assert abs(win_chance(m) - integrated_win(m)) < 1e-6
+    assert duel._win_table is None # 超出范围的输入不触发建表
@@ -0,0 +1,35 @@
+from attribute import City, Faction, General
+from logistics import RESERVE_MARGIN, nearest_sources, plan_transports
+
+def make_chain(names):
+    """一条道路 names[0] - names[1] - ... 上全属同一势力的城池"""
+    faction = Faction("蜀", General("刘备", 60, 60, 60, 60, 0.5, _greed=0.1))
+    cities = [City(name, 5000, 0, faction) for name in names]
+    for left, right in zip(cities, cities[1:]):
+        left.neighbors.append(right)
+        right.neighbors.append(left)
+    for city in cities:
+        faction.add_city(city)
+    return faction, {city.name: city for city in cities}
+
+def test_nearest_sources_prefers_first_source_on_ties():
+    faction, cities = make_chain("abcde")
+    nearest = nearest_sources(faction, [cities["a"], cities["e"]])
+    assert nearest["b"] == (1, 0)
+    assert nearest["c"] == (2, 0) # 两端同样远，取先列出的来源
+    assert nearest["d"] == (1, 1)
+
+def test_nearest_sources_stays_inside_own_territory():
+    faction, cities = make_chain("abc")
+    cities["b"].owner = Faction("魏", General("曹操", 60, 60, 60, 60, 0.5, _greed=0.1))
+    assert "c" not in nearest_sources(faction, [cities["a"]])
+
+def test_transports_move_to_next_donor_once_one_runs_dry():
+    faction, cities = make_chain("abcd")
+    for name in "ab": # 两座空城各驻一千兵，口粮短缺
+        cities[name].food = 0
+        cities[name].add_general(General(f"守将{name}", 60, 60, 60, 60, 0.5, _greed=0.1, army=1000))
+    cities["c"].food = RESERVE_MARGIN + 100
+    cities["d"].food = 5000
+    shipments = plan_transports(faction, 10, resources=("food",))
+    assert [(s.origin.name, s.dest.name, s.distance) for s in shipments] == [("c", "a", 2), ("d", "b", 2)]
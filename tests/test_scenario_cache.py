@@ -0,0 +1,34 @@
+import os
+import random
+import shutil
+
+from scenario import build_world, load_generals_from_json
+from scenario_cache import Roster
+
+SCENARIO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "generals.json")
+
+def layout(data):
+    random.seed(7)
+    scenario = build_world(data, "蜀")
+    return [(c.name, c.owner.name if c.owner else None,
+             [(g.name, g.army, g.leadership, g.loyalty, g._greed, g.faction.name if g.faction else None)
+              for g in c.generals],
+             [g.name for g in c.wild_generals]) for c in scenario.world]
+
+def test_cached_roster_builds_the_same_world(tmp_path):
+    path = str(tmp_path / "generals.json")
+    shutil.copy(SCENARIO, path)
+    parsed = load_generals_from_json(path) # 未命中：解析 JSON 并编译缓存
+    cached = load_generals_from_json(path)
+    assert isinstance(parsed, dict)
+    assert isinstance(cached, Roster)
+    assert layout(cached) == layout(parsed)
+    assert layout(cached) == layout(cached) # 同一份 Roster 可反复建立世界
+
+def test_changed_scenario_is_parsed_again(tmp_path):
+    path = str(tmp_path / "generals.json")
+    shutil.copy(SCENARIO, path)
+    load_generals_from_json(path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert isinstance(load_generals_from_json(path), dict)
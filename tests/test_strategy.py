@@ -0,0 +1,24 @@
+from attribute import General
+from strategy import formation_advice, formation_mix, payoff_for
+
+def make_general(name: str, leadership: int, army: int) -> General:
+    return General(name, leadership, 60, 60, 60, 0.5, _greed=0.1, army=army)
+
+def test_advice_against_equilibrium_is_indifferent_on_support():
+    first, second = make_general("关羽", 60, 800), make_general("张辽", 62, 820)
+    mix = formation_mix(first, second)
+    for is_first, own_mix, value in ((True, mix.first, mix.value), (False, mix.second, 1 - mix.value)):
+        advice = formation_advice(first, second, is_first)
+        for item, weight in zip(advice, own_mix):
+            if weight > 1e-6: # 均衡支撑内的阵型对均衡对手的胜率都等于博弈值
+                assert abs(item.win_probability - value) < 1e-6
+            assert item.win_probability <= value + 1e-6 # 任何阵型都占不到便宜
+
+def test_advice_defaults_to_uniform_opponent():
+    first, second = make_general("关羽", 70, 1230), make_general("张辽", 66, 1010)
+    payoff = payoff_for(first, second)
+    uniform = payoff.advice(True)
+    explicit = payoff.advice(True, [1 / 3] * 3)
+    for a, b in zip(uniform, explicit):
+        assert abs(a.win_probability - b.win_probability) < 1e-12
+        assert abs(a.expected_loss - b.expected_loss) < 1e-9
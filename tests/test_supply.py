@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+import supply
+from supply import ration, ration_all
+
+def baseline_ration(armies, food):
+    """原先 monthly_update 中逐个武将领粮的循环：返回 (剩余粮草, [(下标, 逃兵数)])"""
+    food_res = food
+    deserters = []
+    for i, army in enumerate(armies):
+        if food_res >= army: # 粮草够吃
+            food_res -= army
+        else: # 粮草不够吃
+            shortage = army - food_res
+            deserters.append((i, int(shortage / 2)))
+            food_res = 0
+    return food_res, deserters
+
+def random_garrisons(rng: random.Random, count: int):
+    garrisons = []
+    for _ in range(count):
+        armies = [rng.choice([0, 1, rng.randint(1, 1000)]) for _ in range(rng.randint(0, 8))]
+        total = sum(armies)
+        # 粮草充足、恰好够吃、短缺与颗粒无存各占一部分
+        food = rng.choice([total + rng.randint(0, 500), total, rng.randint(0, max(total - 1, 0)), 0])
+        garrisons.append((armies, food))
+    return garrisons
+
+@pytest.fixture(params=["python", "numpy"])
+def path(request, monkeypatch):
+    """分别走纯 Python 路径（模拟未安装 numpy）与 numpy 路径（未安装时跳过）"""
+    if request.param == "python":
+        monkeypatch.setattr(supply, "np", None)
+    else:
+        if supply.np is None:
+            pytest.skip("numpy 未安装")
+        monkeypatch.setattr(supply, "NUMPY_MIN_GENERALS", 0)
+    return request.param
+
+def test_ration_matches_baseline_loop(path):
+    rng = random.Random(1)
+    garrisons = random_garrisons(rng, 400)
+    for (armies, food), result in zip(garrisons, ration_all(garrisons)):
+        food_left, deserters = baseline_ration(armies, food)
+        assert (result.food, result.count) == (food, len(armies))
+        assert result.food_left == food_left
+        assert result.deserters == deserters
+
+def test_single_city_shortage_and_zero_food(path):
+    assert ration([300, 0, 500, 200], 600).deserters == [(2, 100), (3, 100)]
+    assert ration([300, 0, 500, 200], 600).food_left == 0
+    assert ration([0, 7, 0], 0).deserters == [(1, 3)]
+    assert ration([], 50).food_left == 50
+    assert ration([100, 200], 300).deserters == []
+
+def test_proportional_paths_agree(monkeypatch):
+    if supply.np is None:
+        pytest.skip("numpy 未安装")
+    garrisons = random_garrisons(random.Random(2), 400)
+    monkeypatch.setattr(supply, "NUMPY_MIN_GENERALS", 0)
+    vectorized = ration_all(garrisons, proportional=True)
+    monkeypatch.setattr(supply, "np", None)
+    assert vectorized == ration_all(garrisons, proportional=True)
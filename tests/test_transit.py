@@ -0,0 +1,71 @@
+from attribute import City, Faction, General
+from transit import TransitQueue
+
+def make_general(name: str) -> General:
+    return General(name, 60, 60, 60, 60, 0.5, _greed=0.1, army=500)
+
+def make_world():
+    """两方势力：shu 占 a、b 两城，wei 占 c；道路 a - b - c"""
+    shu = Faction("蜀", make_general("刘备"))
+    wei = Faction("魏", make_general("曹操"))
+    a = City("a", 1000, 1000, shu)
+    b = City("b", 1000, 1000, shu)
+    c = City("c", 1000, 1000, wei)
+    a.neighbors, b.neighbors, c.neighbors = [b], [a, c], [b]
+    shu.add_city(a)
+    shu.add_city(b)
+    wei.add_city(c)
+    return shu, wei, {city.name: city for city in (a, b, c)}
+
+def test_generals_arrive_at_friendly_city():
+    shu, _, cities = make_world()
+    general = make_general("关羽")
+    shu.add_general(general)
+    cities["a"].add_general(general)
+
+    queue = TransitQueue()
+    queue.send_generals(shu, cities["a"], cities["b"], [general], hops=1, turn=1)
+    assert general not in cities["a"].generals
+
+    queue.deliver(2, cities)
+    assert general in cities["b"].generals
+    assert general.faction is shu
+    assert len(queue) == 0
+
+def test_generals_reroute_when_destination_falls():
+    shu, wei, cities = make_world()
+    general = make_general("关羽")
+    shu.add_general(general)
+    cities["a"].add_general(general)
+
+    queue = TransitQueue()
+    queue.send_generals(shu, cities["a"], cities["b"], [general], hops=1, turn=1)
+    shu.remove_city(cities["b"])
+    wei.add_city(cities["b"])
+
+    logs = queue.deliver(2, cities)
+    assert "改道前往a" in logs[0][1]
+    assert len(queue) == 1 # 改道后重新入队
+    queue.deliver(10, cities)
+    assert general in cities["a"].generals
+    assert general.faction is shu
+
+def test_generals_disperse_and_leave_faction_when_no_city_remains():
+    shu, wei, cities = make_world()
+    general = make_general("关羽")
+    shu.add_general(general)
+    cities["a"].add_general(general)
+
+    queue = TransitQueue()
+    queue.send_generals(shu, cities["a"], cities["b"], [general], hops=1, turn=1)
+    for name in ("a", "b"): # 行军途中蜀失去全部城池
+        shu.remove_city(cities[name])
+        wei.add_city(cities[name])
+
+    logs = queue.deliver(2, cities)
+    assert "无处可归" in logs[0][1]
+    assert general in cities["b"].wild_generals
+    assert general not in cities["b"].generals
+    assert general not in shu.generals
+    assert general.faction is None
+    assert len(queue) == 0
@@ -0,0 +1,82 @@
+import copy
+
+import pytest
+
+from attribute import City, Faction, General
+from budget import RecruitFirst
+from world_store import WorldStore
+
+def make_general(name: str, army: int = 0) -> General:
+    return General(name, 70, 60, 50, 40, 0.6, _greed=0.2, army=army)
+
+def make_world():
+    """蜀占 b、a 两城（名单顺序与城池顺序相反），魏占 c；道路 a - b - c"""
+    shu = Faction("蜀", make_general("刘备", 900))
+    wei = Faction("魏", make_general("曹操", 900))
+    a, b, c = City("a", 1000, 500.5, None), City("b", 2000, 600, None), City("c", 3000, 700, None)
+    a.neighbors, b.neighbors, c.neighbors = [b], [a, c], [b]
+    for faction, city in ((shu, b), (shu, a), (wei, c)):
+        faction.add_city(city)
+    for faction in (shu, wei):
+        faction.add_general(faction.ruler)
+    zhang, guan = make_general("张飞", 800), make_general("关羽", 700)
+    for general in (zhang, guan):
+        shu.add_general(general)
+    for general in (zhang, shu.ruler, guan): # 驻守名单不按名字排序
+        a.add_general(general)
+    c.add_general(wei.ruler)
+    a.officer_commerce, a.officer_agriculture = guan, zhang
+    a.budget_policy = RecruitFirst.name
+    c.prisoners.append((make_general("吕布"), 3))
+    b.wild_generals.append(make_general("赵云"))
+    return [a, b, c], [shu, wei]
+
+def test_thaw_rebuilds_an_independent_world(tmp_path):
+    cities, factions = make_world()
+    with WorldStore.create(str(tmp_path / "world.bin"), cities, factions, turn=5) as store:
+        a, b, c = store.thaw()
+
+    assert [g.name for g in a.generals] == ["张飞", "刘备", "关羽"]
+    assert (a.officer_commerce.name, a.officer_agriculture.name) == ("关羽", "张飞")
+    assert a.officer_commerce is a.generals[2]
+    assert a.budget_policy == RecruitFirst.name
+    assert (a.food, a.gold) == (1000, 500.5)
+    assert [(g.name, turns) for g, turns in c.prisoners] == [("吕布", 3)]
+    assert [g.name for g in b.wild_generals] == ["赵云"]
+
+    shu = a.owner
+    assert shu is b.owner and shu is not cities[0].owner
+    assert [city.name for city in shu.cities] == ["b", "a"]
+    assert shu.ruler is a.generals[1] and shu.ruler.faction is shu
+    assert a.neighbors == [b] and b.neighbors[1] is c
+    assert a.generals[0].monthly_salary() == cities[0].generals[0].monthly_salary()
+    assert c.prisoners[0][0].faction is None
+
+def test_bound_world_reads_and_writes_the_store(tmp_path):
+    cities, factions = make_world()
+    a, b, c = cities
+    shu, wei = factions
+    zhang = a.generals[0]
+    store = WorldStore.create(str(tmp_path / "world.bin"), cities, factions)
+    store.bind(cities, factions)
+    view = WorldStore.open(str(tmp_path / "world.bin")) # 另一个只读映射看到的是同一份数据
+
+    a.food -= 300
+    zhang.army = 650
+    wei.add_city(b) # 归属与武将的势力写入的是下标，读出的仍是原来的势力对象
+    assert (view.city("a").food, view.general("张飞").army, view.city("b").owner) == (700, 650, "魏")
+    assert b.owner is wei and "food" not in a.__dict__
+
+    a.remove_general(zhang)
+    c.add_general(zhang)
+    assert view.general("张飞").location.name == "c"
+    with pytest.raises(ValueError):
+        zhang.faction = Faction("魏", make_general("曹丕")) # 同名但未绑定的势力
+
+    clone = copy.copy(zhang) # 副本不再绑定，修改不影响存储
+    clone.army = 1
+    assert clone.faction is shu and view.general("张飞").army == 650
+
+    store.close()
+    assert (a.food, zhang.army, b.owner) == (700, 650, wei) and "food" in a.__dict__
+    view.close()
@@ -0,0 +1,130 @@
+"""
+在途队列：钱粮运输与武将行军不再瞬间到达
+
+- 出发时立即从起点城扣除钱粮/移走武将，按 logistics.travel_turns 计算到达回合后放入最小堆
+- 每回合结束只弹出本回合到达的条目，与在途总数无关
+- 到达时若目的城已不属于本势力，就近改道到本势力最近的城池（按全图跳数），再按路程重新入队；
+  势力已没有城池时，钱粮散失，武将脱离势力、就地成为在野武将
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import heapq
+
+from attribute import City, Faction, General
+from logistics import travel_turns
+
+@dataclass
+class Movement:
+    """
+    一支在途队伍
+    - kind: food / gold（运输） 或 generals（行军）
+    - amount: 运输的数量；generals: 行军的武将
+    """
+    kind: str
+    faction: Faction
+    origin: str # 城名
+    dest: str # 城名
+    arrival_turn: int
+    amount: int = 0
+    generals: List[General] = field(default_factory=list)
+
+    def describe(self) -> str:
+        if self.kind == "generals":
+            return f"{'、'.join(g.name for g in self.generals)}的部队"
+        unit = "粮草" if self.kind == "food" else "金钱"
+        return f"{self.amount}{unit}的运输队"
+
+def nearest_city_of(faction: Faction, start: City) -> Tuple[Optional[City], int]:
+    """从 start 出发沿全图道路搜索，找到离它最近的 faction 的城池及跳数"""
+    seen = {start.name}
+    queue = deque([(start, 0)])
+    while queue:
+        city, hops = queue.popleft()
+        if city.owner is faction:
+            return city, hops
+        for nb in city.neighbors:
+            if nb.name not in seen:
+                seen.add(nb.name)
+                queue.append((nb, hops + 1))
+    return None, 0
+
+@dataclass
+class TransitQueue:
+    """按到达回合排序的在途队列（最小堆），同一回合内按出发顺序到达"""
+    _heap: List[Tuple[int, int, Movement]] = field(default_factory=list)
+    _seq: int = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, movement: Movement):
+        heapq.heappush(self._heap, (movement.arrival_turn, self._seq, movement))
+        self._seq += 1
+
+    def in_transit(self, faction: Faction) -> List[Movement]:
+        """某势力所有在途队伍（界面展示用，会遍历整个队列）"""
+        return [m for _, _, m in self._heap if m.faction is faction]
+
+    def recall(self, movements: List[Movement]):
+        """撤回尚在途中的队伍（不退还钱粮/武将，由调用方处理）"""
+        ids = {id(m) for m in movements}
+        self._heap = [entry for entry in self._heap if id(entry[2]) not in ids]
+        heapq.heapify(self._heap)
+
+    # ==== 出发 ====
+    def send_resources(self, faction: Faction, origin: City, dest: City, food: int, gold: int,
+                       hops: int, turn: int) -> List[Movement]:
+        """从 origin 扣除钱粮并派出运输队，返回派出的队伍（钱、粮各一支）"""
+        arrival = turn + max(1, travel_turns(hops))
+        origin.change_resources(food=-food, gold=-gold)
+        sent = []
+        if food > 0:
+            sent.append(Movement("food", faction, origin.name, dest.name, arrival, amount=food))
+        if gold > 0:
+            sent.append(Movement("gold", faction, origin.name, dest.name, arrival, amount=gold))
+        for m in sent:
+            self.push(m)
+        return sent
+
+    def send_generals(self, faction: Faction, origin: City, dest: City, generals: List[General],
+                      hops: int, turn: int) -> List[Movement]:
+        """将武将从 origin 移出并派出行军，返回派出的队伍"""
+        arrival = turn + max(1, travel_turns(hops))
+        for g in generals:
+            origin.remove_general(g)
+        movement = Movement("generals", faction, origin.name, dest.name, arrival, generals=list(generals))
+        self.push(movement)
+        return [movement]
+
+    # ==== 到达 ====
+    def deliver(self, turn: int, cities_by_name: Dict[str, City]) -> List[Tuple[Faction, str]]:
+        """弹出并处理 arrival_turn <= turn 的全部队伍，返回 (势力, 日志) 列表"""
+        logs: List[Tuple[Faction, str]] = []
+        while self._heap and self._heap[0][0] <= turn:
+            _, _, m = heapq.heappop(self._heap)
+            dest = cities_by_name[m.dest]
+
+            if dest.owner is not m.faction: # 目的城已易主，改道
+                fallback, hops = nearest_city_of(m.faction, dest)
+                if fallback is None:
+                    if m.kind == "generals":
+                        for g in m.generals: # 离开势力成为在野武将
+                            m.faction.remove_general(g)
+                            g.faction = None
+                            dest.wild_generals.append(g)
+                    logs.append((m.faction, f"{m.describe()}无处可归，在{dest.name}一带散去"))
+                    continue
+                logs.append((m.faction, f"{dest.name}已失守，{m.describe()}改道前往{fallback.name}"))
+                m.dest = fallback.name
+                m.arrival_turn = turn + max(1, travel_turns(hops))
+                self.push(m)
+                continue
+
+            if m.kind == "generals":
+                for g in m.generals:
+                    dest.add_general(g)
+            else:
+                dest.change_resources(**{m.kind: m.amount})
+            logs.append((m.faction, f"{m.describe()}抵达{dest.name}"))
+        return logs
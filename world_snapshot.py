@@ -0,0 +1,99 @@
+"""
+并行 AI 进程共享的世界快照（与界面无关）
+
+把 Faction / City / General 对象图交给 multiprocessing 的子进程需要整个序列化，
+势力与城池、城池与相邻城池之间还互相引用，世界越大每回合分发的开销越大。
+这里改为每回合一次把世界写成 world_store 的扁平布局放进共享内存，子进程只拿到共享内存的名字：
+
+    exporter = SnapshotExporter()
+    name = exporter.export(engine.world_cities, factions, engine.current_turn)   # 主进程，每回合一次
+    pool.map(task, [(name, ...) for ...])
+    ...
+    def task(args):                                                              # 子进程
+        store = attach(args[0])
+        store.city("荆州").generals         # 直接读列
+        world = store.thaw()                # 或重建一份私有的对象图
+
+GameEngine 配置了规划进程池时每回合这样分发电脑势力的规划（见 ai_planner.plan_faction_shared）。
+
+- 名单与道路不变时每回合复用同一块共享内存，名字不变，只重写数值列；
+- 子进程按名字缓存映射，同一块共享内存在整局中只映射一次，此后分发任务的开销与世界大小无关；
+  映射新的共享内存时释放旧的（主进程同一时间只保留一块）；
+- 快照在子进程中只读；主进程须等本回合的任务全部结束后再导出下一回合；
+- 共享内存只由主进程删除：子进程映射后立即从 resource_tracker 注销，避免子进程退出时把它删掉。
+"""
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Optional, Sequence
+import atexit
+import os
+
+from attribute import City, Faction
+from world_store import WorldPlan, WorldStore, format_buffer
+
+_TRACKED = os.name == "posix" # 只有 POSIX 上的共享内存登记在 resource_tracker 中
+
+class SnapshotExporter:
+    """主进程一侧：持有共享内存并每回合写入世界状态"""
+
+    def __init__(self):
+        self._memory: Optional[shared_memory.SharedMemory] = None
+        self._store: Optional[WorldStore] = None
+        self._plan: Optional[WorldPlan] = None
+
+    @property
+    def name(self) -> Optional[str]:
+        """当前共享内存的名字，尚未导出时为 None"""
+        return None if self._memory is None else self._memory.name
+
+    def export(self, cities: Sequence[City], factions: Sequence[Faction], turn: int) -> str:
+        """写入当前世界并返回共享内存的名字；名单或道路变了才换一块新的共享内存"""
+        plan = WorldPlan.of(cities, factions)
+        if plan != self._plan:
+            self.close()
+            self._memory = shared_memory.SharedMemory(create=True, size=plan.size)
+            format_buffer(self._memory.buf, plan, turn)
+            self._store = WorldStore.over(self._memory.buf, writable=True)
+            self._plan = plan
+        self._store.capture(cities, factions, turn)
+        return self._memory.name
+
+    def close(self):
+        """释放并删除共享内存（已映射的子进程仍可读到旧数据，直到它们 detach）"""
+        if self._store is not None:
+            self._store.close()
+        if self._memory is not None:
+            # 与子进程共用 resource_tracker 时，子进程的注销也撤掉了这里的登记；先补登，unlink 的注销才能配对
+            if _TRACKED:
+                resource_tracker.register(self._memory._name, "shared_memory")
+            self._memory.close()
+            self._memory.unlink()
+        self._memory = self._store = self._plan = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_attached: Dict[str, WorldStore] = {} # 子进程中已映射的快照，共享内存名 -> 只读存储
+
+def attach(name: str) -> WorldStore:
+    """子进程一侧：按名字取只读的快照，首次调用时映射共享内存，之后直接返回缓存"""
+    store = _attached.get(name)
+    if store is None:
+        detach() # 主进程已换了一块新的共享内存，旧的不会再用到
+        memory = shared_memory.SharedMemory(name=name)
+        # 共享内存归主进程所有：子进程若有自己的 resource_tracker，退出时会删除登记过的共享内存
+        if _TRACKED:
+            resource_tracker.unregister(memory._name, "shared_memory")
+        store = _attached[name] = WorldStore.over(memory.buf, memory)
+    return store
+
+def detach(name: Optional[str] = None):
+    """解除子进程中对快照 name（缺省为全部）的映射"""
+    for key in ([name] if name is not None else list(_attached)):
+        store = _attached.pop(key, None)
+        if store is not None:
+            store.close()
+
+atexit.register(detach) # 子进程退出前先解除映射，否则共享内存对象回收时视图仍在，关闭失败
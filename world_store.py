@@ -0,0 +1,520 @@
+"""
+世界状态的内存映射存储（与界面无关）
+
+把世界按列放在一块映射内存（文件或共享内存）里：
+- 城池：粮草、金钱、商业进度、农业进度、所属势力下标，以及官员、预算策略；
+- 武将：兵力、驻守城池下标、所属势力下标，统率、武力、智力、政治、忠义、贪婪，以及被俘、在野的城池；
+- 势力：君主；
+- 城池之间的道路（按城池下标的邻接表）。
+有两种用法：
+- 绑定（bind）：无界面的大规模模拟（policy_bench --store）把世界绑定到映射文件上，此后 City 的粮草、金钱、
+  商业与农业进度、归属，General 的兵力、所属势力，以及武将的驻守城池都只存在映射数组里，
+  引擎读写这些属性就是读写文件（见 attribute.Stored），检查点由操作系统的页缓存落盘，flush 即可；
+  分析进程用 WorldStore.open 只读映射同一个文件，通过 CityView / GeneralView 按名字或下标读取，不复制数据。
+  名单的结构（驻守、在野与俘虏的顺序、势力的城池顺序、官员、预算策略）仍留在对象上，由每回合的 capture 写入；
+- 快照（capture + thaw）：同样的布局放在共享内存里交给并行规划（见 world_snapshot），子进程用 thaw 重建私有的对象图。
+绑定后这些属性的每次访问都多一次下标换算与类型转换；金钱一列为 f64，读出总是 float。
+对象复制、序列化时得到的是未绑定的副本（数值从存储中取出）；close 时解除绑定，数值取回对象上。
+装有 numpy 时各列是 numpy.memmap 上的数组（可直接做向量化统计），没有时退回 mmap + memoryview，接口相同。
+在途的运输队与行军不在存储之中。
+
+文件布局（本机字节序，各列按 8 字节对齐）：
+    头部   MAGIC(8) 版本(u32) 城池数(u32) 武将数(u32) 势力数(u32) 道路数(u32) 名字表字节数(u32) 回合(i64)
+    城池列 粮草 i64、金钱 f64、商业进度 f64、农业进度 f64、所属势力 i64（无主为 -1）、在势力城池名单中的位置 i64、
+           商业官 i64、农业官 i64（武将下标，空缺为 -1）、预算策略 i64（budget.POLICIES 中的序号）
+    道路   各城邻接表的起点 i64 × (城池数 + 1)、相邻城池下标 i64 × 道路数
+    武将列 兵力 i64、驻守城池 i64（在野、被俘、行军中为 -1）、所属势力 i64（无势力为 -1）、统率、武力、智力、政治 i64、
+           在所在名单（驻守、在野或俘虏）中的位置 i64、关押城池 i64、已关押回合 i64、在野城池 i64（不适用时为 -1）、
+           忠义 f64、贪婪 f64
+    势力列 君主 i64（武将下标）
+    名字表 偏移表 u32 × (势力数 + 城池数 + 武将数 + 1) + UTF-8 字节串，依次为势力、城池、武将
+"""
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+import mmap
+import operator
+import struct
+
+from attribute import City, Faction, General
+from budget import DEFAULT_POLICY, POLICIES
+
+try:
+    import numpy as np
+except ImportError: # numpy 为可选依赖，没有时用 mmap + memoryview
+    np = None
+
+MAGIC = b"RTKWLD\x00\x01"
+VERSION = 3
+
+CITY_COLUMNS = (("food", "q"), ("gold", "d"), ("commerce_progress", "d"), ("agriculture_progress", "d"), ("owner", "q"),
+                ("owner_slot", "q"), ("officer_commerce", "q"), ("officer_agriculture", "q"), ("budget_policy", "q"))
+GENERAL_COLUMNS = (("army", "q"), ("location", "q"), ("faction", "q"),
+                   ("leadership", "q"), ("martial", "q"), ("intellect", "q"), ("politics", "q"),
+                   ("slot", "q"), ("held", "q"), ("held_turns", "q"), ("wild", "q"), ("loyalty", "d"), ("greed", "d"))
+FACTION_COLUMNS = (("ruler", "q"),)
+FACTION_REFERENCES = ("owner", "general_faction") # 存放势力下标、绑定后读写为 Faction 对象的列
+POLICY_NAMES = tuple(POLICIES)
+
+STAT_FIELDS = ("leadership", "martial", "intellect", "politics")
+
+_HEADER = struct.Struct("=8sIIIIIIq")
+_TURN_OFFSET = _HEADER.size - 8
+
+def _align(size: int) -> int:
+    return size + (-size % 8)
+
+# ========== 布局 ==========
+
+def roster(cities: Sequence[City], factions: Sequence[Faction]) -> List[General]:
+    """世界中的全部武将（按名字去重）：先各势力的君主与武将，再各城的驻守、在野与被俘武将"""
+    generals: Dict[str, General] = {}
+    for faction in factions:
+        for general in [faction.ruler, *faction.generals]:
+            generals.setdefault(general.name, general)
+    for city in cities:
+        for general in [*city.generals, *city.wild_generals, *(g for g, _ in city.prisoners)]:
+            generals.setdefault(general.name, general)
+    return list(generals.values())
+
+@dataclass(frozen=True)
+class WorldPlan:
+    """
+    存储的骨架：各名字表与城池道路，决定了布局与所需字节数；名单不变时可以反复写入同一块内存
+    武将按名字排序，武将改投势力、下野等只改变数值，不改变骨架
+    """
+    faction_names: Tuple[str, ...]
+    city_names: Tuple[str, ...]
+    general_names: Tuple[str, ...]
+    neighbors: Tuple[Tuple[int, ...], ...] # 每座城池相邻城池的下标
+
+    @classmethod
+    def of(cls, cities: Sequence[City], factions: Sequence[Faction]) -> "WorldPlan":
+        index = {c.name: i for i, c in enumerate(cities)}
+        return cls(tuple(f.name for f in factions), tuple(c.name for c in cities),
+                   tuple(sorted(g.name for g in roster(cities, factions))),
+                   tuple(tuple(index[nb.name] for nb in c.neighbors) for c in cities))
+
+    @property
+    def names(self) -> bytes:
+        """名字表：偏移表 + UTF-8 字节串"""
+        encoded = [name.encode("utf-8") for name in (*self.faction_names, *self.city_names, *self.general_names)]
+        offsets = array("I", [0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        return offsets.tobytes() + b"".join(encoded)
+
+    @property
+    def size(self) -> int:
+        """按布局存放世界所需的字节数"""
+        edges = sum(len(n) for n in self.neighbors)
+        counts = len(self.city_names), len(self.general_names), len(self.faction_names), edges
+        return _columns_layout(*counts)[1] + _align(len(self.names))
+
+def _columns_layout(city_count: int, general_count: int, faction_count: int,
+                    edge_count: int) -> Tuple[Dict[str, Tuple[int, str, int]], int]:
+    """各列的 (偏移, 类型, 长度) 以及名字表的偏移"""
+    layout = {}
+    offset = _HEADER.size
+    columns = [(name, typecode, city_count) for name, typecode in CITY_COLUMNS]
+    columns += [("neighbor_start", "q", city_count + 1), ("neighbors", "q", edge_count)]
+    columns += [(f"general_{name}", typecode, general_count) for name, typecode in GENERAL_COLUMNS]
+    columns += [(f"faction_{name}", typecode, faction_count) for name, typecode in FACTION_COLUMNS]
+    for name, typecode, count in columns:
+        layout[name] = (offset, typecode, count)
+        offset += _align(8 * count)
+    return layout, offset
+
+def format_buffer(buffer, plan: WorldPlan, turn: int = 0):
+    """在 buffer（可写，长度至少为 plan.size）中写入头部、名字表与道路，其余各列清零"""
+    names = plan.names
+    edges = [i for nbs in plan.neighbors for i in nbs]
+    layout, names_offset = _columns_layout(len(plan.city_names), len(plan.general_names), len(plan.faction_names),
+                                           len(edges))
+    view = memoryview(buffer).cast("B")
+    view[_HEADER.size:names_offset] = bytes(names_offset - _HEADER.size)
+    view[names_offset:names_offset + len(names)] = names
+    starts = array("q", [0])
+    for nbs in plan.neighbors:
+        starts.append(starts[-1] + len(nbs))
+    for name, values in (("neighbor_start", starts), ("neighbors", array("q", edges))):
+        offset = layout[name][0]
+        view[offset:offset + 8 * len(values)] = values.tobytes()
+    _HEADER.pack_into(view, 0, MAGIC, VERSION, len(plan.city_names), len(plan.general_names),
+                      len(plan.faction_names), len(edges), len(names), turn)
+
+def _map(path: str, writable: bool):
+    """映射文件，返回 (整块内存, 映射对象)"""
+    if np is not None:
+        raw = np.memmap(path, dtype=np.uint8, mode="r+" if writable else "r")
+        return raw, raw
+    with open(path, "r+b" if writable else "rb") as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+    return memoryview(mapping), mapping
+
+# ========== 存储 ==========
+
+class WorldStore:
+    """
+    映射在一块内存（文件或共享内存）上的世界状态
+    - create / open: 新建或打开映射文件
+    - bind: 让 City / General 的数值属性直接读写本存储
+    - capture: 把当前的 City / General 对象整列写入（每回合一次）
+    - thaw: 按存储重建一份独立的对象图
+    - city / general: 按名字或下标取只读或可写的视图
+    """
+
+    def __init__(self, raw, mapping=None, writable: bool = False):
+        """raw 为整块内存（numpy uint8 数组或 memoryview），mapping 为需要 flush / close 的映射对象"""
+        self._raw = raw
+        self._bytes = memoryview(raw).cast("B")
+        self._mapping = mapping
+        self.writable = writable
+        magic, version, city_count, general_count, faction_count, edge_count, names_size, _ = \
+            _HEADER.unpack_from(self._bytes, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("不是世界存储文件，或文件来自字节序不同的机器")
+        self._layout, names_offset = _columns_layout(city_count, general_count, faction_count, edge_count)
+        self.columns = {name: self._typed(offset, typecode, count) for name, (offset, typecode, count) in self._layout.items()}
+
+        names = bytes(self._bytes[names_offset:names_offset + names_size])
+        total = faction_count + city_count + general_count
+        offsets = array("I", names[:4 * (total + 1)])
+        blob = names[4 * (total + 1):]
+        decoded = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(total)]
+        self.faction_names = decoded[:faction_count]
+        self.city_names = decoded[faction_count:faction_count + city_count]
+        self.general_names = decoded[faction_count + city_count:]
+        self._faction_index = {name: i for i, name in enumerate(self.faction_names)}
+        self._city_index = {name: i for i, name in enumerate(self.city_names)}
+        self._general_index = {name: i for i, name in enumerate(self.general_names)}
+        self._factions: List[Optional[Faction]] = [None] * faction_count # 绑定的势力对象，按势力下标
+        self._bound: List[object] = [] # 绑定在本存储上的城池与武将
+        self._writers = {name: operator.index if typecode == "q" else float
+                         for name, (_, typecode, _) in self._layout.items()}
+
+    def _typed(self, offset: int, typecode: str, count: int):
+        if np is not None:
+            return self._raw[offset:offset + 8 * count].view(np.int64 if typecode == "q" else np.float64)
+        return self._bytes[offset:offset + 8 * count].cast(typecode)
+
+    @classmethod
+    def create(cls, path: str, cities: Sequence[City], factions: Sequence[Faction], turn: int = 0) -> "WorldStore":
+        """为 cities 与 factions 组成的世界新建映射文件并写入当前状态"""
+        plan = WorldPlan.of(cities, factions)
+        with open(path, "wb") as f:
+            f.truncate(plan.size)
+        raw, mapping = _map(path, writable=True)
+        format_buffer(raw, plan, turn)
+        store = cls(raw, mapping, writable=True)
+        store.capture(cities, factions, turn)
+        return store
+
+    @classmethod
+    def over(cls, buffer, mapping=None, writable: bool = False) -> "WorldStore":
+        """在任意已写好布局的内存 buffer（如共享内存）上建立存储；只读时 buffer 也按只读方式访问"""
+        view = memoryview(buffer).cast("B")
+        if not writable:
+            view = view.toreadonly()
+        return cls(np.frombuffer(view, dtype=np.uint8) if np is not None else view, mapping, writable)
+
+    @classmethod
+    def open(cls, path: str, writable: bool = False) -> "WorldStore":
+        """映射已有的存储文件；只读打开时可供其他进程在模拟进行中随时查看"""
+        return cls(*_map(path, writable), writable=writable)
+
+    @property
+    def turn(self) -> int:
+        return struct.unpack_from("=q", self._bytes, _TURN_OFFSET)[0]
+
+    def capture(self, cities: Sequence[City], factions: Sequence[Faction], turn: Optional[int] = None):
+        """
+        把 cities、factions 的当前状态整列写入
+        城池名单须与存储一致，出现存储中没有的城池或武将时抛出 ValueError；
+        名单中有、世界中已找不到的武将记为兵力 0、无城池、无势力
+        """
+        faction_of = lambda faction: -1 if faction is None else self._faction_index[faction.name]
+        try:
+            city_rows = sorted((self._city_index[c.name], c) for c in cities)
+            general_rows = [(self._general_index[g.name], g) for g in roster(cities, factions)]
+        except KeyError as e:
+            raise ValueError(f"{e.args[0]} 不在世界存储中") from None
+        if len(city_rows) != len(self.city_names):
+            raise ValueError("世界的城池数与存储不符")
+
+        general_of = lambda general: -1 if general is None else self._general_index.get(general.name, -1)
+        count = len(self.general_names)
+        army, location, faction = [0] * count, [-1] * count, [-1] * count
+        slot, held, held_turns, wild = [-1] * count, [-1] * count, [0] * count, [-1] * count
+        loyalty, greed = [0.0] * count, [0.0] * count
+        stats = {name: [0] * count for name in STAT_FIELDS}
+        for index, general in general_rows:
+            army[index] = general.army
+            faction[index] = faction_of(general.faction)
+            loyalty[index] = float(general.loyalty)
+            greed[index] = float(general._greed)
+            for name in STAT_FIELDS:
+                stats[name][index] = getattr(general, name)
+        for index, city in city_rows:
+            for position, general in enumerate(city.generals):
+                location[self._general_index[general.name]] = index
+                slot[self._general_index[general.name]] = position
+            for position, general in enumerate(city.wild_generals):
+                wild[self._general_index[general.name]] = index
+                slot[self._general_index[general.name]] = position
+            for position, (general, turns) in enumerate(city.prisoners):
+                held[self._general_index[general.name]] = index
+                held_turns[self._general_index[general.name]] = turns
+                slot[self._general_index[general.name]] = position
+        owner_slot = {c.name: position for f in factions for position, c in enumerate(f.cities)}
+        self._fill("food", [int(c.food) for _, c in city_rows])
+        self._fill("gold", [float(c.gold) for _, c in city_rows])
+        self._fill("commerce_progress", [float(c.commerce_progress) for _, c in city_rows])
+        self._fill("agriculture_progress", [float(c.agriculture_progress) for _, c in city_rows])
+        self._fill("owner", [faction_of(c.owner) for _, c in city_rows])
+        self._fill("owner_slot", [owner_slot.get(c.name, -1) for _, c in city_rows])
+        self._fill("officer_commerce", [general_of(c.officer_commerce) for _, c in city_rows])
+        self._fill("officer_agriculture", [general_of(c.officer_agriculture) for _, c in city_rows])
+        self._fill("budget_policy", [POLICY_NAMES.index(c.budget_policy) if c.budget_policy in POLICY_NAMES else -1
+                                     for _, c in city_rows])
+        self._fill("general_army", army)
+        self._fill("general_location", location)
+        self._fill("general_faction", faction)
+        for name in STAT_FIELDS:
+            self._fill(f"general_{name}", stats[name])
+        for name, values in (("slot", slot), ("held", held), ("held_turns", held_turns), ("wild", wild),
+                             ("loyalty", loyalty), ("greed", greed)):
+            self._fill(f"general_{name}", values)
+        rulers = {f.name: f.ruler for f in factions}
+        self._fill("faction_ruler", [general_of(rulers.get(name)) for name in self.faction_names])
+        if turn is not None:
+            struct.pack_into("=q", self._bytes, _TURN_OFFSET, turn)
+
+    # ========== 绑定 ==========
+
+    def bind(self, cities: Sequence[City], factions: Sequence[Faction]):
+        """
+        先 capture 一次，再让 cities、factions 中的城池与武将直接读写本存储（须可写打开）
+        势力对象按名字对应；之后赋给这些属性的势力须是绑定的势力之一
+        """
+        if not self.writable:
+            raise ValueError("世界存储以只读方式打开")
+        self.capture(cities, factions)
+        for faction in factions:
+            self._factions[self._faction_index[faction.name]] = faction
+        for city in cities:
+            city.bind(self, self._city_index[city.name])
+            self._bound.append(city)
+        for general in roster(cities, factions):
+            general.bind(self, self._general_index[general.name])
+            self._bound.append(general)
+
+    def unbind(self):
+        """解除全部绑定，各属性的当前值取回对象上"""
+        for item in self._bound:
+            item.unbind()
+        self._bound = []
+        self._factions = [None] * len(self.faction_names)
+
+    def get(self, column: str, index: int):
+        """绑定对象读取属性：势力列给出 Faction 对象，其余给出 int / float"""
+        value = self.columns[column][index]
+        if column in FACTION_REFERENCES:
+            return None if value < 0 else self._factions[value]
+        return int(value) if self._layout[column][1] == "q" else float(value)
+
+    def set(self, column: str, index: int, value):
+        """绑定对象写入属性；整数列不接受浮点数，势力须是绑定的势力"""
+        if column in FACTION_REFERENCES:
+            if value is None:
+                value = -1
+            else:
+                faction = self._faction_index.get(value.name, -1)
+                if faction < 0 or self._factions[faction] is not value:
+                    raise ValueError(f"势力 {value.name} 未绑定在世界存储上")
+                value = faction
+        self.columns[column][index] = self._writers[column](value)
+
+    def station(self, general: General, city: Optional[City]):
+        """武将进驻 city（None 为离开所在城池）时更新驻守城池列；未绑定的武将或城池不记录"""
+        if general._slot is not None and general._slot[0] is self:
+            location = -1 if city is None or city._slot is None else city._slot[1]
+            self.columns["general_location"][general._slot[1]] = location
+
+    def _fill(self, name: str, values: list):
+        self.columns[name][:] = array(self._layout[name][1], values)
+
+    def thaw(self) -> List[City]:
+        """
+        按存储重建一份独立的 City / Faction / General 对象图，返回顺序与存储中的城池一致
+        城池、驻守、在野与俘虏名单的顺序与写入时相同；势力的武将名单按名字排序；在途部队不在其中
+        """
+        columns = {name: column.tolist() for name, column in self.columns.items()}
+        factions = [Faction(name, None) for name in self.faction_names]
+        generals = []
+        for i, name in enumerate(self.general_names):
+            general = General(name, *(columns[f"general_{stat}"][i] for stat in STAT_FIELDS),
+                              columns["general_loyalty"][i], _greed=columns["general_greed"][i],
+                              army=columns["general_army"][i])
+            owner = columns["general_faction"][i]
+            if owner >= 0:
+                general.faction = factions[owner]
+                factions[owner].generals.append(general)
+            generals.append(general)
+        for faction, ruler in zip(factions, columns["faction_ruler"]):
+            faction.ruler = generals[ruler] if ruler >= 0 else None
+        general_at = lambda i: generals[i] if i >= 0 else None
+
+        cities = []
+        for i, name in enumerate(self.city_names):
+            policy = columns["budget_policy"][i]
+            cities.append(City(name, columns["food"][i], columns["gold"][i], None,
+                               commerce_progress=columns["commerce_progress"][i],
+                               agriculture_progress=columns["agriculture_progress"][i],
+                               officer_commerce=general_at(columns["officer_commerce"][i]),
+                               officer_agriculture=general_at(columns["officer_agriculture"][i]),
+                               budget_policy=POLICY_NAMES[policy] if policy >= 0 else DEFAULT_POLICY))
+        starts, edges = columns["neighbor_start"], columns["neighbors"]
+        owned: List[List[Tuple[int, City]]] = [[] for _ in factions]
+        for i, city in enumerate(cities):
+            city.neighbors = [cities[j] for j in edges[starts[i]:starts[i + 1]]]
+            owner = columns["owner"][i]
+            if owner >= 0:
+                city.owner = factions[owner]
+                owned[owner].append((columns["owner_slot"][i], city))
+        for faction, slots in zip(factions, owned):
+            faction.cities = [city for _, city in sorted(slots, key=lambda item: item[0])]
+
+        placed = sorted(range(len(generals)), key=lambda i: columns["general_slot"][i])
+        for i in placed:
+            general = generals[i]
+            if columns["general_location"][i] >= 0:
+                cities[columns["general_location"][i]].generals.append(general)
+            elif columns["general_wild"][i] >= 0:
+                cities[columns["general_wild"][i]].wild_generals.append(general)
+            elif columns["general_held"][i] >= 0:
+                cities[columns["general_held"][i]].prisoners.append((general, columns["general_held_turns"][i]))
+        return cities
+
+    def flush(self):
+        """把改动写回文件（检查点）"""
+        flush = getattr(self._mapping, "flush", None)
+        if flush is not None and self.writable:
+            flush()
+
+    def close(self):
+        """解除绑定并释放映射；之后不能再读写本存储及其视图"""
+        self.unbind()
+        self.flush()
+        self.columns = {}
+        self._bytes = self._raw = None
+        close = getattr(self._mapping, "close", None) # mmap 与共享内存需要关闭，numpy.memmap 随引用释放
+        if close is not None:
+            close()
+        self._mapping = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ========== 视图 ==========
+
+    def city(self, key) -> "CityView":
+        """按城池名或下标取视图"""
+        return CityView(self, key if isinstance(key, int) else self._city_index[key])
+
+    def general(self, key) -> "GeneralView":
+        """按武将名或下标取视图"""
+        return GeneralView(self, key if isinstance(key, int) else self._general_index[key])
+
+    def cities(self) -> List["CityView"]:
+        return [CityView(self, i) for i in range(len(self.city_names))]
+
+    def generals_in(self, city_index: int) -> List["GeneralView"]:
+        """驻守在下标为 city_index 的城池中的武将（按武将下标升序）"""
+        column = self.columns["general_location"]
+        if np is not None:
+            return [GeneralView(self, int(i)) for i in np.flatnonzero(column == city_index)]
+        return [GeneralView(self, i) for i, location in enumerate(column) if location == city_index]
+
+class _Column:
+    """视图上的一个数值属性，读写映射数组中对应的一格"""
+
+    def __init__(self, column: str, convert):
+        self.column = column
+        self.convert = convert
+
+    def __get__(self, view, owner=None):
+        if view is None:
+            return self
+        return self.convert(view.store.columns[self.column][view.index])
+
+    def __set__(self, view, value):
+        if not view.store.writable:
+            raise AttributeError("世界存储以只读方式打开")
+        view.store.columns[self.column][view.index] = value
+
+class CityView:
+    """映射数组中一座城池的视图；owner 与 generals 以势力名、武将视图给出"""
+    food = _Column("food", int)
+    gold = _Column("gold", float)
+    commerce_progress = _Column("commerce_progress", float)
+    agriculture_progress = _Column("agriculture_progress", float)
+
+    def __init__(self, store: WorldStore, index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        return self.store.city_names[self.index]
+
+    @property
+    def owner(self) -> Optional[str]:
+        """所属势力名，无主为 None"""
+        owner = int(self.store.columns["owner"][self.index])
+        return None if owner < 0 else self.store.faction_names[owner]
+
+    @property
+    def generals(self) -> List["GeneralView"]:
+        return self.store.generals_in(self.index)
+
+    @property
+    def neighbors(self) -> List["CityView"]:
+        start, end = self.store.columns["neighbor_start"][self.index:self.index + 2]
+        return [CityView(self.store, int(i)) for i in self.store.columns["neighbors"][int(start):int(end)]]
+
+    def __repr__(self):
+        return f"CityView({self.name!r}, food={self.food}, gold={self.gold}, owner={self.owner!r})"
+
+class GeneralView:
+    """映射数组中一名武将的视图；location 为驻守城池的视图，faction 为势力名"""
+    army = _Column("general_army", int)
+    leadership = _Column("general_leadership", int)
+    martial = _Column("general_martial", int)
+    intellect = _Column("general_intellect", int)
+    politics = _Column("general_politics", int)
+
+    def __init__(self, store: WorldStore, index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        return self.store.general_names[self.index]
+
+    @property
+    def location(self) -> Optional[CityView]:
+        """驻守的城池，在野、被俘或行军中为 None"""
+        location = int(self.store.columns["general_location"][self.index])
+        return None if location < 0 else CityView(self.store, location)
+
+    @property
+    def faction(self) -> Optional[str]:
+        faction = int(self.store.columns["general_faction"][self.index])
+        return None if faction < 0 else self.store.faction_names[faction]
+
+    def __repr__(self):
+        return f"GeneralView({self.name!r}, army={self.army}, faction={self.faction!r})"